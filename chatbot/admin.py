@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Session, Message
+from .models import Session, Message, UsageRollup
+from .services.usage_rollup_service import usage_rollup_service
 
 
 @admin.register(Session)
@@ -13,7 +14,9 @@ class SessionAdmin(admin.ModelAdmin):
     list_display = [
         'session_id', 
         'title', 
+        'user_id',
         'message_count',
+        'last_message_at',
         'created_at'
     ]
     
@@ -25,7 +28,8 @@ class SessionAdmin(admin.ModelAdmin):
     # Add search functionality
     search_fields = [
         'title',
-        'session_id'
+        'session_id',
+        'user_id'
     ]
     
     # Default ordering (newest first)
@@ -34,24 +38,24 @@ class SessionAdmin(admin.ModelAdmin):
     # Read-only fields (can't edit these)
     readonly_fields = [
         'session_id',
+        'user_id',
         'created_at',
-        'message_count'
+        'message_count',
+        'last_message_at',
+        'total_tokens'
     ]
     
     # Fields to show when viewing/editing a session
     fields = [
         'session_id',
         'title',
+        'user_id',
         'created_at',
-        'message_count'
+        'message_count',
+        'last_message_at',
+        'total_tokens'
     ]
     
-    # Custom method to show message count
-    def message_count(self, obj):
-        """Display the number of messages in this session"""
-        return obj.messages.count()
-    
-    message_count.short_description = 'Messages'  # Column header name
 
 
 @admin.register(Message)
@@ -136,4 +140,64 @@ class MessageAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{}</a>', url, obj.session.title)
     
     session_link.short_description = 'Session'
-    session_link.admin_order_field = 'session__title'  # Allow sorting by session title
\ No newline at end of file
+    session_link.admin_order_field = 'session__title'  # Allow sorting by session title
+
+
+@admin.register(UsageRollup)
+class UsageRollupAdmin(admin.ModelAdmin):
+    """
+    Admin interface for pre-aggregated LLM usage.
+    Reads only the rollup tables, never the message table.
+    """
+    
+    list_display = [
+        'bucket_start',
+        'period',
+        'user_id',
+        'model',
+        'feature',
+        'request_count',
+        'total_tokens',
+        'estimated_cost',
+        'avg_response_time_ms',
+        'p95_response_time_ms'
+    ]
+    
+    list_filter = [
+        'period',
+        'model',
+        'feature',
+    ]
+    
+    search_fields = [
+        'user_id',
+    ]
+    
+    date_hierarchy = 'bucket_start'
+    
+    ordering = ['-bucket_start']
+    
+    def has_add_permission(self, request):
+        """Rollups are written by the aggregation job only"""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        """Show totals and p95 for the filtered rollups above the list"""
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        
+        # Hourly and daily rows cover the same traffic; total only one period
+        period = request.GET.get('period__exact', 'day')
+        summary = usage_rollup_service.summarize(queryset.filter(period=period))
+        response.context_data['title'] = (
+            f"LLM usage: {summary['request_count']} requests, "
+            f"{summary['total_tokens']} tokens, ${summary['estimated_cost']:.4f}, "
+            f"p95 {summary['p95_response_time_ms']} ms"
+        )
+        return response
@@ -0,0 +1,59 @@
+# chatbot/management/commands/benchmark_trim.py
+
+import logging
+import time
+from django.core.management.base import BaseCommand
+from chatbot.services.token_service import token_service
+
+
+class Command(BaseCommand):
+    """
+    Microbenchmark for TokenService.trim_messages
+
+    Usage:
+        python manage.py benchmark_trim
+        python manage.py benchmark_trim --sizes 20 200 2000 --repeat 500
+    """
+
+    help = 'Benchmark context trimming across conversation lengths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[20, 200, 2000])
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument('--max-tokens', type=int, default=None)
+
+    def handle(self, *args, **options):
+        max_tokens = options['max_tokens'] or token_service.max_context_tokens
+        repeat = options['repeat']
+
+        # Trim logs every call; keep it out of the timings
+        logging.getLogger('chatbot').setLevel(logging.WARNING)
+
+        self.stdout.write(f"max_tokens={max_tokens}, repeat={repeat}")
+        self.stdout.write(f"{'messages':>10} {'kept':>6} {'trim (us)':>12} {'us/msg':>8}")
+
+        for size in options['sizes']:
+            messages = self._build_conversation(size)
+            token_counts = token_service.get_token_counts(messages)
+
+            trimmed = token_service.trim_messages(messages, max_tokens, token_counts)
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                token_service.trim_messages(messages, max_tokens, token_counts)
+            elapsed_us = (time.perf_counter() - start) / repeat * 1_000_000
+
+            self.stdout.write(
+                f"{size:>10} {len(trimmed):>6} {elapsed_us:>12.1f} {elapsed_us / size:>8.3f}"
+            )
+
+    def _build_conversation(self, size):
+        """Synthetic conversation with a system prompt and alternating turns"""
+        messages = [{'role': 'system', 'content': 'You are a helpful assistant for Fitora.'}]
+        for i in range(size - 1):
+            role = 'user' if i % 2 == 0 else 'assistant'
+            messages.append({
+                'role': role,
+                'content': f"Message {i}: how much protein should I eat after a workout? " * 3
+            })
+        return messages
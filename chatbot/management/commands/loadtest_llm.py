@@ -0,0 +1,121 @@
+# chatbot/management/commands/loadtest_llm.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from types import SimpleNamespace
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.services.llm_provider import get_llm_provider
+
+
+class Command(BaseCommand):
+    """
+    Concurrent load test of the LLM pipelines (chat, meal analysis, daily limits)
+
+    Meant for LLM_PROVIDER=fake, so the database, Redis and the service code
+    are exercised at realistic concurrency without calling OpenAI. Chat runs
+    the full process_chat_message flow and writes sessions for synthetic
+    user ids starting at --user-base.
+
+    Usage:
+        LLM_PROVIDER=fake python manage.py loadtest_llm --pipeline chat
+        python manage.py loadtest_llm --pipeline limits --requests 500 --concurrency 50
+    """
+
+    help = 'Load test chat, meal analysis and daily limits against the configured LLM provider'
+
+    PIPELINES = ('chat', 'meal', 'limits')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pipeline', choices=self.PIPELINES, default='chat')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--users', type=int, default=50, help='Distinct synthetic users')
+        parser.add_argument('--user-base', type=int, default=900000)
+        parser.add_argument('--allow-real', action='store_true', help='Run against a non-fake provider')
+
+    def handle(self, *args, **options):
+        provider = get_llm_provider()
+        if provider.name != 'fake' and not options['allow_real']:
+            raise CommandError(
+                f"LLM_PROVIDER is '{settings.LLM_PROVIDER}'; set LLM_PROVIDER=fake or pass --allow-real"
+            )
+
+        # Per-request logging would dominate the timings
+        for name in ('chatbot', 'meals', 'daily_limit_calculation'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        run_one = getattr(self, f"_run_{options['pipeline']}")
+        total = options['requests']
+
+        def timed(i):
+            user_id = options['user_base'] + i % options['users']
+            start = time.perf_counter()
+            try:
+                run_one(i, user_id)
+                error = None
+            except Exception as e:
+                error = type(e).__name__
+            return (time.perf_counter() - start) * 1000, error
+
+        self.stdout.write(
+            f"pipeline={options['pipeline']} provider={provider.name} "
+            f"requests={total} concurrency={options['concurrency']}"
+        )
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(timed, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = [error for _, error in results if error]
+
+        self.stdout.write(f"throughput: {total / elapsed:.1f} req/s over {elapsed:.1f}s")
+        self.stdout.write(
+            "latency ms: " + "  ".join(
+                f"p{p}={self._percentile(latencies, p):.0f}" for p in (50, 95, 99)
+            ) + f"  max={latencies[-1]:.0f}"
+        )
+        self.stdout.write(f"errors: {len(errors)}" + (
+            " (" + ", ".join(sorted({f"{e} x{errors.count(e)}" for e in errors})) + ")" if errors else ""
+        ))
+
+    @staticmethod
+    def _percentile(values, percentile):
+        index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+        return values[index]
+
+    def _run_chat(self, i, user_id):
+        from chatbot.services.chat_service import chat_service
+
+        chat_service.process_chat_message(
+            user_id=user_id,
+            message=f"Question {i}: how much protein should I eat after a workout?",
+            force_new_session=(i % 10 == 0)
+        )
+
+    def _run_meal(self, i, user_id):
+        from meals.services import analyze_meal_image
+
+        # Content only needs to be distinct; the fake backend never decodes it
+        analyze_meal_image(f"synthetic-image-{i}".encode('utf-8') * 64, user_id=user_id)
+
+    def _run_limits(self, i, user_id):
+        from daily_limit_calculation.services import DailyLimitsCalculator
+
+        profile = SimpleNamespace(
+            id=user_id,
+            date_of_birth=date(1970 + i % 40, 1 + i % 12, 1 + i % 28),
+            gender='male' if i % 2 else 'female',
+            current_weight=55 + i % 50,
+            current_height=150 + i % 45,
+            activeness_level='moderately_active',
+            goal=('lose_weight', 'gain_weight', 'maintain_weight')[i % 3],
+            diet_restrictions=[],
+            preferred_diet='balanced',
+        )
+        # Limits are computed locally; refinement is the LLM part
+        DailyLimitsCalculator().calculate_from_user(profile, refine=True)
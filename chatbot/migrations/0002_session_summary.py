@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='summarized_until_id',
+            field=models.IntegerField(default=0, help_text='Highest message_id already folded into the summary'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='summary',
+            field=models.TextField(blank=True, default='', help_text='Running summary of older turns'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='summary_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
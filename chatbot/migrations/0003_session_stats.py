@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:51
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_session_stats(apps, schema_editor):
+    Session = apps.get_model('chatbot', 'Session')
+    Message = apps.get_model('chatbot', 'Message')
+
+    session_messages = Message.objects.filter(session_id=OuterRef('session_id'))
+
+    Session.objects.update(
+        user_id=Subquery(
+            session_messages.order_by('created_at').values('user_id')[:1]
+        ),
+        message_count=Coalesce(
+            Subquery(
+                session_messages.order_by().values('session_id')
+                .annotate(c=Count('message_id')).values('c'),
+                output_field=IntegerField()
+            ),
+            0
+        ),
+        total_tokens=Coalesce(
+            Subquery(
+                session_messages.order_by().values('session_id')
+                .annotate(t=Sum('total_tokens')).values('t'),
+                output_field=IntegerField()
+            ),
+            0
+        ),
+        last_message_at=Subquery(
+            session_messages.order_by('-created_at').values('created_at')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_session_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, help_text='Timestamp of the latest message', null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='message_count',
+            field=models.IntegerField(default=0, help_text='Number of messages in this session'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='total_tokens',
+            field=models.IntegerField(default=0, help_text='Total tokens used in this session'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='user_id',
+            field=models.IntegerField(blank=True, help_text='Owner user ID from the existing system', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user_id', '-created_at'], name='session_user_id_d3f557_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user_id', '-last_message_at'], name='session_user_id_8ae8f1_idx'),
+        ),
+        migrations.RunPython(backfill_session_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_session_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_message_id', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'rollup_watermark',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField(help_text='Start of the hour/day (UTC)')),
+                ('user_id', models.IntegerField(help_text='User ID from the existing system')),
+                ('model', models.CharField(blank=True, default='', max_length=50)),
+                ('feature', models.CharField(default='chatbot', max_length=30)),
+                ('request_count', models.IntegerField(default=0)),
+                ('input_tokens', models.BigIntegerField(default=0)),
+                ('output_tokens', models.BigIntegerField(default=0)),
+                ('total_tokens', models.BigIntegerField(default=0)),
+                ('total_response_time_ms', models.BigIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(default=list, help_text='Request counts per LATENCY_BUCKETS_MS bucket')),
+                ('estimated_cost', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'usage_rollup',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['period', 'bucket_start'], name='usage_rollu_period_986473_idx'), models.Index(fields=['user_id', 'period', 'bucket_start'], name='usage_rollu_user_id_83597c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket_start', 'user_id', 'model', 'feature'), name='usage_rollup_unique_bucket')],
+            },
+        ),
+    ]
@@ -8,9 +8,27 @@ class Session(models.Model):
     title = models.CharField(max_length=255, help_text="Auto-generated conversation title")
     created_at = models.DateTimeField(default=timezone.now)
 
+    # Denormalized from Message, kept in sync by ChatService.save_turn
+    user_id = models.IntegerField(null=True, blank=True, help_text="Owner user ID from the existing system")
+    message_count = models.IntegerField(default=0, help_text="Number of messages in this session")
+    last_message_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp of the latest message")
+    total_tokens = models.IntegerField(default=0, help_text="Total tokens used in this session")
+
+    # Rolling summary of turns that no longer fit in the prompt window
+    summary = models.TextField(default='', blank=True, help_text="Running summary of older turns")
+    summarized_until_id = models.IntegerField(
+        default=0,
+        help_text="Highest message_id already folded into the summary"
+    )
+    summary_updated_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         db_table = 'session'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user_id', '-created_at']),
+            models.Index(fields=['user_id', '-last_message_at']),
+        ]
     
     def __str__(self):
         return f"Session {self.session_id}: {self.title}"
@@ -62,4 +80,100 @@ class Message(models.Model):
     
     def __str__(self):
         preview = self.message[:50] + "..." if len(self.message) > 50 else self.message
-        return f"{self.author}: {preview}"
\ No newline at end of file
+        return f"{self.author}: {preview}"
+
+class UsageRollup(models.Model):
+    """
+    Pre-aggregated LLM usage per user, model and feature for one hour or day
+    
+    Filled by UsageRollupService: chat replies incrementally from Message,
+    every other LLM call (meal analysis, daily limits, chat titles and
+    summaries) as it happens, each under its own feature. Reports and
+    admin read these rows instead of scanning the message table.
+    """
+    
+    PERIOD_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    # Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+    LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+    
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket_start = models.DateTimeField(help_text="Start of the hour/day (UTC)")
+    user_id = models.IntegerField(help_text="User ID from the existing system")
+    model = models.CharField(max_length=50, blank=True, default='')
+    feature = models.CharField(max_length=30, default='chatbot')
+    
+    request_count = models.IntegerField(default=0)
+    input_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+    total_tokens = models.BigIntegerField(default=0)
+    total_response_time_ms = models.BigIntegerField(default=0)
+    latency_histogram = models.JSONField(default=list, help_text="Request counts per LATENCY_BUCKETS_MS bucket")
+    estimated_cost = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'usage_rollup'
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket_start', 'user_id', 'model', 'feature'],
+                name='usage_rollup_unique_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'bucket_start']),
+            models.Index(fields=['user_id', 'period', 'bucket_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.period} {self.bucket_start:%Y-%m-%d %H:%M} user {self.user_id} {self.model}"
+    
+    @property
+    def avg_response_time_ms(self):
+        if not self.request_count:
+            return 0
+        return int(self.total_response_time_ms / self.request_count)
+    
+    @classmethod
+    def percentile_from_histogram(cls, histogram, percentile):
+        """
+        Approximate percentile (ms) from bucket counts
+        
+        Returns the upper bound of the bucket containing the percentile;
+        the open-ended last bucket reports twice the last bound.
+        """
+        total = sum(histogram or [])
+        if not total:
+            return 0
+        
+        threshold = total * percentile / 100
+        running = 0
+        bounds = cls.LATENCY_BUCKETS_MS + [cls.LATENCY_BUCKETS_MS[-1] * 2]
+        for bound, count in zip(bounds, histogram):
+            running += count
+            if running >= threshold:
+                return bound
+        return bounds[-1]
+    
+    @property
+    def p95_response_time_ms(self):
+        return self.percentile_from_histogram(self.latency_histogram, 95)
+
+
+class RollupWatermark(models.Model):
+    """High-water mark of the last message folded into UsageRollup"""
+    
+    name = models.CharField(max_length=50, primary_key=True)
+    last_message_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'rollup_watermark'
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_message_id}"
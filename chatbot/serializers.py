@@ -8,7 +8,7 @@ class MessageSerializer(serializers.ModelSerializer):
     """
     Serializer for Message model with all metadata
     """
-    session_id = serializers.IntegerField(source='session.session_id', read_only=True)
+    session_id = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Message
@@ -41,8 +41,6 @@ class SessionSerializer(serializers.ModelSerializer):
     """
     Serializer for Session list view with message count
     """
-    message_count = serializers.SerializerMethodField()
-    last_message_at = serializers.SerializerMethodField()
     
     class Meta:
         model = Session
@@ -53,25 +51,18 @@ class SessionSerializer(serializers.ModelSerializer):
             'message_count',
             'last_message_at',
         ]
-        read_only_fields = ['session_id', 'created_at']
-    
-    def get_message_count(self, obj):
-        """Get total number of messages in session"""
-        return obj.messages.count()
-    
-    def get_last_message_at(self, obj):
-        """Get timestamp of last message"""
-        last_message = obj.messages.order_by('-created_at').first()
-        return last_message.created_at if last_message else None
+        read_only_fields = ['session_id', 'created_at', 'message_count', 'last_message_at']
 
 
 class SessionDetailSerializer(serializers.ModelSerializer):
     """
-    Detailed session serializer with all messages
+    Detailed session serializer with one page of messages
+    
+    Requires 'messages' (one page, chronological) and 'next_cursor'
+    in context.
     """
-    messages = MessageSerializer(many=True, read_only=True)
-    message_count = serializers.SerializerMethodField()
-    total_tokens = serializers.SerializerMethodField()
+    messages = serializers.SerializerMethodField()
+    next_cursor = serializers.SerializerMethodField()
     
     class Meta:
         model = Session
@@ -82,16 +73,17 @@ class SessionDetailSerializer(serializers.ModelSerializer):
             'message_count',
             'total_tokens',
             'messages',
+            'next_cursor',
         ]
-        read_only_fields = ['session_id', 'created_at']
+        read_only_fields = ['session_id', 'created_at', 'message_count', 'total_tokens']
     
-    def get_message_count(self, obj):
-        """Get total number of messages"""
-        return obj.messages.count()
+    def get_messages(self, obj):
+        """Serialize the current page of messages"""
+        return MessageSerializer(self.context.get('messages', []), many=True).data
     
-    def get_total_tokens(self, obj):
-        """Get total tokens used in this session"""
-        return sum(msg.total_tokens for msg in obj.messages.all())
+    def get_next_cursor(self, obj):
+        """Cursor for the next older page, None on the oldest page"""
+        return self.context.get('next_cursor')
 
 
 class ChatRequestSerializer(serializers.Serializer):
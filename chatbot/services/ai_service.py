@@ -1,8 +1,10 @@
 # chatbot/services/ai_service.py
 
-from openai import OpenAI
 from django.conf import settings  # ⚠️ USE DJANGO SETTINGS
-from typing import List, Dict
+from .budget_service import budget_service
+from .llm_provider import get_llm_provider
+from .usage_rollup_service import usage_rollup_service
+from typing import List, Dict, Optional
 import time
 import logging
 
@@ -10,25 +12,22 @@ logger = logging.getLogger(__name__)
 
 
 class AIService:
-    """OpenAI API integration using Django settings"""
+    """Chat model calls through the configured LLM provider (settings.LLM_PROVIDER)"""
     
     def __init__(self):
         # ⚠️ READ FROM DJANGO SETTINGS
-        api_key = settings.OPENAI_API_KEY
-        
-        if not api_key:
-            logger.error("❌ OPENAI_API_KEY not set in settings!")
-            raise ValueError("OPENAI_API_KEY is required")
-        
-        self.client = OpenAI(api_key=api_key)
+        self.provider = get_llm_provider()
         self.model = settings.OPENAI_MODEL
-        self.max_retries = 3
-        self.retry_delay = 2
         
         logger.info(f"✅ AIService initialized with model: {self.model}")
     
     def generate_chat_response(self, messages: List[Dict[str, str]]) -> Dict:
-        """Generate AI response with error handling"""
+        """
+        Generate AI response with error handling
+        
+        Never raises: when upstream is failing (or its circuit is open) the
+        degraded reply is returned right away with success False.
+        """
         
         system_prompt = {
             "role": "system",
@@ -41,61 +40,51 @@ class AIService:
         messages_with_system = [system_prompt] + messages
         
         start_time = time.time()
-        attempt = 0
-        last_error = None
-        
-        while attempt < self.max_retries:
-            try:
-                logger.debug(f"Calling OpenAI API (attempt {attempt + 1}/{self.max_retries})")
-                
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages_with_system,
-                    temperature=0.7,
-                    max_tokens=1000,
-                )
-                
-                response_time_ms = int((time.time() - start_time) * 1000)
-                
-                logger.info(f"✅ OpenAI response received in {response_time_ms}ms")
-                
-                return {
-                    'success': True,
-                    'content': response.choices[0].message.content,
-                    'input_tokens': response.usage.prompt_tokens,
-                    'output_tokens': response.usage.completion_tokens,
-                    'total_tokens': response.usage.total_tokens,
-                    'response_time_ms': response_time_ms,
-                    'model': self.model,
-                    'finish_reason': response.choices[0].finish_reason
-                }
+        
+        try:
+            # Timeouts, retries and the circuit breaker live in the provider
+            response = self.provider.complete(
+                messages_with_system,
+                model=self.model,
+                temperature=0.7,
+                max_tokens=1000,
+            )
+        
+        except Exception as e:
+            response_time_ms = int((time.time() - start_time) * 1000)
+            logger.error(f"❌ LLM API error after {response_time_ms}ms: {e}")
             
-            except Exception as e:
-                attempt += 1
-                last_error = str(e)
-                logger.error(f"❌ OpenAI API error (attempt {attempt}/{self.max_retries}): {e}")
-                
-                if attempt < self.max_retries:
-                    wait_time = self.retry_delay * attempt
-                    logger.info(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    response_time_ms = int((time.time() - start_time) * 1000)
-                    
-                    return {
-                        'success': False,
-                        'content': "I'm having trouble connecting right now. Please try again in a moment.",
-                        'error': last_error,
-                        'response_time_ms': response_time_ms,
-                        'input_tokens': 0,
-                        'output_tokens': 0,
-                        'total_tokens': 0,
-                        'model': self.model,
-                        'finish_reason': 'error'
-                    }
+            return {
+                'success': False,
+                'content': "I'm having trouble connecting right now. Please try again in a moment.",
+                'error': str(e),
+                'response_time_ms': response_time_ms,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_tokens': 0,
+                'model': self.model,
+                'finish_reason': 'error',
+                # Set by LLMUnavailableError: how long the circuit stays open
+                'retry_after': getattr(e, 'retry_after', None)
+            }
+        
+        response_time_ms = int((time.time() - start_time) * 1000)
+        
+        logger.info(f"✅ {self.provider.name} response received in {response_time_ms}ms")
+        
+        return {
+            'success': True,
+            'content': response.content,
+            'input_tokens': response.input_tokens,
+            'output_tokens': response.output_tokens,
+            'total_tokens': response.total_tokens,
+            'response_time_ms': response_time_ms,
+            'model': self.model,
+            'finish_reason': response.finish_reason
+        }
     
-    def generate_title(self, first_message: str) -> str:
-        """Generate a short title for a new conversation"""
+    def generate_title(self, first_message: str, user_id: Optional[int] = None) -> str:
+        """Generate a short title for a new conversation (charged to user_id's budget)"""
         try:
             prompt = [
                 {
@@ -108,14 +97,22 @@ class AIService:
                 }
             ]
             
-            response = self.client.chat.completions.create(
+            start_time = time.time()
+            response = self.provider.complete(
+                prompt,
                 model=self.model,
-                messages=prompt,
                 temperature=0.5,
                 max_tokens=20,
             )
+            budget_service.charge(
+                user_id, 'chatbot_title', response.input_tokens, response.output_tokens, self.model
+            )
+            usage_rollup_service.record(
+                user_id, 'chatbot_title', self.model, response.input_tokens, response.output_tokens,
+                int((time.time() - start_time) * 1000)
+            )
             
-            title = response.choices[0].message.content.strip()
+            title = response.content.strip()
             return title[:50] if len(title) > 50 else title
         
         except Exception as e:
@@ -123,6 +120,59 @@ class AIService:
             words = first_message.split()[:5]
             return ' '.join(words) + "..." if len(words) == 5 else ' '.join(words)
 
+    
+    def summarize_conversation(
+        self,
+        previous_summary: str,
+        messages: List[Dict[str, str]],
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        Fold older conversation turns into a running summary
+        
+        Args:
+            previous_summary: Existing summary ('' if none)
+            messages: Turns to fold in, in OpenAI format
+            user_id: Session owner, charged for the call
+        
+        Returns:
+            Updated summary text
+        """
+        transcript = "\n".join(
+            f"{msg['role']}: {msg['content']}" for msg in messages
+        )
+        
+        prompt = [
+            {
+                "role": "system",
+                "content": "You maintain a running summary of a nutrition and fitness chat. "
+                           "Merge the new turns into the existing summary. Keep the user's goals, "
+                           "preferences, restrictions, numbers and any advice already given. "
+                           "Write at most 150 words. Only return the summary, nothing else."
+            },
+            {
+                "role": "user",
+                "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+            }
+        ]
+        
+        start_time = time.time()
+        response = self.provider.complete(
+            prompt,
+            model=self.model,
+            temperature=0.3,
+            max_tokens=300,
+        )
+        budget_service.charge(
+            user_id, 'chatbot_summary', response.input_tokens, response.output_tokens, self.model
+        )
+        usage_rollup_service.record(
+            user_id, 'chatbot_summary', self.model, response.input_tokens, response.output_tokens,
+            int((time.time() - start_time) * 1000)
+        )
+        
+        return response.content.strip()
+
 
 # Singleton instance
 ai_service = AIService()
\ No newline at end of file
@@ -0,0 +1,180 @@
+# chatbot/services/answer_cache.py
+
+import hashlib
+import math
+import re
+import threading
+import unicodedata
+from cachetools import TTLCache
+from django.conf import settings
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    In-process cache of answers to context-free questions
+    
+    Lookup order:
+    1. Exact match on a fingerprint of the normalized question
+    2. (optional, off by default) Nearest cached question by cosine
+       similarity of a local hashed character-trigram embedding, if above
+       the threshold and the two questions have the same signature
+    
+    Near-duplicates often differ exactly where it matters ("100g" vs
+    "200g rice", "for a man" vs "for a woman"), which trigram similarity
+    barely sees. The signature (numbers, units, gender/age words,
+    negation and time qualifiers, in order) must therefore match exactly
+    for a similarity hit.
+    
+    Entries expire after CHATBOT_ANSWER_CACHE_TTL seconds and the least
+    recently used entry is evicted once CHATBOT_ANSWER_CACHE_SIZE is reached.
+    """
+    
+    EMBEDDING_DIM = 1024
+    
+    # Words that change the answer however similar the rest of the question is
+    SIGNATURE_WORDS = frozenset({
+        # units
+        'g', 'gr', 'gram', 'grams', 'kg', 'kilo', 'kilos', 'mg', 'mcg', 'ug', 'lb', 'lbs',
+        'pound', 'pounds', 'oz', 'ounce', 'ounces', 'kcal', 'cal', 'calorie', 'calories',
+        'ml', 'l', 'liter', 'liters', 'litre', 'litres', 'cup', 'cups', 'tbsp', 'tsp',
+        'serving', 'servings', 'percent', 'cm', 'm', 'km', 'min', 'minutes', 'hours',
+        # gender / age / condition
+        'man', 'men', 'male', 'males', 'woman', 'women', 'female', 'females', 'boy', 'boys',
+        'girl', 'girls', 'child', 'children', 'kid', 'kids', 'teen', 'teens', 'teenager',
+        'adult', 'adults', 'elderly', 'senior', 'seniors', 'pregnant', 'pregnancy',
+        'breastfeeding', 'baby', 'infant',
+        # negation ("don't" normalizes to "don t")
+        'not', 'no', 'never', 'without', 'none', 'nor', 't',
+        # time qualifiers
+        'daily', 'day', 'days', 'week', 'weekly', 'weeks', 'month', 'monthly', 'year',
+        'hour', 'hourly', 'meal', 'meals', 'breakfast', 'lunch', 'dinner', 'snack',
+        'morning', 'evening', 'night', 'before', 'after', 'during',
+    })
+    
+    def __init__(self):
+        self.enabled = settings.CHATBOT_ANSWER_CACHE_ENABLED
+        self.similarity_threshold = settings.CHATBOT_ANSWER_CACHE_SIMILARITY
+        self._entries = TTLCache(
+            maxsize=settings.CHATBOT_ANSWER_CACHE_SIZE,
+            ttl=settings.CHATBOT_ANSWER_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace"""
+        text = unicodedata.normalize('NFKC', text).lower()
+        text = re.sub(r'[^\w\s]', ' ', text)
+        return ' '.join(text.split())
+    
+    @staticmethod
+    def fingerprint(normalized: str) -> str:
+        """Stable key for a normalized question"""
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def signature(cls, normalized: str) -> Tuple[str, ...]:
+        """Numbers and SIGNATURE_WORDS of a normalized question, in order ("100g" -> '100', 'g')"""
+        return tuple(
+            token for token in re.findall(r'\d+|[^\W\d]+', normalized)
+            if token.isdigit() or token in cls.SIGNATURE_WORDS
+        )
+    
+    def embed(self, normalized: str) -> Dict[int, float]:
+        """
+        Sparse, L2-normalized bag of hashed character trigrams
+        
+        Cheap enough to compute on every request and robust to small
+        rewordings ("what should i eat after a workout" vs "what should
+        i eat after workout?").
+        """
+        padded = f" {normalized} "
+        vector: Dict[int, float] = {}
+        for i in range(len(padded) - 2):
+            digest = hashlib.md5(padded[i:i + 3].encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.EMBEDDING_DIM
+            vector[index] = vector.get(index, 0.0) + 1.0
+        
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        if norm == 0:
+            return {}
+        return {k: v / norm for k, v in vector.items()}
+    
+    @staticmethod
+    def _cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+        if len(a) > len(b):
+            a, b = b, a
+        return sum(value * b.get(index, 0.0) for index, value in a.items())
+    
+    def get(self, question: str, record_stats: bool = True) -> Optional[Dict]:
+        """
+        Return cached response dict for a question, or None
+        """
+        if not self.enabled:
+            return None
+        
+        normalized = self.normalize(question)
+        key = self.fingerprint(normalized)
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is None and self.similarity_threshold > 0:
+                embedding = self.embed(normalized)
+                signature = self.signature(normalized)
+                best_key, best_score = None, 0.0
+                for candidate_key, candidate in self._entries.items():
+                    if candidate['signature'] != signature:
+                        continue
+                    score = self._cosine(embedding, candidate['embedding'])
+                    if score > best_score:
+                        best_key, best_score = candidate_key, score
+                
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    # get() refreshes the entry's LRU position
+                    entry = self._entries.get(best_key)
+                    logger.debug(f"Answer cache semantic hit (similarity {best_score:.3f})")
+            
+            if record_stats:
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            
+            return entry['response'] if entry is not None else None
+    
+    def set(self, question: str, response: Dict) -> None:
+        """Cache a successful response for a question"""
+        if not self.enabled:
+            return
+        
+        normalized = self.normalize(question)
+        key = self.fingerprint(normalized)
+        fuzzy = self.similarity_threshold > 0
+        entry = {
+            'response': response,
+            'embedding': self.embed(normalized) if fuzzy else {},
+            'signature': self.signature(normalized) if fuzzy else (),
+        }
+        
+        with self._lock:
+            self._entries[key] = entry
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# Singleton instance
+answer_cache = AnswerCache()
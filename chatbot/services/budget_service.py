@@ -0,0 +1,120 @@
+# chatbot/services/budget_service.py
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django_redis import get_redis_connection
+from typing import Dict, Optional
+from .token_service import token_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetService:
+    """
+    Per-user daily LLM token and cost budgets kept in Redis counters
+    
+    Usage is charged after every model call (chat, meal analysis, daily
+    limits) from the real token counts in the response; requests are
+    checked before any model call. Days roll over at UTC midnight.
+    
+    Key layout:
+        llm_budget:{user_id}:{YYYYMMDD} -> hash
+            tokens, cost_micro, tokens:{feature}, calls:{feature}
+    """
+    
+    def __init__(self):
+        self.token_budget = settings.LLM_DAILY_TOKEN_BUDGET
+        self.cost_budget = settings.LLM_DAILY_COST_BUDGET
+        self.key_ttl = 2 * 86400
+    
+    def _get_key(self, user_id, day: Optional[datetime] = None) -> str:
+        day = day or datetime.now(dt_timezone.utc)
+        return f"llm_budget:{user_id}:{day:%Y%m%d}"
+    
+    @staticmethod
+    def seconds_until_reset() -> int:
+        """Seconds until the budget day rolls over (UTC midnight)"""
+        now = datetime.now(dt_timezone.utc)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return int((tomorrow - now).total_seconds()) + 1
+    
+    def get_usage(self, user_id) -> Dict:
+        """Today's usage for a user"""
+        try:
+            tokens, cost_micro = get_redis_connection('default').hmget(
+                self._get_key(user_id), 'tokens', 'cost_micro'
+            )
+        except Exception as e:
+            logger.error(f"Budget lookup error: {e}")
+            return {'tokens': 0, 'cost': 0.0}
+        
+        return {
+            'tokens': int(tokens or 0),
+            'cost': int(cost_micro or 0) / 1_000_000,
+        }
+    
+    def is_within_budget(self, user_id) -> bool:
+        """
+        True if the user may start another model call today
+        
+        A budget of 0 disables that limit. Fails open if Redis is down.
+        """
+        if not self.token_budget and not self.cost_budget:
+            return True
+        
+        usage = self.get_usage(user_id)
+        
+        if self.token_budget and usage['tokens'] >= self.token_budget:
+            return False
+        if self.cost_budget and usage['cost'] >= self.cost_budget:
+            return False
+        return True
+    
+    def charge(
+        self,
+        user_id,
+        feature: str,
+        input_tokens: int,
+        output_tokens: int,
+        model: str = None
+    ) -> float:
+        """
+        Record actual usage of one model call
+        
+        Args:
+            user_id: User ID
+            feature: 'chatbot', 'meal_analysis', 'daily_limits', ...
+            input_tokens: Prompt tokens reported by the API
+            output_tokens: Completion tokens reported by the API
+            model: Model name used for pricing
+        
+        Returns:
+            Estimated cost in dollars
+        """
+        if user_id is None:
+            return 0.0
+        
+        tokens = (input_tokens or 0) + (output_tokens or 0)
+        cost = token_service.estimate_cost(input_tokens or 0, output_tokens or 0, model)
+        
+        if tokens == 0:
+            return cost
+        
+        try:
+            key = self._get_key(user_id)
+            pipe = get_redis_connection('default').pipeline(transaction=False)
+            pipe.hincrby(key, 'tokens', tokens)
+            pipe.hincrby(key, 'cost_micro', int(round(cost * 1_000_000)))
+            pipe.hincrby(key, f'tokens:{feature}', tokens)
+            pipe.hincrby(key, f'calls:{feature}', 1)
+            pipe.expire(key, self.key_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Budget charge error for user {user_id}: {e}")
+        
+        return cost
+
+
+# Singleton instance
+budget_service = BudgetService()
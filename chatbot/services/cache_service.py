@@ -1,116 +1,303 @@
 # chatbot/services/cache_service.py
 
-import redis
-import json
+import msgpack
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.conf import settings  # ⚠️ USE DJANGO SETTINGS
-from typing import List, Dict, Optional
+from fitora.redis_pool import get_redis_client
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from .circuit_breaker import CircuitBreaker
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class CachedMessage:
+    """
+    Lightweight read-only stand-in for a Message on the cache-hit path
+    
+    Exposes the same attributes the chat service, prompt builder and
+    MessageSerializer read, without building ORM instances. created_at is
+    kept as epoch microseconds and only turned into a datetime on access.
+    """
+    
+    __slots__ = (
+        'session_id', 'message_id', 'author', 'message', 'user_id', 'created_at_us',
+        'input_tokens', 'output_tokens', 'total_tokens', 'response_time_ms', 'model_used',
+    )
+    
+    def __init__(self, session_id, message_id, author, message, user_id, created_at_us,
+                 input_tokens=0, output_tokens=0, total_tokens=0, response_time_ms=0, model_used=''):
+        self.session_id = session_id
+        self.message_id = message_id
+        self.author = author
+        self.message = message
+        self.user_id = user_id
+        self.created_at_us = created_at_us
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = total_tokens
+        self.response_time_ms = response_time_ms
+        self.model_used = model_used
+    
+    @property
+    def created_at(self) -> datetime:
+        return EPOCH + timedelta(microseconds=self.created_at_us)
+    
+    @staticmethod
+    def pack(message) -> bytes:
+        """
+        msgpack encoding of a Message (or CachedMessage)
+        
+        Stored as a positional array; the session id is implied by the key.
+        """
+        return msgpack.packb([
+            message.message_id,
+            message.author,
+            message.message,
+            message.user_id,
+            (message.created_at - EPOCH) // ONE_MICROSECOND,
+            message.input_tokens,
+            message.output_tokens,
+            message.total_tokens,
+            message.response_time_ms,
+            message.model_used,
+        ])
+    
+    @classmethod
+    def unpack(cls, session_id: int, data: bytes) -> 'CachedMessage':
+        return cls(session_id, *msgpack.unpackb(data))
+
 
 class CacheService:
-    """Redis caching using Django settings"""
+    """
+    Redis caching using Django settings
+    
+    Availability is tracked by a circuit breaker instead of a one-off ping:
+    after repeated connection errors calls fail fast without touching
+    Redis, then a single probe is let through after an exponentially
+    growing cool-down, and caching resumes on its own once Redis answers.
+    
+    Every cached history is versioned by the Session.message_count it
+    reflects (a count key next to the list). Readers pass the count from
+    the session row and treat a different cached count as a miss; appends
+    only apply on top of the exact previous count. A list built from an
+    older DB snapshot, or one that missed an append, is therefore never
+    served, whichever process wrote it.
+    
+    Key layout:
+        chatbot:session:{session_id}:history -> list of msgpack messages
+        chatbot:session:{session_id}:count   -> message_count of that list
+    """
+    
+    # KEYS: history list, count key
+    # ARGV: count before the append, count after, max entries, ttl, entries...
+    # Returns: list length, or 0 if the cached list was missing or out of step
+    APPEND_SCRIPT = """
+    if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+        redis.call('DEL', KEYS[1], KEYS[2])
+        return 0
+    end
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 5))
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[3]), -1)
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+    return redis.call('LLEN', KEYS[1])
+    """
     
     def __init__(self):
-        try:
-            # ⚠️ READ FROM DJANGO SETTINGS
-            redis_config = {
-                'host': settings.REDIS_HOST,
-                'port': settings.REDIS_PORT,
-                'db': settings.REDIS_DB,
-                'decode_responses': True,
-                'socket_connect_timeout': 5
-            }
-            
-            # Add password if exists
-            if settings.REDIS_PASSWORD:
-                redis_config['password'] = settings.REDIS_PASSWORD
-            
-            self.redis_client = redis.Redis(**redis_config)
-            
-            # Test connection
-            self.redis_client.ping()
-            self.is_available = True
-            logger.info("✅ Redis connection established")
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Redis not available: {e}. Falling back to database only.")
-            self.is_available = False
+        # Shared, bounded pool configured in settings.REDIS_POOL_OPTIONS
+        self.redis_client = get_redis_client()
+        
+        self.breaker = CircuitBreaker(
+            'redis-cache',
+            failure_threshold=settings.CHATBOT_CACHE_BREAKER_THRESHOLD,
+            base_cooldown=settings.CHATBOT_CACHE_BREAKER_COOLDOWN,
+            max_cooldown=settings.CHATBOT_CACHE_BREAKER_MAX_COOLDOWN,
+        )
         
         # ⚠️ READ TTL FROM DJANGO SETTINGS
         self.cache_ttl = settings.CHATBOT_CACHE_TTL
+        
+        self._append_script = self.redis_client.register_script(self.APPEND_SCRIPT)
+    
+    @property
+    def is_available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+    
+    def _record_error(self, action: str, error: Exception):
+        """Feed the breaker: only connectivity problems count as failures"""
+        if isinstance(error, (RedisConnectionError, RedisTimeoutError)):
+            self.breaker.record_failure()
+            logger.warning(f"Cache {action} error (Redis unreachable): {error}")
+        else:
+            # Redis answered, so it is up even though the command failed
+            self.breaker.record_success()
+            logger.error(f"Cache {action} error: {error}")
     
     def _get_key(self, session_id: int) -> str:
         """Generate cache key for session"""
-        return f"chatbot:session:{session_id}:messages"
+        return f"chatbot:session:{session_id}:history"
+    
+    def _get_count_key(self, session_id: int) -> str:
+        """Key holding the message_count the cached history reflects"""
+        return f"chatbot:session:{session_id}:count"
     
-    def get_messages(self, session_id: int) -> Optional[List[Dict]]:
-        """Retrieve cached messages for a session"""
-        if not self.is_available:
+    def get_messages(
+        self,
+        session_id: int,
+        limit: Optional[int],
+        message_count: int
+    ) -> Optional[List[CachedMessage]]:
+        """
+        Retrieve cached messages for a session (oldest first)
+        
+        History is a Redis list with one msgpack entry per message, so only
+        the newest `limit` entries are transferred and decoded.
+        
+        Args:
+            session_id: Session ID
+            limit: Newest entries to return (all if None)
+            message_count: Session.message_count from the DB; a list cached
+                for any other count is a miss (whichever process wrote it)
+        """
+        if not self.breaker.allow_request():
             return None
         
         try:
             key = self._get_key(session_id)
-            cached_data = self.redis_client.get(key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(self._get_count_key(session_id))
+            pipe.lrange(key, -limit if limit else 0, -1)
+            cached_count, cached_data = pipe.execute()
+            self.breaker.record_success()
+            
+            if cached_count != str(message_count).encode():
+                logger.debug(f"Cache STALE for session {session_id}")
+                return None
             
             if cached_data:
                 logger.debug(f"Cache HIT for session {session_id}")
-                return json.loads(cached_data)
+                return [CachedMessage.unpack(session_id, data) for data in cached_data]
             
             logger.debug(f"Cache MISS for session {session_id}")
             return None
             
         except Exception as e:
-            logger.error(f"Cache retrieval error: {e}")
+            self._record_error('retrieval', e)
             return None
     
-    def set_messages(self, session_id: int, messages: List[Dict]) -> bool:
-        """Cache messages for a session"""
-        if not self.is_available:
+    def set_messages(self, session_id: int, messages: List, message_count: int) -> bool:
+        """
+        Cache messages for a session, replacing what was there
+        
+        Args:
+            session_id: Session ID
+            messages: Newest messages, oldest first
+            message_count: Session.message_count read in the same DB
+                snapshot as the messages
+        """
+        if not self.breaker.allow_request():
             return False
         
         try:
             key = self._get_key(session_id)
-            self.redis_client.setex(
-                key,
-                self.cache_ttl,
-                json.dumps(messages)
-            )
+            count_key = self._get_count_key(session_id)
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(key, count_key)
+            if messages:
+                pipe.rpush(key, *[CachedMessage.pack(m) for m in messages])
+                pipe.expire(key, self.cache_ttl)
+                pipe.set(count_key, message_count, ex=self.cache_ttl)
+            pipe.execute()
+            
+            self.breaker.record_success()
             logger.debug(f"Cached {len(messages)} messages for session {session_id}")
             return True
             
         except Exception as e:
-            logger.error(f"Cache write error: {e}")
+            self._record_error('write', e)
+            return False
+    
+    def append_messages(self, session_id: int, messages: List, max_messages: int, message_count: int) -> bool:
+        """
+        Append messages to a cached session in one atomic round trip
+        
+        Keeps only the newest max_messages entries. The append only applies
+        if the cached list reflects exactly the messages before these ones;
+        a missing list stays missing and an out-of-step one is dropped, so
+        the next read repopulates it from the DB.
+        
+        Args:
+            session_id: Session ID
+            messages: Newly saved messages, oldest first
+            max_messages: Entries to keep
+            message_count: Session.message_count including these messages
+        """
+        if not self.breaker.allow_request():
+            # The cached count (if any) now lags Session.message_count, so
+            # every process treats the list as stale until it is rebuilt
             return False
+        
+        try:
+            length = self._append_script(
+                keys=[self._get_key(session_id), self._get_count_key(session_id)],
+                args=[
+                    message_count - len(messages),
+                    message_count,
+                    max_messages,
+                    self.cache_ttl,
+                    *[CachedMessage.pack(m) for m in messages],
+                ]
+            )
+            
+            self.breaker.record_success()
+            logger.debug(f"Appended {len(messages)} messages to session {session_id} cache ({length})")
+            return length > 0
+            
+        except Exception as e:
+            self._record_error('append', e)
+            # Never leave a stale list behind
+            return self.invalidate(session_id)
     
     def invalidate(self, session_id: int) -> bool:
-        """Invalidate cache for a session"""
-        if not self.is_available:
+        """
+        Invalidate cache for a session
+        
+        Best effort: a list that could not be deleted is still never served
+        once Session.message_count has moved past its cached count.
+        """
+        if not self.breaker.allow_request():
             return False
         
         try:
-            key = self._get_key(session_id)
-            self.redis_client.delete(key)
+            self.redis_client.delete(self._get_key(session_id), self._get_count_key(session_id))
+            self.breaker.record_success()
             logger.debug(f"Invalidated cache for session {session_id}")
             return True
             
         except Exception as e:
-            logger.error(f"Cache invalidation error: {e}")
+            self._record_error('invalidation', e)
             return False
     
     def extend_ttl(self, session_id: int) -> bool:
         """Extend TTL for active sessions"""
-        if not self.is_available:
+        if not self.breaker.allow_request():
             return False
         
         try:
-            key = self._get_key(session_id)
-            self.redis_client.expire(key, self.cache_ttl)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.expire(self._get_key(session_id), self.cache_ttl)
+            pipe.expire(self._get_count_key(session_id), self.cache_ttl)
+            pipe.execute()
+            self.breaker.record_success()
             return True
             
         except Exception as e:
-            logger.error(f"TTL extension error: {e}")
+            self._record_error('TTL extension', e)
             return False
 
 
@@ -1,11 +1,22 @@
 # chatbot/services/chat_service.py
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
+from fitora.redis_pool import get_redis_client
 from ..models import Session, Message
 from .ai_service import ai_service
+from .answer_cache import answer_cache
+from .budget_service import budget_service
 from .cache_service import cache_service
+from .single_flight import single_flight
 from .token_service import token_service
+from datetime import datetime
 from typing import List, Dict, Optional, Tuple
+import base64
+import binascii
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,64 +29,139 @@ class ChatService:
     
     def __init__(self):
         self.ai_service = ai_service
+        self.answer_cache = answer_cache
         self.cache_service = cache_service
         self.token_service = token_service
+        
+        self.history_limit = settings.CHATBOT_MAX_HISTORY_MESSAGES
+        self.recent_messages = settings.CHATBOT_RECENT_MESSAGES
+        self.summary_every_turns = settings.CHATBOT_SUMMARY_EVERY_TURNS
+        self.summary_pending_ttl = settings.CHATBOT_SUMMARY_PENDING_TTL
     
-    def get_last_messages(self, session_id: int, limit: int = 20) -> List[Message]:
+    def get_last_messages(
+        self,
+        session_id: int,
+        limit: int,
+        message_count: int
+    ) -> List[Message]:
         """
         Retrieve last N messages with caching
         
+        The cache always holds the newest CHATBOT_MAX_HISTORY_MESSAGES
+        messages of a session; larger requests go straight to the database.
+        Cache hits return CachedMessage records, which expose the same
+        attributes as Message but are not ORM instances. A cached list that
+        reflects any other count than message_count (Session.message_count)
+        is ignored and rebuilt.
+        
         Performance:
         - Cache hit: ~1ms
         - Cache miss: ~50ms (database query)
         """
-        # Try cache first
-        cached_messages = self.cache_service.get_messages(session_id)
+        if limit <= 0:
+            return []
+        
+        if limit > self.history_limit:
+            messages = Message.objects.filter(
+                session_id=session_id
+            ).order_by('-created_at', '-message_id')[:limit]
+            return list(reversed(messages))
+        
+        # Try cache first (newest `limit` only)
+        cached_messages = self.cache_service.get_messages(session_id, limit, message_count)
         
         if cached_messages is not None:
             # Extend TTL for active sessions
             self.cache_service.extend_ttl(session_id)
             
-            # Convert dicts back to Message objects
-            messages = []
-            for msg_dict in cached_messages[:limit]:
-                msg = Message(
-                    message_id=msg_dict['message_id'],
-                    session_id=session_id,
-                    author=msg_dict['author'],
-                    message=msg_dict['message'],
-                    user_id=msg_dict['user_id'],
-                    created_at=timezone.datetime.fromisoformat(msg_dict['created_at'])
-                )
-                messages.append(msg)
-            
-            logger.debug(f"Returned {len(messages)} messages from cache")
-            return messages
+            logger.debug(f"Returned {len(cached_messages)} messages from cache")
+            return cached_messages
         
-        # Cache miss - query database
+        # Cache miss - query database for the full cache window, with the
+        # session's message_count from the same snapshot to version the cache
         messages = Message.objects.filter(
             session_id=session_id
-        ).order_by('-created_at')[:limit]
+        ).annotate(
+            session_message_count=F('session__message_count')
+        ).order_by('-created_at', '-message_id')[:self.history_limit]
         
         messages_list = list(reversed(messages))
         
         # Cache for next time
-        messages_dict = [
-            {
-                'message_id': m.message_id,
-                'session_id': session_id,
-                'author': m.author,
-                'message': m.message,
-                'user_id': m.user_id,
-                'created_at': m.created_at.isoformat()
-            }
-            for m in messages_list
-        ]
-        self.cache_service.set_messages(session_id, messages_dict)
+        if messages_list:
+            self.cache_service.set_messages(
+                session_id, messages_list, messages_list[-1].session_message_count
+            )
         
+        messages_list = messages_list[-limit:]
         logger.debug(f"Returned {len(messages_list)} messages from database")
         return messages_list
     
+    @staticmethod
+    def encode_cursor(message: Message) -> str:
+        """Opaque cursor pointing just before the given message"""
+        raw = f"{message.created_at.isoformat()}|{message.message_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """
+        Decode a cursor produced by encode_cursor
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_at, message_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(message_id)
+        except (TypeError, UnicodeError, binascii.Error) as e:
+            raise ValueError(f"Invalid cursor: {e}")
+    
+    def get_message_page(
+        self,
+        session: Session,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[List[Message], Optional[str]]:
+        """
+        One page of a session's messages, newest page first
+        
+        The newest page comes from the message cache. Older pages are a
+        keyset query on the (session_id, created_at) index, so opening a
+        long conversation never loads the whole transcript.
+        
+        Args:
+            session: Session to page through
+            cursor: Cursor from a previous page, None for the newest page
+            limit: Page size
+        
+        Returns:
+            Tuple of (messages in chronological order, cursor for the next
+            older page or None when there is nothing older)
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        if cursor is None:
+            messages = self.get_last_messages(session.session_id, limit, session.message_count)
+            has_more = session.message_count > len(messages)
+        else:
+            created_at, message_id = self.decode_cursor(cursor)
+            
+            page = list(Message.objects.filter(
+                session_id=session.session_id
+            ).filter(
+                Q(created_at__lt=created_at) |
+                Q(created_at=created_at, message_id__lt=message_id)
+            ).order_by('-created_at', '-message_id')[:limit + 1])
+            
+            has_more = len(page) > limit
+            messages = list(reversed(page[:limit]))
+        
+        next_cursor = self.encode_cursor(messages[0]) if has_more and messages else None
+        return messages, next_cursor
+    
     def format_messages_for_ai(self, messages: List[Message]) -> List[Dict[str, str]]:
         """
         Convert Message objects to OpenAI API format
@@ -95,64 +181,301 @@ class ChatService:
             })
         return formatted
     
-    def create_session_with_title(self, first_message: str) -> Session:
+    def build_conversation_history(self, session: Session) -> List[Dict[str, str]]:
+        """
+        Build prompt history for a session: running summary + unsummarized turns
+        
+        Messages already folded into the summary are dropped, so the prompt
+        stays roughly constant in size however long the session grows.
+        When the summary lags behind (the cached window does not reach back
+        to its high-water mark), every unsummarized message is read from the
+        database so no turn falls between the summary and the window;
+        trimming then keeps the prompt within the token budget.
+        
+        Args:
+            session: Session being continued
+        
+        Returns:
+            List of dicts with 'role' and 'content'
+        """
+        last_messages = self.get_last_messages(
+            session.session_id, limit=self.history_limit, message_count=session.message_count
+        )
+        
+        if not session.summary:
+            return self.format_messages_for_ai(last_messages)
+        
+        window_is_full = len(last_messages) >= self.history_limit
+        if window_is_full and last_messages[0].message_id > session.summarized_until_id:
+            recent = list(Message.objects.filter(
+                session_id=session.session_id,
+                message_id__gt=session.summarized_until_id
+            ).order_by('created_at', 'message_id'))
+        else:
+            recent = [
+                msg for msg in last_messages
+                if msg.message_id > session.summarized_until_id
+            ]
+        
+        history = [{
+            'role': 'system',
+            'content': f"Summary of the earlier conversation: {session.summary}"
+        }]
+        history.extend(self.format_messages_for_ai(recent))
+        return history
+    
+    @staticmethod
+    def summary_pending_key(session_id: int) -> str:
+        """Redis key held while a summary refresh of the session is queued"""
+        return f"chatbot:summary_pending:{session_id}"
+    
+    def maybe_schedule_summary(self, session: Session, added_messages: int = 2) -> bool:
+        """
+        Queue a background summary refresh once enough turns have piled up
+        
+        A refresh is due when the unsummarized tail is longer than the
+        verbatim window by at least CHATBOT_SUMMARY_EVERY_TURNS turns.
+        Sessions whose denormalized message_count is still below that need
+        no query at all. Only one refresh per session is queued at a time:
+        a SET NX key is held until summarize_session_async finishes (or
+        CHATBOT_SUMMARY_PENDING_TTL runs out).
+        
+        Args:
+            session: Session as loaded before the turn was saved
+            added_messages: Messages saved since the session was loaded
+        
+        Returns:
+            True if a refresh was queued
+        """
+        threshold = self.recent_messages + 2 * self.summary_every_turns
+        
+        if session.message_count + added_messages < threshold:
+            return False
+        
+        unsummarized = Message.objects.filter(
+            session_id=session.session_id,
+            message_id__gt=session.summarized_until_id
+        ).count()
+        
+        if unsummarized < threshold:
+            return False
+        
+        pending_key = self.summary_pending_key(session.session_id)
+        
+        try:
+            if not get_redis_client().set(pending_key, 1, nx=True, ex=self.summary_pending_ttl):
+                return False
+        except Exception as e:
+            # Without the guard a duplicate refresh is possible but harmless:
+            # the conditional update in refresh_summary keeps the first one
+            logger.warning(f"Summary guard unavailable for session {session.session_id}: {e}")
+        
+        from ..tasks import summarize_session_async
+        
+        try:
+            summarize_session_async.delay(session.session_id)
+            logger.info(f"Queued summary refresh for session {session.session_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to queue summary for session {session.session_id}: {e}")
+            self.clear_summary_pending(session.session_id)
+            return False
+    
+    def clear_summary_pending(self, session_id: int):
+        """Allow the next summary refresh of a session to be queued"""
+        try:
+            get_redis_client().delete(self.summary_pending_key(session_id))
+        except Exception as e:
+            logger.warning(f"Could not clear summary guard for session {session_id}: {e}")
+    
+    def refresh_summary(self, session_id: int) -> bool:
+        """
+        Fold every turn except the verbatim window into the session summary
+        
+        The update is conditional on the previous high-water mark, so two
+        concurrent refreshes cannot overwrite each other.
+        
+        Args:
+            session_id: Session ID
+        
+        Returns:
+            True if the summary was updated
+        """
+        session = Session.objects.get(session_id=session_id)
+        
+        pending = list(Message.objects.filter(
+            session_id=session_id,
+            message_id__gt=session.summarized_until_id
+        ).order_by('created_at', 'message_id'))
+        
+        to_fold = pending[:len(pending) - self.recent_messages]
+        if not to_fold:
+            return False
+        
+        summary = self.ai_service.summarize_conversation(
+            session.summary,
+            self.format_messages_for_ai(to_fold),
+            user_id=session.user_id
+        )
+        
+        updated = Session.objects.filter(
+            session_id=session_id,
+            summarized_until_id=session.summarized_until_id
+        ).update(
+            summary=summary,
+            summarized_until_id=to_fold[-1].message_id,
+            summary_updated_at=timezone.now()
+        )
+        
+        if updated:
+            logger.info(f"Summarized {len(to_fold)} messages for session {session_id}")
+        return bool(updated)
+    
+    def generate_response(
+        self,
+        conversation_history: List[Dict[str, str]],
+        title: Optional[str] = None
+    ) -> Dict:
+        """
+        Get AI response, answering context-free questions from the answer cache
+        
+        Only a lone user message is cacheable: with any prior turns or a
+        summary the same words can mean something different.
+        
+        Args:
+            conversation_history: Messages in OpenAI format
+            title: Session title, cached alongside the answer
+        
+        Returns:
+            Response dict in AIService.generate_chat_response format
+        """
+        is_context_free = (
+            len(conversation_history) == 1 and
+            conversation_history[0]['role'] == 'user'
+        )
+        
+        if not is_context_free:
+            return self.ai_service.generate_chat_response(conversation_history)
+        
+        question = conversation_history[0]['content']
+        start_time = time.time()
+        cached = self.answer_cache.get(question)
+        
+        if cached is not None:
+            logger.info("Answered from answer cache, no model call")
+            return {
+                'success': True,
+                'content': cached['content'],
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_tokens': 0,
+                'response_time_ms': int((time.time() - start_time) * 1000),
+                'model': 'cache',
+                'finish_reason': 'cached'
+            }
+        
+        ai_response = self.ai_service.generate_chat_response(conversation_history)
+        
+        if ai_response.get('success') and ai_response.get('finish_reason') == 'stop':
+            self.answer_cache.set(question, {
+                'content': ai_response['content'],
+                'title': title
+            })
+        
+        return ai_response
+    
+    def create_session_with_title(self, first_message: str, user_id: int) -> Session:
         """
         Create a new session with AI-generated title
         
         Args:
             first_message: User's first message
+            user_id: Owner user ID
         
         Returns:
             New Session object
         """
-        title = self.ai_service.generate_title(first_message)
-        session = Session.objects.create(title=title)
+        # A cached first question reuses its title too, so no model call at all
+        cached = self.answer_cache.get(first_message, record_stats=False)
+        if cached is not None and cached.get('title'):
+            title = cached['title']
+        else:
+            title = self.ai_service.generate_title(first_message, user_id=user_id)
+        
+        session = Session.objects.create(title=title, user_id=user_id)
         logger.info(f"Created new session {session.session_id}: {title}")
         return session
     
-    def save_message(
-        self, 
-        session_id: int, 
-        author: str, 
-        message: str, 
+    def save_turn(
+        self,
+        session_id: int,
         user_id: int,
-        metadata: Optional[Dict] = None
-    ) -> Message:
+        user_text: str,
+        ai_response: Dict,
+        received_at=None
+    ) -> Tuple[Message, Message]:
         """
-        Save a message with optional metadata
+        Persist a whole chat turn in one transaction
+        
+        Both messages go in with a single bulk_create, the session counters
+        are bumped in the same transaction, and the message cache gets one
+        append once the transaction commits, versioned by the new
+        message_count (see CacheService). A failure leaves no half-written
+        turn behind.
         
         Args:
             session_id: Session ID
-            author: 'user' or 'ai'
-            message: Message content
             user_id: User ID
-            metadata: Optional dict with tokens, response_time, etc.
+            user_text: User's message
+            ai_response: Response dict from generate_response
+            received_at: When the user message arrived (defaults to now)
         
         Returns:
-            Saved Message object
+            Tuple of (user_message, ai_message)
         """
-        msg_data = {
-            'session_id': session_id,
-            'author': author,
-            'message': message,
-            'user_id': user_id
-        }
-        
-        # Add metadata if provided
-        if metadata:
-            msg_data['input_tokens'] = metadata.get('input_tokens', 0)
-            msg_data['output_tokens'] = metadata.get('output_tokens', 0)
-            msg_data['total_tokens'] = metadata.get('total_tokens', 0)
-            msg_data['response_time_ms'] = metadata.get('response_time_ms', 0)
-            msg_data['model_used'] = metadata.get('model', '')
-        
-        msg = Message.objects.create(**msg_data)
-        
-        # Invalidate cache
-        self.cache_service.invalidate(session_id)
-        
-        logger.debug(f"Saved {author} message {msg.message_id} to session {session_id}")
-        return msg
+        user_message = Message(
+            session_id=session_id,
+            author='user',
+            message=user_text,
+            user_id=user_id,
+            created_at=received_at or timezone.now()
+        )
+        ai_message = Message(
+            session_id=session_id,
+            author='ai',
+            message=ai_response['content'],
+            user_id=user_id,
+            created_at=timezone.now(),
+            input_tokens=ai_response.get('input_tokens', 0),
+            output_tokens=ai_response.get('output_tokens', 0),
+            total_tokens=ai_response.get('total_tokens', 0),
+            response_time_ms=ai_response.get('response_time_ms', 0),
+            model_used=ai_response.get('model', '')
+        )
+        
+        with transaction.atomic():
+            Message.objects.bulk_create([user_message, ai_message])
+            
+            Session.objects.filter(session_id=session_id).update(
+                message_count=F('message_count') + 2,
+                total_tokens=F('total_tokens') + ai_message.total_tokens,
+                last_message_at=ai_message.created_at
+            )
+            # The row is locked by the update, so this is exactly our count
+            message_count = Session.objects.filter(
+                session_id=session_id
+            ).values_list('message_count', flat=True).get()
+            
+            transaction.on_commit(
+                lambda: self.cache_service.append_messages(
+                    session_id, [user_message, ai_message], self.history_limit, message_count
+                )
+            )
+        
+        logger.debug(f"Saved turn {user_message.message_id}/{ai_message.message_id} "
+                     f"to session {session_id}")
+        return user_message, ai_message
+    
     def get_or_create_active_session(self, user_id: int) -> Tuple[Session, bool]:
         """
         Get user's most recent session or indicate new session needed
@@ -164,34 +487,82 @@ class ChatService:
             Tuple of (Session or None, is_new)
             - is_new: True if should create new session, False if can continue existing
         """
-        # Find user's most recent message
-        last_message = Message.objects.filter(
-            user_id=user_id
-        ).order_by('-created_at').first()
+        # Find user's most recently active session
+        last_session = Session.objects.filter(
+            user_id=user_id,
+            last_message_at__isnull=False
+        ).order_by('-last_message_at').first()
         
-        if last_message:
+        if last_session:
             # User has previous conversations - return most recent session
-            return last_message.session, False
+            return last_session, False
         else:
             # No previous conversations - will create new session
             return None, True
     
+    def _finish_turn(
+        self,
+        session: Session,
+        user_id: int,
+        message: str,
+        ai_response: Dict,
+        received_at,
+        is_new_session: bool
+    ) -> Tuple[Message, Message]:
+        """
+        Save a turn, schedule the summary refresh when due and charge usage
+        
+        Returns:
+            Tuple of (user_message, ai_message)
+        """
+        user_message, ai_message = self.save_turn(
+            session_id=session.session_id,
+            user_id=user_id,
+            user_text=message,
+            ai_response=ai_response,
+            received_at=received_at
+        )
+        
+        # Refresh the running summary in the background when due
+        if not is_new_session:
+            self.maybe_schedule_summary(session)
+        
+        # Charge usage against the user's daily budget and log metrics
+        cost = budget_service.charge(
+            user_id,
+            'chatbot',
+            ai_response.get('input_tokens', 0),
+            ai_response.get('output_tokens', 0),
+            ai_response.get('model')
+        )
+        
+        if ai_response.get('success', True):
+            logger.info(f"Request completed: {ai_response.get('total_tokens', 0)} tokens, "
+                       f"${cost:.4f} cost, {ai_response.get('response_time_ms', 0)}ms")
+        
+        return user_message, ai_message
+    
     def process_chat_message(
         self, 
         user_id: int, 
         message: str, 
         session_id: Optional[int] = None,
         force_new_session: bool = False
-    ) -> Tuple[Session, Message, Message, bool]:
+    ) -> Tuple[Session, Message, Message, bool, Optional[float]]:
         """
         Main orchestration method for processing a chat message
         
         Flow:
         1. Determine session (new or continue)
-        2. Retrieve conversation history (with caching)
+        2. Retrieve conversation history (summary + recent turns, with caching)
         3. Token management (trim if needed)
         4. Get AI response
         5. Save messages with metadata
+        6. Schedule summary refresh if due
+        
+        Steps 4-6 run once per group of identical in-flight requests of the
+        same user (see SingleFlight): a double submit gets the turn the
+        first request saved instead of a second copy.
         
         Args:
             user_id: User ID
@@ -200,9 +571,12 @@ class ChatService:
             force_new_session: Force create new session
         
         Returns:
-            Tuple of (Session, user_message, ai_message, is_new_session)
+            Tuple of (Session, user_message, ai_message, is_new_session, retry_after)
+            - retry_after: None for a real answer; for the degraded reply,
+              seconds until the model is worth trying again (0 if unknown)
         """
         is_new_session = False
+        received_at = timezone.now()
         
         # ============================================
         # STEP 1: Determine which session to use
@@ -210,7 +584,7 @@ class ChatService:
         if force_new_session or session_id is None:
             if force_new_session:
                 # User explicitly wants new conversation
-                session = self.create_session_with_title(message)
+                session = self.create_session_with_title(message, user_id)
                 conversation_history = []
                 is_new_session = True
             else:
@@ -219,20 +593,18 @@ class ChatService:
                 
                 if should_create_new or existing_session is None:
                     # No previous session - create new
-                    session = self.create_session_with_title(message)
+                    session = self.create_session_with_title(message, user_id)
                     conversation_history = []
                     is_new_session = True
                 else:
                     # Continue existing session
                     session = existing_session
-                    last_messages = self.get_last_messages(session.session_id, limit=20)
-                    conversation_history = self.format_messages_for_ai(last_messages)
+                    conversation_history = self.build_conversation_history(session)
                     is_new_session = False
         else:
             # Specific session_id provided - use it
             session = Session.objects.get(session_id=session_id)
-            last_messages = self.get_last_messages(session_id, limit=20)
-            conversation_history = self.format_messages_for_ai(last_messages)
+            conversation_history = self.build_conversation_history(session)
             is_new_session = False
         
         # ============================================
@@ -246,59 +618,67 @@ class ChatService:
         # ============================================
         # STEP 3: Token management
         # ============================================
-        token_count = self.token_service.count_tokens(conversation_history)
+        # Encode each message once; trimming reuses the counts
+        token_counts = self.token_service.get_token_counts(conversation_history)
+        token_count = sum(token_counts) + self.token_service.reply_priming_tokens
         logger.info(f"Conversation tokens: {token_count}")
         
         # Trim if necessary
         if token_count > self.token_service.max_context_tokens:
             logger.warning(f"Token count {token_count} exceeds limit, trimming...")
-            conversation_history = self.token_service.trim_messages(conversation_history)
-            token_count = self.token_service.count_tokens(conversation_history)
+            conversation_history, token_count = self.token_service.trim_messages_with_count(
+                conversation_history,
+                token_counts=token_counts
+            )
             logger.info(f"After trimming: {token_count} tokens")
         
         # ============================================
-        # STEP 4: Get AI response
-        # ============================================
-        ai_response = self.ai_service.generate_chat_response(conversation_history)
-        
-        # ============================================
-        # STEP 5: Save messages with metadata
+        # STEP 4-6: Get AI response, save the turn, charge it
         # ============================================
+        # Identical in-flight requests of the same user share one model
+        # call *and* one saved turn; the leader returns its message IDs
+        leader_turn = {}
+        
+        def respond_and_save():
+            ai_response = self.generate_response(conversation_history, title=session.title)
+            leader_turn['messages'] = self._finish_turn(
+                session, user_id, message, ai_response, received_at, is_new_session
+            )
+            user_message, ai_message = leader_turn['messages']
+            return {
+                'session_id': session.session_id,
+                'user_message_id': user_message.message_id,
+                'ai_message_id': ai_message.message_id,
+                'ai_response': ai_response
+            }
         
-        # Save user message
-        user_message = self.save_message(
-            session_id=session.session_id,
-            author='user',
-            message=message,
-            user_id=user_id
-        )
+        turn, shared = single_flight.run(user_id, 'chatbot', conversation_history, respond_and_save)
         
-        # Save AI response with metadata
-        ai_message = self.save_message(
-            session_id=session.session_id,
-            author='ai',
-            message=ai_response['content'],
-            user_id=user_id,
-            metadata={
-                'input_tokens': ai_response.get('input_tokens', 0),
-                'output_tokens': ai_response.get('output_tokens', 0),
-                'total_tokens': ai_response.get('total_tokens', 0),
-                'response_time_ms': ai_response.get('response_time_ms', 0),
-                'model': ai_response.get('model', '')
+        if not shared:
+            user_message, ai_message = leader_turn['messages']
+        elif turn['session_id'] == session.session_id:
+            # A double submit: the leader already saved this very turn
+            saved = Message.objects.in_bulk([turn['user_message_id'], turn['ai_message_id']])
+            user_message, ai_message = saved[turn['user_message_id']], saved[turn['ai_message_id']]
+            logger.info(f"Returned coalesced turn {user_message.message_id}/{ai_message.message_id}")
+        else:
+            # Same question in another session: reuse the answer, which the
+            # leader already charged, and save it to this session
+            ai_response = {
+                **turn['ai_response'],
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_tokens': 0,
+                'coalesced': True
             }
-        )
-        
-        # Log metrics
-        if ai_response.get('success', True):
-            cost = self.token_service.estimate_cost(
-                ai_response.get('input_tokens', 0),
-                ai_response.get('output_tokens', 0),
-                ai_response.get('model')
+            user_message, ai_message = self._finish_turn(
+                session, user_id, message, ai_response, received_at, is_new_session
             )
-            logger.info(f"Request completed: {ai_response.get('total_tokens', 0)} tokens, "
-                       f"${cost:.4f} cost, {ai_response.get('response_time_ms', 0)}ms")
         
-        return session, user_message, ai_message, is_new_session
+        ai_response = turn['ai_response']
+        retry_after = None if ai_response.get('success', True) else (ai_response.get('retry_after') or 0)
+        
+        return session, user_message, ai_message, is_new_session, retry_after
     
     def get_user_sessions(self, user_id: int) -> List[Session]:
         """
@@ -310,12 +690,9 @@ class ChatService:
         Returns:
             List of Session objects
         """
-        session_ids = Message.objects.filter(
-            user_id=user_id
-        ).values_list('session_id', flat=True).distinct()
-        
         return Session.objects.filter(
-            session_id__in=session_ids
+            user_id=user_id,
+            message_count__gt=0
         ).order_by('-created_at')
     
     def get_session_messages(self, session_id: int) -> List[Message]:
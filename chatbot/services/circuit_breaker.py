@@ -0,0 +1,220 @@
+# chatbot/services/circuit_breaker.py
+
+from fitora.redis_pool import get_redis_client
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    In-process circuit breaker with half-open probes and exponential cool-down
+
+    States:
+        closed    - calls go through; consecutive failures are counted
+        open      - calls are rejected without touching the dependency
+        half_open - cool-down elapsed; exactly one probe call is let through
+
+    A successful probe closes the circuit. A failed probe reopens it with
+    the cool-down doubled, up to max_cooldown.
+
+    Usage:
+        if not breaker.allow_request():
+            return fallback
+        try:
+            result = call()
+        except ConnectionError:
+            breaker.record_failure()
+            return fallback
+        breaker.record_success()
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3,
+                 base_cooldown: float = 1.0, max_cooldown: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._cooldown = base_cooldown
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._opened_until:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True if the caller may try the dependency now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN:
+                if time.monotonic() < self._opened_until:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            # Half-open: a single probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed, dependency recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open()
+                return
+
+            self._failures += 1
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        """Caller holds the lock"""
+        self._state = self.OPEN
+        self._probe_in_flight = False
+        self._opened_until = time.monotonic() + self._cooldown
+        logger.warning(f"Circuit '{self.name}' open for {self._cooldown:.1f}s")
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 if closed or half-open)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_until - time.monotonic())
+
+
+class SharedCircuitBreaker:
+    """
+    Circuit breaker whose state lives in Redis, shared by all workers
+
+    Same states and interface as CircuitBreaker. Once any worker trips it,
+    every worker fails fast; after the cool-down a single probe (guarded by
+    a SET NX key) is let through cluster-wide. If Redis itself is
+    unreachable, calls are allowed (fail open).
+
+    Key layout:
+        circuit:{name}        -> hash: failures, opened_until, cooldown
+        circuit:{name}:probe  -> present while a half-open probe runs
+    """
+
+    ALLOW_SCRIPT = """
+    local opened_until = tonumber(redis.call('HGET', KEYS[1], 'opened_until') or '0')
+    if opened_until == 0 then
+        return 1
+    end
+    if tonumber(ARGV[1]) < opened_until then
+        return 0
+    end
+    if redis.call('SET', KEYS[2], '1', 'NX', 'PX', ARGV[2]) then
+        return 1
+    end
+    return 0
+    """
+
+    # ARGV: now, threshold, base_cooldown, max_cooldown
+    FAILURE_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local opened_until = tonumber(redis.call('HGET', KEYS[1], 'opened_until') or '0')
+    local cooldown = tonumber(redis.call('HGET', KEYS[1], 'cooldown') or ARGV[3])
+
+    if opened_until > 0 then
+        if now < opened_until then
+            return 0
+        end
+        -- Failed half-open probe: reopen with a longer cool-down
+        cooldown = math.min(cooldown * 2, tonumber(ARGV[4]))
+    else
+        if redis.call('HINCRBY', KEYS[1], 'failures', 1) < tonumber(ARGV[2]) then
+            return 0
+        end
+        cooldown = tonumber(ARGV[3])
+    end
+
+    redis.call('HSET', KEYS[1], 'opened_until', tostring(now + cooldown), 'cooldown', tostring(cooldown), 'failures', 0)
+    redis.call('DEL', KEYS[2])
+    return 1
+    """
+
+    SUCCESS_SCRIPT = """
+    local failures = tonumber(redis.call('HGET', KEYS[1], 'failures') or '0')
+    local opened_until = tonumber(redis.call('HGET', KEYS[1], 'opened_until') or '0')
+    if failures == 0 and opened_until == 0 then
+        return 0
+    end
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return opened_until > 0 and 1 or 0
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5,
+                 base_cooldown: float = 5.0, max_cooldown: float = 120.0,
+                 probe_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self._keys = [f"circuit:{name}", f"circuit:{name}:probe"]
+
+    def _client(self):
+        return get_redis_client()
+
+    def allow_request(self) -> bool:
+        try:
+            return bool(self._client().eval(
+                self.ALLOW_SCRIPT, 2, *self._keys, time.time(), int(self.probe_timeout * 1000)
+            ))
+        except Exception as e:
+            logger.warning(f"Circuit '{self.name}' state unavailable, allowing call: {e}")
+            return True
+
+    def record_success(self):
+        try:
+            if self._client().eval(self.SUCCESS_SCRIPT, 2, *self._keys):
+                logger.info(f"Circuit '{self.name}' closed, dependency recovered")
+        except Exception as e:
+            logger.warning(f"Circuit '{self.name}' could not record success: {e}")
+
+    def record_failure(self):
+        try:
+            opened = self._client().eval(
+                self.FAILURE_SCRIPT, 2, *self._keys,
+                time.time(), self.failure_threshold, self.base_cooldown, self.max_cooldown
+            )
+            if opened:
+                logger.warning(f"Circuit '{self.name}' open, failing fast")
+        except Exception as e:
+            logger.warning(f"Circuit '{self.name}' could not record failure: {e}")
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 if closed or half-open)"""
+        try:
+            opened_until = float(self._client().hget(self._keys[0], 'opened_until') or 0)
+        except Exception:
+            return 0.0
+        return max(0.0, opened_until - time.time())
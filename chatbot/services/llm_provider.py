@@ -0,0 +1,498 @@
+# chatbot/services/llm_provider.py
+
+from django.conf import settings
+from email.utils import parsedate_to_datetime
+from openai import OpenAI, APIConnectionError, APIStatusError
+from pydantic import BaseModel
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, get_args, get_origin
+from .circuit_breaker import SharedCircuitBreaker
+from .token_service import token_service
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProviderError(Exception):
+    """
+    Raised by providers when the upstream call fails
+    
+    Attributes:
+        retryable: True for timeouts, connection errors, 429 and 5xx
+        retry_after: Seconds the upstream asked us to wait (Retry-After), if any
+    """
+
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LLMUnavailableError(LLMProviderError):
+    """
+    Upstream is unhealthy (circuit open or retries exhausted); degrade now
+    
+    retry_after is the longer of the circuit's remaining open time and the
+    upstream's own Retry-After, or None when neither is known.
+    """
+
+
+# Retry-After for degraded responses when no better estimate is known
+DEFAULT_RETRY_AFTER = 30
+
+
+def retry_after_header(retry_after: Optional[float]) -> str:
+    """Retry-After header value: whole seconds, rounded up, at least 1"""
+    return str(max(1, math.ceil(retry_after or DEFAULT_RETRY_AFTER)))
+
+
+class LLMResponse(NamedTuple):
+    """Provider-neutral result of a model call"""
+    content: str
+    input_tokens: int
+    output_tokens: int
+    model: str
+    finish_reason: str
+    parsed: Any = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+class LLMProvider:
+    """
+    Interface every LLM backend implements
+
+    Chat-style calls take OpenAI chat messages ({'role', 'content'}).
+    `parse` takes Responses-API input (content may be a list of
+    input_text / input_image parts) and a pydantic schema.
+    """
+
+    name = None
+
+    def complete(self, messages: List[Dict], model: str, temperature: float = 0.7,
+                 max_tokens: int = 1000, timeout: Optional[float] = None) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, messages: List[Dict], model: str, temperature: float = 0.7,
+               max_tokens: int = 1000, timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield content deltas as they arrive"""
+        raise NotImplementedError
+
+    def parse(self, messages: List[Dict], model: str, schema,
+              timeout: Optional[float] = None) -> LLMResponse:
+        """Structured output: `parsed` holds a `schema` instance"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI backend (chat completions + Responses API structured output)"""
+
+    name = 'openai'
+
+    def __init__(self):
+        api_key = settings.OPENAI_API_KEY
+        if not api_key:
+            logger.error("❌ OPENAI_API_KEY not set in settings!")
+            raise ValueError("OPENAI_API_KEY is required")
+
+        # Retries and timeouts are handled by ResilientLLMProvider
+        self.client = OpenAI(api_key=api_key, max_retries=0, timeout=settings.LLM_REQUEST_TIMEOUT)
+
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        """Seconds from retry-after-ms / Retry-After (delta or HTTP date)"""
+        if response is None:
+            return None
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            value = headers.get('retry-after')
+            if not value:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _translate(self, error: Exception) -> LLMProviderError:
+        """Map OpenAI SDK errors onto LLMProviderError"""
+        if isinstance(error, APIConnectionError):  # includes timeouts
+            return LLMProviderError(str(error), retryable=True)
+        if isinstance(error, APIStatusError):
+            retryable = error.status_code in (408, 409, 429) or error.status_code >= 500
+            return LLMProviderError(str(error), retryable, self._retry_after(error.response))
+        return LLMProviderError(str(error), retryable=False)
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        usage = response.usage
+        return LLMResponse(
+            content=response.choices[0].message.content,
+            input_tokens=usage.prompt_tokens if usage else 0,
+            output_tokens=usage.completion_tokens if usage else 0,
+            model=model,
+            finish_reason=response.choices[0].finish_reason,
+        )
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        try:
+            chunks = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                stream=True,
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def parse(self, messages, model, schema, timeout=None):
+        try:
+            response = self.client.responses.parse(
+                model=model,
+                input=messages,
+                text_format=schema,
+                timeout=timeout,
+            )
+        except Exception as e:
+            raise self._translate(e) from e
+        usage = response.usage
+        return LLMResponse(
+            content=response.output_text,
+            input_tokens=usage.input_tokens if usage else 0,
+            output_tokens=usage.output_tokens if usage else 0,
+            model=model,
+            finish_reason='stop',
+            parsed=response.output_parsed,
+        )
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Local deterministic backend for load tests and offline benchmarks
+
+    Content and latency depend only on the request and `seed`, so runs are
+    repeatable. Latency is log-normal around `latency_ms`. `error_rate` of
+    calls raise LLMProviderError; errors are drawn per call (not per
+    request), so a retry of a failed request can succeed. Content is shaped to keep each pipeline working:
+        - prompts containing a JSON template with NUMBER placeholders get
+          the template back with numbers filled in (daily limits)
+        - `parse` builds a schema instance, reusing the "e.g." examples in
+          field descriptions (meal analysis)
+        - anything else gets filler text of about `output_tokens` tokens
+
+    Options (settings.LLM_FAKE_OPTIONS):
+        latency_ms, latency_sigma, stream_chunk_ms, output_tokens,
+        error_rate, image_tokens, seed
+    """
+
+    name = 'fake'
+
+    WORDS = (
+        'protein', 'fiber', 'balanced', 'meal', 'hydration', 'vegetables', 'portion',
+        'energy', 'recovery', 'sleep', 'calories', 'whole', 'grains', 'training',
+    )
+    EXAMPLE_PATTERN = re.compile(r"e\.g\.,?\s*'([^']+)'")
+    TEMPLATE_PATTERN = re.compile(r'\{[\s\S]*NUMBER[\s\S]*\}')
+
+    def __init__(self, options: Optional[Dict] = None):
+        options = options if options is not None else settings.LLM_FAKE_OPTIONS
+        self.latency_ms = options.get('latency_ms', 800)
+        self.latency_sigma = options.get('latency_sigma', 0.4)
+        self.stream_chunk_ms = options.get('stream_chunk_ms', 15)
+        self.output_tokens = options.get('output_tokens', 150)
+        self.error_rate = options.get('error_rate', 0.0)
+        self.image_tokens = options.get('image_tokens', 85)
+        self.seed = options.get('seed', 0)
+        self._calls = itertools.count()
+
+    def _rng(self, messages, model) -> random.Random:
+        payload = json.dumps([messages, model, self.seed], sort_keys=True, default=str)
+        return random.Random(hashlib.sha1(payload.encode('utf-8')).hexdigest())
+
+    def _wait(self, rng: random.Random):
+        if self.latency_ms > 0:
+            delay_ms = rng.lognormvariate(math.log(self.latency_ms), self.latency_sigma)
+            time.sleep(delay_ms / 1000)
+
+    def _maybe_fail(self):
+        if not self.error_rate:
+            return
+        if random.Random(f"{self.seed}:{next(self._calls)}").random() < self.error_rate:
+            raise LLMProviderError("Fake upstream error")
+
+    @staticmethod
+    def _count_text(text: str) -> int:
+        return len(token_service.encoding.encode(text))
+
+    def _count_input(self, messages) -> int:
+        tokens = token_service.reply_priming_tokens
+        for message in messages:
+            content = message.get('content')
+            if isinstance(content, str):
+                tokens += token_service.count_message_tokens(message)
+                continue
+            for part in content or []:
+                if part.get('type') == 'input_image':
+                    tokens += self.image_tokens
+                else:
+                    tokens += self._count_text(part.get('text', ''))
+        return tokens
+
+    def _text(self, rng: random.Random, max_tokens: int) -> str:
+        length = min(self.output_tokens, max_tokens)
+        words = [rng.choice(self.WORDS) for _ in range(max(1, length))]
+        return 'Fake reply: ' + ' '.join(words) + '.'
+
+    def _fill_template(self, rng: random.Random, prompt: str) -> Optional[str]:
+        match = self.TEMPLATE_PATTERN.search(prompt)
+        if not match:
+            return None
+        return re.sub(r'\bNUMBER\b', lambda _: str(round(rng.uniform(1, 2500), 1)), match.group())
+
+    def _build(self, rng: random.Random, annotation, description: str = ''):
+        """Value for a pydantic field annotation"""
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return {
+                name: self._build(rng, field.annotation, field.description or '')
+                for name, field in annotation.model_fields.items()
+            }
+        if get_origin(annotation) in (list, List):
+            item = get_args(annotation)[0]
+            return [self._build(rng, item) for _ in range(rng.randint(1, 3))]
+        if annotation is float:
+            return round(rng.uniform(0, 1000), 1)
+        if annotation is int:
+            return rng.randint(0, 1000)
+        if annotation is bool:
+            return rng.random() < 0.5
+
+        example = self.EXAMPLE_PATTERN.search(description)
+        if not example:
+            return rng.choice(self.WORDS)
+        # Scale the leading number of the example ("780 kcal" -> "612 kcal")
+        return re.sub(
+            r'\d+(\.\d+)?',
+            lambda m: f"{float(m.group()) * rng.uniform(0.5, 1.5):.0f}",
+            example.group(1),
+            count=1
+        )
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        rng = self._rng(messages, model)
+        self._wait(rng)
+        self._maybe_fail()
+
+        prompt = messages[-1].get('content', '') if messages else ''
+        content = self._fill_template(rng, prompt) or self._text(rng, max_tokens)
+
+        return LLMResponse(
+            content=content,
+            input_tokens=self._count_input(messages),
+            output_tokens=self._count_text(content),
+            model=model,
+            finish_reason='stop',
+        )
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        # Time to first token follows the latency distribution, then fixed gaps
+        response = self.complete(messages, model, temperature, max_tokens, timeout)
+        words = response.content.split(' ')
+        for i, word in enumerate(words):
+            if i and self.stream_chunk_ms:
+                time.sleep(self.stream_chunk_ms / 1000)
+            yield word if i == 0 else ' ' + word
+
+    def parse(self, messages, model, schema, timeout=None):
+        rng = self._rng(messages, model)
+        self._wait(rng)
+        self._maybe_fail()
+
+        data = self._build(rng, schema)
+        content = json.dumps(data)
+
+        return LLMResponse(
+            content=content,
+            input_tokens=self._count_input(messages),
+            output_tokens=self._count_text(content),
+            model=model,
+            finish_reason='stop',
+            parsed=schema.model_validate(data),
+        )
+
+
+class ResilientLLMProvider(LLMProvider):
+    """
+    Wraps a provider with per-call timeouts, bounded retries and a shared
+    circuit breaker
+    
+    - Each attempt gets LLM_REQUEST_TIMEOUT seconds.
+    - Retryable errors are retried up to LLM_MAX_RETRIES times with full
+      jitter backoff (base LLM_RETRY_BASE_DELAY, capped at
+      LLM_RETRY_MAX_DELAY), waiting at least the upstream's Retry-After.
+    - A retry only happens if its wait fits in what is left of
+      LLM_RETRY_SLEEP_BUDGET (total sleep per call), the whole call stays
+      within LLM_RETRY_DEADLINE and the circuit is still closed. A longer
+      wait, e.g. a large upstream Retry-After, fails right away with that
+      wait as retry_after, so a worker never sleeps through an incident.
+    - While the circuit is open calls fail immediately with
+      LLMUnavailableError and callers return their degraded response.
+    - A non-retryable error (e.g. 400, context length) means upstream
+      answered: it counts as a success for the breaker, which also frees
+      a half-open probe.
+    """
+
+    def __init__(self, provider: LLMProvider, breaker=None):
+        self.provider = provider
+        self.name = provider.name
+        self.request_timeout = settings.LLM_REQUEST_TIMEOUT
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.base_delay = settings.LLM_RETRY_BASE_DELAY
+        self.max_delay = settings.LLM_RETRY_MAX_DELAY
+        self.deadline = settings.LLM_RETRY_DEADLINE
+        self.sleep_budget = settings.LLM_RETRY_SLEEP_BUDGET
+        self.breaker = breaker or SharedCircuitBreaker(
+            f"llm:{provider.name}",
+            failure_threshold=settings.LLM_BREAKER_THRESHOLD,
+            base_cooldown=settings.LLM_BREAKER_COOLDOWN,
+            max_cooldown=settings.LLM_BREAKER_MAX_COOLDOWN,
+            probe_timeout=self.request_timeout,
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def _unavailable(self, message: str, retry_after: Optional[float] = None) -> LLMUnavailableError:
+        """Error telling callers how long until upstream is worth trying again"""
+        wait = max(self.breaker.retry_after(), retry_after or 0)
+        return LLMUnavailableError(message, retry_after=wait or None)
+
+    def _call(self, operation: str, call):
+        if not self.breaker.allow_request():
+            raise self._unavailable(f"{self.name} circuit open, not calling upstream")
+
+        started = time.monotonic()
+        attempt = 0
+        slept = 0.0
+
+        while True:
+            try:
+                result = call(self.request_timeout)
+            except LLMProviderError as e:
+                if not e.retryable:
+                    # The request was bad, upstream is fine; releases a half-open probe
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                error = e
+            except Exception as e:
+                # Unclassified errors (e.g. a custom provider) count as upstream failures
+                self.breaker.record_failure()
+                error = LLMProviderError(str(e))
+            else:
+                self.breaker.record_success()
+                return result
+
+            attempt += 1
+            delay = self._backoff(attempt, error.retry_after)
+            elapsed = time.monotonic() - started
+
+            if (attempt > self.max_retries or slept + delay > self.sleep_budget
+                    or elapsed + delay > self.deadline):
+                raise self._unavailable(
+                    f"{self.name} {operation} failed after {attempt} attempt(s): {error}",
+                    error.retry_after
+                ) from error
+            if not self.breaker.allow_request():
+                raise self._unavailable(
+                    f"{self.name} circuit opened during retries: {error}", error.retry_after
+                ) from error
+
+            logger.warning(f"{self.name} {operation} failed ({error}), retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+            slept += delay
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        return self._call('complete', lambda request_timeout: self.provider.complete(
+            messages, model, temperature, max_tokens, timeout or request_timeout
+        ))
+
+    def parse(self, messages, model, schema, timeout=None):
+        return self._call('parse', lambda request_timeout: self.provider.parse(
+            messages, model, schema, timeout or request_timeout
+        ))
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        # No retries once tokens may have been sent to the client
+        if not self.breaker.allow_request():
+            raise self._unavailable(f"{self.name} circuit open, not calling upstream")
+        try:
+            yield from self.provider.stream(messages, model, temperature, max_tokens,
+                                            timeout or self.request_timeout)
+        except LLMProviderError as e:
+            if e.retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except GeneratorExit:
+            # The client went away mid-stream; upstream was answering
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+
+
+PROVIDERS = {
+    'openai': OpenAIProvider,
+    'fake': FakeLLMProvider,
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> LLMProvider:
+    """
+    Process-wide provider selected by settings.LLM_PROVIDER
+
+    Wrapped in ResilientLLMProvider (timeouts, retries, circuit breaker).
+    Built lazily, so importing a service never needs an API key when the
+    fake backend is configured.
+    """
+    global _provider
+
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                name = settings.LLM_PROVIDER
+                if name not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected one of {', '.join(PROVIDERS)})")
+                _provider = ResilientLLMProvider(PROVIDERS[name]())
+                logger.info(f"LLM provider: {name}")
+    return _provider
@@ -0,0 +1,113 @@
+# chatbot/services/rate_limiter.py
+
+import time
+import uuid
+from django_redis import get_redis_connection
+from typing import Dict, List, NamedTuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int            # limit of the most constrained window
+    remaining: int        # requests left in that window
+    reset_after: int      # seconds until that window frees a slot
+    retry_after: int      # seconds to wait when denied, 0 otherwise
+
+
+class SlidingWindowRateLimiter:
+    """
+    Sliding-window-log rate limiter backed by Redis sorted sets
+    
+    Every window is checked and, if all pass, recorded by one Lua script,
+    so a request costs a single round trip and concurrent requests cannot
+    lose increments.
+    
+    Usage:
+        limiter = SlidingWindowRateLimiter({
+            'minute': {'limit': 30, 'window': 60},
+            'hour': {'limit': 100, 'window': 3600},
+        })
+        result = limiter.hit(f"user:{user_id}")
+    """
+    
+    # KEYS: one sorted set per window
+    # ARGV: now_ms, member, then (limit, window_ms) per key
+    # Returns: {allowed, limit, remaining, reset_ms, retry_ms}
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local member = ARGV[2]
+    local allowed = 1
+    local retry = 0
+    local best_limit, best_remaining, best_reset = 0, nil, 0
+    
+    for i, key in ipairs(KEYS) do
+        local limit = tonumber(ARGV[1 + i * 2])
+        local window = tonumber(ARGV[2 + i * 2])
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+        local count = redis.call('ZCARD', key)
+        local reset = window
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        if oldest[2] then
+            reset = tonumber(oldest[2]) + window - now
+        end
+        if count >= limit then
+            allowed = 0
+            retry = math.max(retry, reset)
+        end
+        local remaining = math.max(limit - count - 1, 0)
+        if best_remaining == nil or remaining < best_remaining then
+            best_limit, best_remaining, best_reset = limit, remaining, reset
+        end
+    end
+    
+    if allowed == 1 then
+        for i, key in ipairs(KEYS) do
+            local window = tonumber(ARGV[2 + i * 2])
+            redis.call('ZADD', key, now, member)
+            redis.call('PEXPIRE', key, window)
+        end
+    end
+    
+    return {allowed, best_limit, best_remaining or 0, best_reset, retry}
+    """
+    
+    def __init__(self, rate_limits: Dict[str, Dict[str, int]], prefix: str = 'rate_limit'):
+        self.rate_limits = rate_limits
+        self.prefix = prefix
+        self._script = None
+    
+    def _get_script(self):
+        if self._script is None:
+            self._script = get_redis_connection('default').register_script(self.SCRIPT)
+        return self._script
+    
+    def hit(self, identifier: str) -> RateLimitResult:
+        """
+        Record a request for an identifier if every window allows it
+        
+        Fails open (allows the request) when Redis is unreachable.
+        """
+        keys: List[str] = []
+        args: List = [int(time.time() * 1000), uuid.uuid4().hex]
+        
+        for period, config in self.rate_limits.items():
+            keys.append(f"{self.prefix}:{identifier}:{period}")
+            args.extend([config['limit'], config['window'] * 1000])
+        
+        try:
+            allowed, limit, remaining, reset_ms, retry_ms = self._get_script()(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"Rate limiter unavailable, allowing request: {e}")
+            smallest = min(self.rate_limits.values(), key=lambda c: c['limit'])
+            return RateLimitResult(True, smallest['limit'], smallest['limit'], 0, 0)
+        
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=int(limit),
+            remaining=int(remaining),
+            reset_after=-(-int(reset_ms) // 1000),
+            retry_after=-(-int(retry_ms) // 1000),
+        )
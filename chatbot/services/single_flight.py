@@ -0,0 +1,191 @@
+# chatbot/services/single_flight.py
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from fitora.redis_pool import get_pubsub_client, get_redis_client
+from typing import Any, Callable, Optional, Tuple
+import hashlib
+import json
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightError(Exception):
+    """
+    The coalesced call failed in the request that made it
+    
+    Attributes:
+        retry_after: The original error's retry_after, if it had one
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight LLM calls across workers
+
+    Calls are keyed by (user, feature, content hash). The first caller
+    takes a Redis lock (SET NX) and makes the call; duplicates arriving
+    while it runs subscribe to a result channel and get the same result
+    instead of calling the model again. Results are JSON, so values must
+    be JSON-serializable.
+
+    Key layout:
+        singleflight:{feature}:{user_id}:{digest}:lock    -> leader token
+        singleflight:{feature}:{user_id}:{digest}:result  -> JSON outcome
+        singleflight:{feature}:{user_id}:{digest}:done    -> pub/sub channel
+
+    Fails open: without Redis, or if the leader disappears or takes
+    longer than wait_timeout, a duplicate simply makes its own call.
+    """
+
+    # Delete the lock only if this leader still owns it
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, prefix: str = 'singleflight'):
+        self.prefix = prefix
+        self.enabled = settings.LLM_SINGLE_FLIGHT_ENABLED
+        self.lock_ttl = settings.LLM_SINGLE_FLIGHT_LOCK_TTL
+        self.wait_timeout = settings.LLM_SINGLE_FLIGHT_WAIT
+        self.result_ttl = 30
+
+    @staticmethod
+    def fingerprint(content) -> str:
+        """sha256 of bytes, str, or any JSON-serializable value"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        elif not isinstance(content, bytes):
+            content = json.dumps(content, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')
+        return hashlib.sha256(content).hexdigest()
+
+    def run(self, user_id, feature: str, content, fn: Callable[[], Any],
+            timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Call fn once per concurrent group of identical requests
+
+        Args:
+            user_id: Owner of the request (None disables coalescing)
+            feature: Feature name, e.g. 'chatbot', 'meal_analysis'
+            content: Request content identifying duplicates
+            fn: The model call
+            timeout: Max seconds a duplicate waits (defaults to LLM_SINGLE_FLIGHT_WAIT)
+
+        Returns:
+            Tuple of (result, shared) where shared is True when the result
+            came from another request's call
+
+        Raises:
+            SingleFlightError: If the shared call failed
+        """
+        if not self.enabled or user_id is None:
+            return fn(), False
+
+        base = f"{self.prefix}:{feature}:{user_id}:{self.fingerprint(content)}"
+        lock_key, result_key, channel = f"{base}:lock", f"{base}:result", f"{base}:done"
+        token = uuid.uuid4().hex
+
+        try:
+            client = get_redis_client()
+            acquired = client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+            if acquired:
+                # A result left by an earlier, finished group is not ours
+                client.delete(result_key)
+        except Exception as e:
+            logger.warning(f"Single-flight unavailable, calling directly: {e}")
+            return fn(), False
+
+        if acquired:
+            return self._lead(client, lock_key, result_key, channel, token, fn), False
+
+        outcome = self._follow(client, lock_key, result_key, channel, timeout or self.wait_timeout)
+        if outcome is None:
+            logger.info(f"Single-flight leader for {base} gone or too slow, calling directly")
+            return fn(), False
+
+        logger.info(f"Coalesced duplicate {feature} request for user {user_id}")
+        return self._unwrap(outcome), True
+
+    def _lead(self, client, lock_key, result_key, channel, token, fn):
+        try:
+            value = fn()
+        except Exception as e:
+            self._finish(client, lock_key, result_key, channel, token, {
+                'ok': False,
+                'error': str(e),
+                'retry_after': getattr(e, 'retry_after', None)
+            })
+            raise
+
+        self._finish(client, lock_key, result_key, channel, token, {'ok': True, 'value': value})
+        return value
+
+    def _finish(self, client, lock_key, result_key, channel, token, outcome):
+        """Store the outcome, wake waiting duplicates and release the lock"""
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.set(result_key, json.dumps(outcome, cls=DjangoJSONEncoder), ex=self.result_ttl)
+            pipe.publish(channel, b'1')
+            pipe.execute()
+            client.eval(self.RELEASE_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            # Waiting duplicates fall back to their own call once the lock expires
+            logger.warning(f"Single-flight could not publish result: {e}")
+
+    def _follow(self, client, lock_key, result_key, channel, timeout) -> Optional[dict]:
+        """
+        Wait for the leader's outcome; None if it never arrives
+
+        The subscription holds a connection of the pub/sub pool for the
+        whole wait; the short GET/EXISTS checks use the shared pool.
+        """
+        deadline = time.monotonic() + timeout
+        pubsub = get_pubsub_client().pubsub(ignore_subscribe_messages=True)
+
+        try:
+            # Subscribe before the first check so a publish in between is not lost
+            pubsub.subscribe(channel)
+            while True:
+                raw = client.get(result_key)
+                if raw is not None:
+                    return json.loads(raw)
+                if not client.exists(lock_key):
+                    raw = client.get(result_key)
+                    return json.loads(raw) if raw is not None else None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                pubsub.get_message(timeout=min(remaining, 1.0))
+
+        except Exception as e:
+            logger.warning(f"Single-flight wait failed: {e}")
+            return None
+
+        finally:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _unwrap(outcome: dict):
+        if not outcome.get('ok'):
+            raise SingleFlightError(
+                outcome.get('error', 'Coalesced call failed'), outcome.get('retry_after')
+            )
+        return outcome['value']
+
+
+# Singleton instance
+single_flight = SingleFlight()
@@ -2,7 +2,9 @@
 
 import tiktoken
 from django.conf import settings  # ⚠️ USE DJANGO SETTINGS
-from typing import List, Dict
+from bisect import bisect_right
+from itertools import accumulate
+from typing import List, Dict, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,6 +36,8 @@ class TokenService:
         }
         
         self.model = model
+        self.tokens_per_message = 4
+        self.reply_priming_tokens = 2
         self.max_tokens = self.model_limits.get(model, 8192)
         
         # ⚠️ READ FROM DJANGO SETTINGS
@@ -48,66 +52,100 @@ class TokenService:
     
     # ... rest of the methods stay the same ...
     
+    def count_message_tokens(self, message: Dict[str, str]) -> int:
+        """Count tokens for a single message, including per-message overhead"""
+        num_tokens = self.tokens_per_message
+        
+        for key, value in message.items():
+            try:
+                num_tokens += len(self.encoding.encode(str(value)))
+            except Exception as e:
+                logger.error(f"Token encoding error: {e}")
+                num_tokens += len(str(value)) // 4
+        
+        return num_tokens
+    
+    def get_token_counts(self, messages: List[Dict[str, str]]) -> List[int]:
+        """Per-message token counts, aligned with the message list"""
+        return [self.count_message_tokens(message) for message in messages]
+    
     def count_tokens(self, messages: List[Dict[str, str]]) -> int:
         """Count tokens in message list"""
-        num_tokens = 0
-        
-        for message in messages:
-            num_tokens += 4
-            for key, value in message.items():
-                try:
-                    num_tokens += len(self.encoding.encode(str(value)))
-                except Exception as e:
-                    logger.error(f"Token encoding error: {e}")
-                    num_tokens += len(str(value)) // 4
-        
-        num_tokens += 2
-        return num_tokens
+        return sum(self.get_token_counts(messages)) + self.reply_priming_tokens
     
     def trim_messages(
         self, 
         messages: List[Dict[str, str]], 
-        max_tokens: int = None
+        max_tokens: int = None,
+        token_counts: Optional[List[int]] = None
     ) -> List[Dict[str, str]]:
-        """Trim messages to fit within token limit"""
+        """
+        Trim messages to fit within token limit
+        
+        See trim_messages_with_count.
+        
+        Returns:
+            Trimmed list of messages
+        """
+        return self.trim_messages_with_count(messages, max_tokens, token_counts)[0]
+    
+    def trim_messages_with_count(
+        self, 
+        messages: List[Dict[str, str]], 
+        max_tokens: int = None,
+        token_counts: Optional[List[int]] = None
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Trim messages to fit within token limit and count what is kept
+        
+        Keeps the system message (if first) and the longest suffix of the
+        conversation that fits. The cut point is found with a binary search
+        over reverse prefix sums, so the whole routine is O(n).
+        
+        Args:
+            messages: Messages in chronological order
+            max_tokens: Token budget (defaults to max_context_tokens)
+            token_counts: Optional precomputed per-message counts
+        
+        Returns:
+            Tuple of (trimmed list of messages, their token count including
+            reply priming)
+        """
         if max_tokens is None:
             max_tokens = self.max_context_tokens
         
-        current_tokens = self.count_tokens(messages)
+        if token_counts is None:
+            token_counts = self.get_token_counts(messages)
+        
+        current_tokens = sum(token_counts) + self.reply_priming_tokens
         
         if current_tokens <= max_tokens:
             logger.debug(f"Messages within limit: {current_tokens}/{max_tokens} tokens")
-            return messages
-        
-        system_message = None
-        conversation_messages = messages
+            return messages, current_tokens
         
-        if messages and messages[0].get('role') == 'system':
-            system_message = messages[0]
-            conversation_messages = messages[1:]
+        has_system = bool(messages) and messages[0].get('role') == 'system'
+        start = 1 if has_system else 0
         
-        trimmed = []
-        current_tokens = 0
+        budget = max_tokens - self.reply_priming_tokens
+        kept_tokens = self.reply_priming_tokens
+        if has_system:
+            budget -= token_counts[0]
+            kept_tokens += token_counts[0]
         
-        if system_message:
-            system_tokens = self.count_tokens([system_message])
-            current_tokens = system_tokens
-            trimmed.append(system_message)
+        # suffix_sums[k] = tokens used by the last k + 1 conversation messages
+        suffix_sums = list(accumulate(reversed(token_counts[start:])))
+        keep = bisect_right(suffix_sums, budget)
+        if keep:
+            kept_tokens += suffix_sums[keep - 1]
         
-        for msg in reversed(conversation_messages):
-            msg_tokens = self.count_tokens([msg])
-            
-            if current_tokens + msg_tokens <= max_tokens:
-                trimmed.insert(1 if system_message else 0, msg)
-                current_tokens += msg_tokens
-            else:
-                break
+        cut = len(messages) - keep
+        trimmed = messages[:start] + messages[cut:]
         
         removed_count = len(messages) - len(trimmed)
         if removed_count > 0:
             logger.info(f"Trimmed {removed_count} messages to fit token limit")
         
-        return trimmed
+        return trimmed, kept_tokens
     
     def estimate_cost(self, input_tokens: int, output_tokens: int, model: str = None) -> float:
         """Estimate API cost"""
@@ -120,6 +158,8 @@ class TokenService:
             'gpt-4-turbo-preview': {'input': 0.01, 'output': 0.03},
             'gpt-3.5-turbo': {'input': 0.0005, 'output': 0.0015},
             'gpt-3.5-turbo-16k': {'input': 0.003, 'output': 0.004},
+            'gpt-4o': {'input': 0.0025, 'output': 0.01},
+            'gpt-4o-mini': {'input': 0.00015, 'output': 0.0006},
         }
         
         model_pricing = pricing.get(model, pricing['gpt-4-turbo-preview'])
@@ -0,0 +1,287 @@
+# chatbot/services/usage_rollup_service.py
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from typing import Dict, Optional
+from ..models import Message, UsageRollup, RollupWatermark
+from .token_service import token_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UsageRollupService:
+    """
+    Hourly and daily UsageRollup rows for every LLM call, per feature
+
+    Chat replies are folded in from AI messages by aggregate(): each run
+    aggregates only messages above the stored high-water mark
+    (message_id), so its cost is proportional to new traffic rather than
+    table size. Messages younger than `settle_seconds` are left for the
+    next run so rows from still-open transactions are not skipped.
+
+    Calls that leave no Message behind (meal analysis, daily limits,
+    chat titles and summaries) are added by record() as they happen,
+    under their own feature tag.
+    """
+
+    WATERMARK_NAME = 'chatbot_messages'
+    FEATURE = 'chatbot'
+
+    def __init__(self, batch_size: int = 5000, settle_seconds: int = 60):
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+
+    def _histogram_annotations(self) -> Dict:
+        """Per-bucket counts of response_time_ms, computed in the database"""
+        annotations = {}
+        lower = None
+        for i, upper in enumerate(UsageRollup.LATENCY_BUCKETS_MS + [None]):
+            condition = Q()
+            if lower is not None:
+                condition &= Q(response_time_ms__gte=lower)
+            if upper is not None:
+                condition &= Q(response_time_ms__lt=upper)
+            annotations[f'latency_{i}'] = Count('message_id', filter=condition)
+            lower = upper
+        return annotations
+
+    @staticmethod
+    def _latency_bucket(response_time_ms: int) -> int:
+        """Index of the LATENCY_BUCKETS_MS bucket a response time falls into"""
+        for i, upper in enumerate(UsageRollup.LATENCY_BUCKETS_MS):
+            if response_time_ms < upper:
+                return i
+        return len(UsageRollup.LATENCY_BUCKETS_MS)
+
+    def _merge_into(self, key: tuple, values: Dict, feature: Optional[str] = None):
+        """
+        Add aggregated values to the rollup row identified by key
+
+        Must run inside a transaction: the row is locked while it is
+        updated, so concurrent writers cannot lose increments.
+        """
+        period, bucket_start, user_id, model = key
+        rollup, _ = UsageRollup.objects.get_or_create(
+            period=period,
+            bucket_start=bucket_start,
+            user_id=user_id,
+            model=model,
+            feature=feature or self.FEATURE,
+        )
+        rollup = UsageRollup.objects.select_for_update().get(pk=rollup.pk)
+
+        histogram = rollup.latency_histogram or [0] * len(values['latency_histogram'])
+        rollup.latency_histogram = [a + b for a, b in zip(histogram, values['latency_histogram'])]
+        rollup.request_count += values['request_count']
+        rollup.input_tokens += values['input_tokens']
+        rollup.output_tokens += values['output_tokens']
+        rollup.total_tokens += values['total_tokens']
+        rollup.total_response_time_ms += values['total_response_time_ms']
+        rollup.estimated_cost += values['estimated_cost']
+        rollup.save()
+
+    def record(
+        self,
+        user_id,
+        feature: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        response_time_ms: int = 0
+    ):
+        """
+        Add one model call that is not stored as a Message to its rollups
+
+        Never raises: usage reporting must not fail the call it reports.
+
+        Args:
+            user_id: User ID (calls without a user are not rolled up)
+            feature: 'meal_analysis', 'daily_limits', 'chatbot_title', ...
+            model: Model name used for pricing
+            input_tokens: Prompt tokens reported by the API
+            output_tokens: Completion tokens reported by the API
+            response_time_ms: Latency of the call
+        """
+        if user_id is None:
+            return
+
+        input_tokens = input_tokens or 0
+        output_tokens = output_tokens or 0
+        histogram = [0] * (len(UsageRollup.LATENCY_BUCKETS_MS) + 1)
+        histogram[self._latency_bucket(response_time_ms)] = 1
+        values = {
+            'request_count': 1,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'total_tokens': input_tokens + output_tokens,
+            'total_response_time_ms': response_time_ms,
+            'latency_histogram': histogram,
+            'estimated_cost': Decimal(str(round(
+                token_service.estimate_cost(input_tokens, output_tokens, model), 6
+            ))),
+        }
+
+        hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+        try:
+            with transaction.atomic():
+                self._merge_into(('hour', hour, user_id, model or ''), values, feature)
+                self._merge_into(('day', hour.replace(hour=0), user_id, model or ''), values, feature)
+        except Exception as e:
+            logger.error(f"Usage rollup error for {feature} call of user {user_id}: {e}")
+
+    def aggregate(self, batch_size: Optional[int] = None) -> Dict:
+        """
+        Fold the next batch of AI messages into the rollups
+
+        The watermark row is locked for the duration, so concurrent runs
+        serialize instead of double counting.
+
+        Args:
+            batch_size: Max messages to consume (defaults to self.batch_size)
+
+        Returns:
+            Dict with the processed message count and the new watermark
+        """
+        batch_size = batch_size or self.batch_size
+        settled_before = timezone.now() - timedelta(seconds=self.settle_seconds)
+
+        with transaction.atomic():
+            RollupWatermark.objects.get_or_create(name=self.WATERMARK_NAME)
+            watermark = RollupWatermark.objects.select_for_update().get(name=self.WATERMARK_NAME)
+
+            pending = Message.objects.filter(
+                message_id__gt=watermark.last_message_id,
+                created_at__lt=settled_before,
+            )
+            # Id of the batch_size-th pending message, or the last one if fewer remain
+            nth = list(
+                pending.order_by('message_id')
+                .values_list('message_id', flat=True)[batch_size - 1:batch_size]
+            )
+            upper = nth[0] if nth else pending.aggregate(upper=Max('message_id'))['upper']
+
+            # Never move past a message that is not settled yet
+            unsettled = Message.objects.filter(
+                message_id__gt=watermark.last_message_id,
+                created_at__gte=settled_before,
+            ).aggregate(first=Min('message_id'))['first']
+            if upper is not None and unsettled is not None and unsettled <= upper:
+                upper = unsettled - 1 if unsettled - 1 > watermark.last_message_id else None
+            if upper is None:
+                return {'processed': 0, 'watermark': watermark.last_message_id}
+
+            batch = pending.filter(message_id__lte=upper)
+            processed = batch.count()
+
+            hourly = (
+                batch.filter(author='ai')
+                .annotate(hour=TruncHour('created_at'))
+                .values('hour', 'user_id', 'model_used')
+                .annotate(
+                    request_count=Count('message_id'),
+                    input_tokens=Sum('input_tokens'),
+                    output_tokens=Sum('output_tokens'),
+                    total_tokens=Sum('total_tokens'),
+                    total_response_time_ms=Sum('response_time_ms'),
+                    **self._histogram_annotations(),
+                )
+            )
+
+            buckets = len(UsageRollup.LATENCY_BUCKETS_MS) + 1
+            daily = defaultdict(lambda: {
+                'request_count': 0,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_tokens': 0,
+                'total_response_time_ms': 0,
+                'latency_histogram': [0] * buckets,
+                'estimated_cost': Decimal('0'),
+            })
+
+            for row in hourly:
+                model = row['model_used'] or ''
+                cost = Decimal('0')
+                # Answer-cache hits are recorded with model 'cache' and cost nothing
+                if model and model != 'cache':
+                    cost = Decimal(str(round(
+                        token_service.estimate_cost(row['input_tokens'], row['output_tokens'], model), 6
+                    )))
+                values = {
+                    'request_count': row['request_count'],
+                    'input_tokens': row['input_tokens'] or 0,
+                    'output_tokens': row['output_tokens'] or 0,
+                    'total_tokens': row['total_tokens'] or 0,
+                    'total_response_time_ms': row['total_response_time_ms'] or 0,
+                    'latency_histogram': [row[f'latency_{i}'] for i in range(buckets)],
+                    'estimated_cost': cost,
+                }
+                self._merge_into(('hour', row['hour'], row['user_id'], model), values)
+
+                day = row['hour'].replace(hour=0)
+                day_values = daily[(day, row['user_id'], model)]
+                for field, value in values.items():
+                    if field == 'latency_histogram':
+                        day_values[field] = [a + b for a, b in zip(day_values[field], value)]
+                    else:
+                        day_values[field] += value
+
+            for (day, user_id, model), values in daily.items():
+                self._merge_into(('day', day, user_id, model), values)
+
+            watermark.last_message_id = upper
+            watermark.save(update_fields=['last_message_id', 'updated_at'])
+
+        logger.info(f"Usage rollup: folded {processed} messages, watermark now {upper}")
+        return {'processed': processed, 'watermark': upper}
+
+    def aggregate_pending(self, max_batches: int = 20) -> Dict:
+        """Run aggregate() until caught up or max_batches is reached"""
+        total = 0
+        result = {'processed': 0, 'watermark': 0}
+        for _ in range(max_batches):
+            result = self.aggregate()
+            total += result['processed']
+            if result['processed'] < self.batch_size:
+                break
+        return {'processed': total, 'watermark': result['watermark']}
+
+    def summarize(self, queryset) -> Dict:
+        """
+        Totals and approximate p95 latency across a queryset of rollups
+
+        Args:
+            queryset: UsageRollup queryset (filter to a single period)
+
+        Returns:
+            Dict with request/token/cost totals and p95_response_time_ms
+        """
+        totals = queryset.aggregate(
+            request_count=Sum('request_count'),
+            total_tokens=Sum('total_tokens'),
+            total_response_time_ms=Sum('total_response_time_ms'),
+            estimated_cost=Sum('estimated_cost'),
+        )
+
+        histogram = [0] * (len(UsageRollup.LATENCY_BUCKETS_MS) + 1)
+        for row in queryset.values_list('latency_histogram', flat=True):
+            if row:
+                histogram = [a + b for a, b in zip(histogram, row)]
+
+        request_count = totals['request_count'] or 0
+        return {
+            'request_count': request_count,
+            'total_tokens': totals['total_tokens'] or 0,
+            'estimated_cost': float(totals['estimated_cost'] or 0),
+            'avg_response_time_ms': int((totals['total_response_time_ms'] or 0) / request_count) if request_count else 0,
+            'p95_response_time_ms': UsageRollup.percentile_from_histogram(histogram, 95),
+        }
+
+
+# Singleton instance
+usage_rollup_service = UsageRollupService()
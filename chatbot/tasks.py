@@ -0,0 +1,59 @@
+# chatbot/tasks.py
+
+import logging
+from celery import shared_task
+
+from .models import Session
+from .services.chat_service import chat_service
+from .services.usage_rollup_service import usage_rollup_service
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3)
+def summarize_session_async(self, session_id):
+    """
+    Fold older turns of a session into its running summary.
+    
+    Queued by ChatService.maybe_schedule_summary every
+    CHATBOT_SUMMARY_EVERY_TURNS turns, so the summary call never
+    blocks a chat request. The session's "summary pending" guard is
+    released once the task is done (or has given up), not between retries.
+    
+    Args:
+        session_id: Session ID
+    
+    Retries:
+        - On failure, retries up to 3 times with exponential backoff
+    """
+    try:
+        updated = chat_service.refresh_summary(session_id)
+        chat_service.clear_summary_pending(session_id)
+        return {'success': True, 'session_id': session_id, 'updated': updated}
+    
+    except Session.DoesNotExist:
+        logger.warning(f"Session {session_id} no longer exists, skipping summary")
+        chat_service.clear_summary_pending(session_id)
+        return {'success': False, 'error': 'Session not found'}
+    
+    except Exception as e:
+        logger.error(f"Error summarizing session {session_id}: {str(e)}")
+        
+        if self.request.retries >= self.max_retries:
+            chat_service.clear_summary_pending(session_id)
+        
+        retry_in = 2 ** self.request.retries  # 1, 2, 4 seconds
+        raise self.retry(exc=e, countdown=retry_in)
+
+
+@shared_task
+def aggregate_usage_rollups():
+    """
+    Fold new AI messages into the hourly/daily UsageRollup tables.
+    
+    Scheduled every few minutes via CELERY_BEAT_SCHEDULE; each run only
+    reads messages above the rollup high-water mark.
+    """
+    result = usage_rollup_service.aggregate_pending()
+    logger.info(f"Usage rollups updated: {result['processed']} messages processed")
+    return result
@@ -0,0 +1,371 @@
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.request import Request
+
+from fitora.idempotency import IDEMPOTENCY_HEADER, REPLAY_HEADER
+from fitora.redis_pool import get_redis_client
+from .models import Session, Message
+from .services.chat_service import chat_service
+from .services.circuit_breaker import SharedCircuitBreaker
+from .services.llm_provider import (
+    LLMProvider,
+    LLMProviderError,
+    LLMResponse,
+    LLMUnavailableError,
+    ResilientLLMProvider,
+)
+from .views import get_page_params, MAX_MESSAGE_PAGE_SIZE, SendMessageView
+
+
+class MessagePaginationTests(TestCase):
+    """Cursor pagination of ChatService.get_message_page"""
+
+    def create_session(self, count, same_time_every=1):
+        """Session with `count` messages; every `same_time_every` share a created_at"""
+        session = Session.objects.create(title='Pagination', user_id=1)
+        start = timezone.now() - timedelta(days=1)
+        Message.objects.bulk_create([
+            Message(
+                session=session,
+                author='user' if i % 2 == 0 else 'ai',
+                message=f'message {i}',
+                user_id=1,
+                created_at=start + timedelta(seconds=i // same_time_every)
+            )
+            for i in range(count)
+        ])
+        session.message_count = count
+        session.save(update_fields=['message_count'])
+        # Session ids can be reused between tests; never page a stale cache
+        chat_service.cache_service.invalidate(session.session_id)
+        return session
+
+    def page_through(self, session, limit):
+        """All pages, newest first, as lists of message texts"""
+        pages = []
+        cursor = None
+        while True:
+            messages, cursor = chat_service.get_message_page(session, cursor, limit)
+            pages.append([msg.message for msg in messages])
+            if cursor is None:
+                return pages
+            self.assertLessEqual(len(pages), 100, 'pagination does not terminate')
+
+    def test_pages_cover_every_message_once(self):
+        session = self.create_session(45)
+
+        pages = self.page_through(session, 20)
+
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        flattened = [text for page in reversed(pages) for text in page]
+        self.assertEqual(flattened, [f'message {i}' for i in range(45)])
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        session = self.create_session(40)
+
+        pages = self.page_through(session, 20)
+
+        self.assertEqual([len(page) for page in pages], [20, 20])
+
+    def test_single_page_has_no_cursor(self):
+        session = self.create_session(7)
+
+        messages, cursor = chat_service.get_message_page(session, None, 20)
+
+        self.assertEqual(len(messages), 7)
+        self.assertIsNone(cursor)
+
+    def test_empty_session(self):
+        session = self.create_session(0)
+
+        messages, cursor = chat_service.get_message_page(session, None, 20)
+
+        self.assertEqual(messages, [])
+        self.assertIsNone(cursor)
+
+    def test_equal_timestamps_across_page_boundary(self):
+        # Groups of 4 messages share a created_at, so every page boundary
+        # with limit 3 falls inside a group; message_id breaks the tie
+        session = self.create_session(22, same_time_every=4)
+
+        pages = self.page_through(session, 3)
+
+        flattened = [text for page in reversed(pages) for text in page]
+        self.assertEqual(flattened, [f'message {i}' for i in range(22)])
+
+    def test_malformed_cursor(self):
+        session = self.create_session(5)
+
+        for cursor in ('not-a-cursor', 'bm90IGEgY3Vyc29y'):
+            with self.assertRaises(ValueError):
+                chat_service.get_message_page(session, cursor, 20)
+
+    def test_page_params_are_clamped(self):
+        factory = APIRequestFactory()
+
+        def params(query):
+            return get_page_params(Request(factory.get('/', query)))
+
+        self.assertEqual(params({}), (None, 20))
+        self.assertEqual(params({'limit': 0}), (None, 1))
+        self.assertEqual(params({'limit': 1000}), (None, MAX_MESSAGE_PAGE_SIZE))
+        self.assertEqual(params({'cursor': 'abc', 'limit': 5}), ('abc', 5))
+        with self.assertRaises(ValueError):
+            params({'limit': 'ten'})
+
+
+class DegradedReplyTests(TestCase):
+    """SendMessageView while the model is unavailable"""
+
+    degraded = {
+        'success': False,
+        'content': "I'm having trouble connecting right now. Please try again in a moment.",
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'total_tokens': 0,
+        'response_time_ms': 0,
+        'model': 'test',
+        'finish_reason': 'error',
+        'retry_after': 4.2,
+    }
+    answer = {
+        'success': True,
+        'content': 'About 1.6 g of protein per kg.',
+        'input_tokens': 10,
+        'output_tokens': 8,
+        'total_tokens': 18,
+        'response_time_ms': 5,
+        'model': 'test',
+        'finish_reason': 'stop',
+    }
+
+    def setUp(self):
+        try:
+            get_redis_client().ping()
+        except Exception:
+            self.skipTest('Redis is not reachable')
+
+        self.user = get_user_model().objects.create_user(email='degraded@example.com')
+        # A new question per test, so the answer cache never answers it
+        self.message = f'How much protein after a workout? {uuid.uuid4().hex}'
+        self.key = uuid.uuid4().hex
+
+    def send(self):
+        request = APIRequestFactory().post(
+            '/send/',
+            {'message': self.message, 'new_session': True},
+            format='json',
+            headers={IDEMPOTENCY_HEADER: self.key}
+        )
+        force_authenticate(request, user=self.user)
+        return SendMessageView.as_view()(request)
+
+    @mock.patch.object(chat_service.ai_service, 'generate_title', return_value='Protein')
+    def test_degraded_reply_is_not_replayed(self, _):
+        with mock.patch.object(
+            chat_service.ai_service, 'generate_chat_response', side_effect=[self.degraded, self.answer]
+        ):
+            first = self.send()
+            retry = self.send()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Retry-After'], '5')
+        self.assertEqual(first.data['ai_message'], self.degraded['content'])
+
+        # The retry with the same key reaches the model instead of the stored fallback
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn(REPLAY_HEADER, retry)
+        self.assertNotIn('Retry-After', retry)
+        self.assertEqual(retry.data['ai_message'], self.answer['content'])
+
+    @mock.patch.object(chat_service.ai_service, 'generate_title', return_value='Protein')
+    def test_answer_is_replayed(self, _):
+        with mock.patch.object(
+            chat_service.ai_service, 'generate_chat_response', return_value=self.answer
+        ) as generate:
+            first = self.send()
+            retry = self.send()
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(retry[REPLAY_HEADER], 'true')
+        self.assertEqual(retry.data, first.data)
+
+
+class RedisTestCase(TestCase):
+    """Skips when Redis is not reachable"""
+
+    def setUp(self):
+        try:
+            get_redis_client().ping()
+        except Exception:
+            self.skipTest('Redis is not reachable')
+
+    @staticmethod
+    def breaker(**options):
+        """A breaker no other test shares state with"""
+        return SharedCircuitBreaker(f'test:{uuid.uuid4().hex}', **options)
+
+
+class SharedCircuitBreakerTests(RedisTestCase):
+    """Circuit state shared through Redis"""
+
+    def test_opens_after_threshold(self):
+        breaker = self.breaker(failure_threshold=3, base_cooldown=5)
+
+        for _ in range(2):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+
+        self.assertFalse(breaker.allow_request())
+        self.assertGreater(breaker.retry_after(), 4)
+
+    def test_success_resets_consecutive_failures(self):
+        breaker = self.breaker(failure_threshold=2)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow_request())
+
+    def test_single_half_open_probe(self):
+        breaker = self.breaker(failure_threshold=1, base_cooldown=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        self.assertTrue(breaker.allow_request())
+        # Cluster-wide: another worker's breaker object sees the same probe
+        self.assertFalse(SharedCircuitBreaker(breaker.name).allow_request())
+
+        breaker.record_success()
+        self.assertTrue(breaker.allow_request())
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_probe_doubles_cooldown_up_to_max(self):
+        breaker = self.breaker(failure_threshold=1, base_cooldown=0.1, max_cooldown=0.3)
+        breaker.record_failure()
+
+        time.sleep(0.11)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertGreater(breaker.retry_after(), 0.15)
+        self.assertLessEqual(breaker.retry_after(), 0.2)
+
+        time.sleep(0.21)
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertGreater(breaker.retry_after(), 0.25)
+        self.assertLessEqual(breaker.retry_after(), 0.3)
+
+
+class StubProvider(LLMProvider):
+    """Upstream that returns or raises the given outcomes in order"""
+
+    name = 'stub'
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=1000, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@override_settings(
+    LLM_MAX_RETRIES=2,
+    LLM_RETRY_BASE_DELAY=0.01,
+    LLM_RETRY_MAX_DELAY=0.05,
+    LLM_RETRY_DEADLINE=10,
+    LLM_RETRY_SLEEP_BUDGET=0.5,
+)
+class ResilientLLMProviderTests(RedisTestCase):
+    """Retries, sleep budget and breaker bookkeeping around a provider"""
+
+    response = LLMResponse('ok', 5, 2, 'test', 'stop')
+    messages = [{'role': 'user', 'content': 'hi'}]
+
+    def setUp(self):
+        super().setUp()
+        # time.sleep is patched module-wide; the tests wait with the real one
+        self.wait = time.sleep
+        sleep = mock.patch('chatbot.services.llm_provider.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def provider(self, *outcomes, **breaker_options):
+        stub = StubProvider(*outcomes)
+        return stub, ResilientLLMProvider(stub, breaker=self.breaker(**breaker_options))
+
+    def test_retryable_error_is_retried(self):
+        stub, provider = self.provider(LLMProviderError('502'), self.response)
+
+        self.assertEqual(provider.complete(self.messages, model='test'), self.response)
+        self.assertEqual(stub.calls, 2)
+        self.assertEqual(self.sleep.call_count, 1)
+
+    def test_gives_up_after_max_retries(self):
+        stub, provider = self.provider(*[LLMProviderError('502')] * 3)
+
+        with self.assertRaises(LLMUnavailableError):
+            provider.complete(self.messages, model='test')
+        self.assertEqual(stub.calls, 3)
+
+    def test_long_retry_after_degrades_without_sleeping(self):
+        stub, provider = self.provider(LLMProviderError('429', retry_after=20))
+
+        with self.assertRaises(LLMUnavailableError) as raised:
+            provider.complete(self.messages, model='test')
+
+        self.assertEqual(stub.calls, 1)
+        self.sleep.assert_not_called()
+        self.assertGreaterEqual(raised.exception.retry_after, 20)
+
+    def test_total_sleep_stays_within_budget(self):
+        stub, provider = self.provider(*[LLMProviderError('502', retry_after=0.3)] * 3)
+
+        with self.assertRaises(LLMUnavailableError):
+            provider.complete(self.messages, model='test')
+
+        slept = sum(call.args[0] for call in self.sleep.call_args_list)
+        self.assertLessEqual(slept, 0.5)
+        self.assertEqual(stub.calls, 2)
+
+    def test_open_circuit_fails_fast(self):
+        stub, provider = self.provider(self.response, failure_threshold=1, base_cooldown=5)
+        provider.breaker.record_failure()
+
+        with self.assertRaises(LLMUnavailableError) as raised:
+            provider.complete(self.messages, model='test')
+
+        self.assertEqual(stub.calls, 0)
+        self.assertGreater(raised.exception.retry_after, 4)
+
+    def test_non_retryable_error_releases_half_open_probe(self):
+        stub, provider = self.provider(
+            LLMProviderError('context length exceeded', retryable=False),
+            self.response,
+            failure_threshold=1,
+            base_cooldown=0.05,
+        )
+        provider.breaker.record_failure()
+        self.wait(0.06)
+
+        with self.assertRaises(LLMProviderError) as raised:
+            provider.complete(self.messages, model='test')
+        self.assertNotIsInstance(raised.exception, LLMUnavailableError)
+
+        # No probe left held: the next caller reaches upstream right away
+        self.assertFalse(get_redis_client().exists(f'circuit:{provider.breaker.name}:probe'))
+        self.assertEqual(provider.complete(self.messages, model='test'), self.response)
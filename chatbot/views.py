@@ -2,7 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from .models import Session, Message
+from .models import Session
 from .serializers import (
     ChatRequestSerializer,
     ChatResponseSerializer,
@@ -12,11 +12,32 @@ from .serializers import (
 )
 from drf_spectacular.utils import extend_schema
 from .services.chat_service import chat_service
+from .services.llm_provider import retry_after_header
 from rest_framework.permissions import IsAuthenticated
+from fitora.idempotency import idempotent
+from fitora.throttling import ChatbotRateThrottle, ChatbotReadRateThrottle, LLMBudgetThrottle
 import logging
 
 logger = logging.getLogger(__name__)
 
+MESSAGE_PAGE_SIZE = 20
+MAX_MESSAGE_PAGE_SIZE = 100
+
+
+def get_page_params(request):
+    """
+    Read cursor pagination params from the query string
+    
+    Returns:
+        Tuple of (cursor or None, limit clamped to 1..MAX_MESSAGE_PAGE_SIZE)
+    
+    Raises:
+        ValueError: If limit is not an integer
+    """
+    cursor = request.query_params.get('cursor') or None
+    limit = int(request.query_params.get('limit', MESSAGE_PAGE_SIZE))
+    return cursor, max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
 
 @extend_schema(
     tags=['Chat Bot']
@@ -30,11 +51,15 @@ class SendMessageView(APIView):
     ✓ Caching for fast responses
     ✓ Token management to prevent errors
     ✓ Rate limiting protection
+    ✓ Daily token/cost budget
     ✓ Comprehensive error handling
     """
     
     serializer_class = ChatRequestSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatbotRateThrottle, LLMBudgetThrottle]
+    
+    @idempotent('chatbot')
     def post(self, request):
         """
         Send a message to chatbot
@@ -44,6 +69,11 @@ class SendMessageView(APIView):
         - session_id: Integer (optional) - Continue specific session
         - new_session: Boolean (optional) - Force new conversation
         
+        Headers:
+        - Idempotency-Key (optional) - Repeats with the same key replay
+          the first response instead of sending the message again; a
+          fallback reply (with Retry-After) is not replayed
+        
         Returns:
         - session_id: Session ID (new or existing)
         - ai_message: AI's response
@@ -52,6 +82,9 @@ class SendMessageView(APIView):
         - ai_message_id: AI message ID
         - created_at: Timestamp
         - is_new_session: Boolean
+        
+        When the model is unavailable the reply is a fallback message and
+        the Retry-After header says when to try again.
         """
         try:
             # Validate request
@@ -71,7 +104,7 @@ class SendMessageView(APIView):
             logger.info(f"User {user_id} sent message to session {session_id}")
             
             # Process message
-            session, user_message, ai_message, is_new = chat_service.process_chat_message(
+            session, user_message, ai_message, is_new, retry_after = chat_service.process_chat_message(
                 user_id=user_id,
                 message=message,
                 session_id=session_id,
@@ -91,9 +124,14 @@ class SendMessageView(APIView):
             
             response_serializer = ChatResponseSerializer(data=response_data)
             if response_serializer.is_valid():
+                # A degraded reply tells the client when the model may be back
+                headers = None
+                if retry_after is not None:
+                    headers = {'Retry-After': retry_after_header(retry_after)}
                 return Response(
                     response_serializer.data,
-                    status=status.HTTP_200_OK
+                    status=status.HTTP_200_OK,
+                    headers=headers
                 )
             else:
                 logger.error(f"Response serialization failed: {response_serializer.errors}")
@@ -127,6 +165,7 @@ class UserSessionsView(APIView):
     Get all chat sessions for the authenticated user
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatbotReadRateThrottle]
     
     def get(self, request):
         """
@@ -166,37 +205,47 @@ class UserSessionsView(APIView):
 )
 class SessionDetailView(APIView):
     """
-    Get detailed information about a specific session including all messages
+    Get detailed information about a specific session with its latest messages
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatbotReadRateThrottle]
     
     def get(self, request, session_id):
         """
-        Retrieve a specific session with all its messages
+        Retrieve a specific session with one page of its messages
         
         Path Parameters:
         - session_id: Integer - The session ID to retrieve
         
+        Query Parameters:
+        - limit: Integer (optional, default=20, max=100) - Page size
+        - cursor: String (optional) - next_cursor from a previous page
+        
         Returns:
-        - Session details with all messages in chronological order
+        - Session details with the newest page of messages in chronological
+          order, and next_cursor for loading older messages (null when none)
         """
         try:
+            cursor, limit = get_page_params(request)
+            
             # Get the session
             session = get_object_or_404(Session, session_id=session_id)
             
-            # Verify ownership (user must have at least one message in this session)
-            first_message = Message.objects.filter(session_id=session_id).first()
-            if first_message and first_message.user_id != request.user.id:
+            # Verify ownership
+            if session.user_id is not None and session.user_id != request.user.id:
                 return Response(
                     {'error': 'You do not have access to this session'},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Get all messages for this session
-            messages = chat_service.get_session_messages(session_id)
+            # Get one page of messages for this session
+            messages, next_cursor = chat_service.get_message_page(session, cursor, limit)
             
             # Serialize session with messages
-            serializer = SessionDetailSerializer(session)
+            serializer = SessionDetailSerializer(
+                session,
+                context={'messages': messages, 'next_cursor': next_cursor}
+            )
             
             logger.info(f"Retrieved session {session_id} with {len(messages)} messages")
             
@@ -205,6 +254,12 @@ class SessionDetailView(APIView):
                 status=status.HTTP_200_OK
             )
         
+        except ValueError:
+            return Response(
+                {'error': 'Invalid cursor or limit parameter'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         except Exception as e:
             logger.exception(f"Error retrieving session details: {str(e)}")
             return Response(
@@ -220,6 +275,7 @@ class MessageHistoryView(APIView):
     Get message history for a specific session
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatbotReadRateThrottle]
     
     def get(self, request):
         """
@@ -227,15 +283,17 @@ class MessageHistoryView(APIView):
         
         Query Parameters:
         - session_id: Integer (required) - The session ID
-        - limit: Integer (optional, default=20) - Number of recent messages
+        - limit: Integer (optional, default=20, max=100) - Page size
+        - cursor: String (optional) - next_cursor from a previous page
         
         Returns:
-        - List of messages with metadata
+        - One page of messages with metadata, newest page first, and
+          next_cursor for loading older messages (null when none)
         """
         try:
             # Get parameters
             session_id = request.query_params.get('session_id', None)
-            limit = int(request.query_params.get('limit', 20))
+            cursor, limit = get_page_params(request)
             
             if session_id is None:
                 return Response(
@@ -246,25 +304,25 @@ class MessageHistoryView(APIView):
             session_id = int(session_id)
             
             # Check if session exists
-            if not Session.objects.filter(session_id=session_id).exists():
+            session = Session.objects.only('session_id', 'user_id', 'message_count').filter(
+                session_id=session_id
+            ).first()
+            
+            if session is None:
                 return Response(
                     {'error': 'Session not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             
             # Verify ownership
-            first_message = Message.objects.filter(session_id=session_id).first()
-            if first_message and first_message.user_id != request.user.id:
+            if session.user_id is not None and session.user_id != request.user.id:
                 return Response(
                     {'error': 'You do not have access to this session'},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            # Get messages
-            if limit:
-                messages = chat_service.get_last_messages(session_id, limit)
-            else:
-                messages = chat_service.get_session_messages(session_id)
+            # Get one page of messages
+            messages, next_cursor = chat_service.get_message_page(session, cursor, limit)
             
             # Serialize and return
             serializer = MessageSerializer(messages, many=True)
@@ -273,14 +331,15 @@ class MessageHistoryView(APIView):
                 {
                     'session_id': session_id,
                     'message_count': len(messages),
-                    'messages': serializer.data
+                    'messages': serializer.data,
+                    'next_cursor': next_cursor
                 },
                 status=status.HTTP_200_OK
             )
         
         except ValueError:
             return Response(
-                {'error': 'Invalid session_id or limit parameter'},
+                {'error': 'Invalid session_id, limit or cursor parameter'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -299,6 +358,7 @@ class DeleteSessionView(APIView):
     Delete a session and all its messages
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatbotReadRateThrottle]
     
     def delete(self, request, session_id):
         """
@@ -314,8 +374,7 @@ class DeleteSessionView(APIView):
             session = get_object_or_404(Session, session_id=session_id)
             
             # Verify ownership
-            first_message = Message.objects.filter(session_id=session_id).first()
-            if first_message and first_message.user_id != request.user.id:
+            if session.user_id is not None and session.user_id != request.user.id:
                 return Response(
                     {'error': 'You do not have permission to delete this session'},
                     status=status.HTTP_403_FORBIDDEN
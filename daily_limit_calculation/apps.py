@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DailyLimitCalculationConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'daily_limit_calculation'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
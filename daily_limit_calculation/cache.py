@@ -0,0 +1,93 @@
+# daily_limit_calculation/cache.py
+
+import logging
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DailyIngredientsLimit
+from .serializers import DailyIngredientsLimitSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def limits_cache_key(user_id) -> str:
+    return f"daily_limits:payload:{user_id}"
+
+
+def limits_version_key(user_id) -> str:
+    return f"daily_limits:version:{user_id}"
+
+
+def _current_version(cached: dict, version_key: str):
+    """The user's version token, created if missing; None if it cannot be read"""
+    version = cached.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(version_key, version, timeout=settings.DAILY_LIMITS_PAYLOAD_CACHE_TTL):
+            version = cache.get(version_key)
+    return version
+
+
+def get_cached_limits(user) -> dict:
+    """
+    Serialized limits of a user (DailyIngredientsLimitSerializer data), read-through
+    
+    A hit is a single cache round trip; a miss is one query (limits joined
+    with the user for user_email) and fills the cache for
+    DAILY_LIMITS_PAYLOAD_CACHE_TTL seconds.
+    
+    Entries are versioned: each is stored with the user's version token as
+    read *before* the query, and invalidate_cached_limits replaces the
+    token. A reader that queried the old row just before a save commits
+    therefore writes an entry that no later read accepts, instead of
+    serving the stale limits until the TTL runs out.
+    
+    Raises:
+        DailyIngredientsLimit.DoesNotExist: If the user has no limits yet
+    """
+    cache_key, version_key = limits_cache_key(user.pk), limits_version_key(user.pk)
+    
+    try:
+        cached = cache.get_many([cache_key, version_key])
+        version = _current_version(cached, version_key)
+    except Exception as e:
+        logger.warning(f"Limits cache unavailable: {str(e)}")
+        cached, version = {}, None
+    
+    entry = cached.get(cache_key)
+    if version is not None and entry is not None and entry.get('version') == version:
+        return entry['data']
+    
+    daily_limits = DailyIngredientsLimit.objects.select_related('user').get(user=user)
+    payload = dict(DailyIngredientsLimitSerializer(daily_limits).data)
+    
+    if version is not None:
+        try:
+            cache.set(
+                cache_key,
+                {'version': version, 'data': payload},
+                timeout=settings.DAILY_LIMITS_PAYLOAD_CACHE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Could not cache limits for user {user.pk}: {str(e)}")
+    
+    return payload
+
+
+def invalidate_cached_limits(*user_ids):
+    """
+    Give each user a new version token, so no cached payload (including
+    one being written right now from an older read) is served again
+    """
+    if not user_ids:
+        return
+    
+    try:
+        cache.set_many(
+            {limits_version_key(user_id): uuid.uuid4().hex for user_id in user_ids},
+            timeout=settings.DAILY_LIMITS_PAYLOAD_CACHE_TTL
+        )
+    except Exception as e:
+        # Bounded by DAILY_LIMITS_PAYLOAD_CACHE_TTL
+        logger.warning(f"Could not invalidate cached limits of {len(user_ids)} users: {str(e)}")
@@ -0,0 +1,45 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+
+class DailyLimitsConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes completion of asynchronous daily-limits generation to the user
+    
+    Connect to ws/daily-limits/ before (or right after) calling
+    POST generate/?async=true; calculate_daily_limits_async sends
+    daily_limits_completed or daily_limits_failed to the user's group.
+    """
+    
+    @staticmethod
+    def group_name_for(user_id) -> str:
+        return f"daily_limits_{user_id}"
+    
+    async def connect(self):
+        user = self.scope.get('user')
+        
+        if not user or user.is_anonymous:
+            await self.close(code=4001)
+            return
+        
+        self.group_name = self.group_name_for(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    
+    async def daily_limits_completed(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'daily_limits_completed',
+            'task_id': event['task_id'],
+            'data': event['data'],
+        }))
+    
+    async def daily_limits_failed(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'daily_limits_failed',
+            'task_id': event['task_id'],
+            'message': event['message'],
+        }))
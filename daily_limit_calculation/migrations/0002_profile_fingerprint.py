@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_limit_calculation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyingredientslimit',
+            name='profile_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:21
+
+from django.db import migrations, models
+
+
+def list_to_dict(apps, schema_editor):
+    """[{"name": "calories", "daily_norm": 2000}, ...] -> {"calories": 2000.0, ...}"""
+    DailyIngredientsLimit = apps.get_model('daily_limit_calculation', 'DailyIngredientsLimit')
+
+    for limits in DailyIngredientsLimit.objects.only('id', 'ingredients_summary').iterator(chunk_size=500):
+        if not isinstance(limits.ingredients_summary, list):
+            continue
+        limits.ingredients_summary = {
+            item['name']: float(item['daily_norm'])
+            for item in limits.ingredients_summary
+            if isinstance(item, dict) and 'name' in item and 'daily_norm' in item
+        }
+        limits.save(update_fields=['ingredients_summary'])
+
+
+def dict_to_list(apps, schema_editor):
+    DailyIngredientsLimit = apps.get_model('daily_limit_calculation', 'DailyIngredientsLimit')
+
+    for limits in DailyIngredientsLimit.objects.only('id', 'ingredients_summary').iterator(chunk_size=500):
+        if not isinstance(limits.ingredients_summary, dict):
+            continue
+        limits.ingredients_summary = [
+            {'name': name, 'daily_norm': daily_norm}
+            for name, daily_norm in limits.ingredients_summary.items()
+        ]
+        limits.save(update_fields=['ingredients_summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_limit_calculation', '0002_profile_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyingredientslimit',
+            name='ingredients_summary',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(list_to_dict, dict_to_list),
+    ]
@@ -15,7 +15,12 @@ class DailyIngredientsLimit(models.Model):
         related_name='daily_limits'
     )
     
-    ingredients_summary = models.JSONField(default=list)
+    # {ingredient name: daily norm}, e.g. {"calories": 2000.0, "protein": 120.0}
+    ingredients_summary = models.JSONField(default=dict)
+    
+    # Exact profile fingerprint the limits were computed from
+    # (DailyLimitsCalculator.user_fingerprint); unchanged -> no recalculation
+    profile_fingerprint = models.CharField(max_length=64, blank=True, default='')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -41,41 +46,42 @@ class DailyIngredientsLimit(models.Model):
         'vitamin_e', 'vitamin_k', 'selenium'
     ]
     
+    INGREDIENT_NAMES = frozenset(INGREDIENTS)
+    
     def __getattr__(self, name):
         """Automatically handle *_target properties"""
         if name.endswith('_target'):
             ingredient_name = name[:-7]
-            if ingredient_name in self.INGREDIENTS:
-                ingredient = self.get_ingredient(ingredient_name)
-                return ingredient['daily_norm'] if ingredient else None
+            if ingredient_name in self.INGREDIENT_NAMES:
+                return self.ingredients_summary.get(ingredient_name)
         raise AttributeError(f"No attribute: {name}")
     
     def get_ingredient(self, ingredient_name):
         """Get specific ingredient by name"""
-        for ingredient in self.ingredients_summary:
-            if ingredient['name'] == ingredient_name:
-                return ingredient
-        return None
+        daily_norm = self.ingredients_summary.get(ingredient_name)
+        if daily_norm is None:
+            return None
+        return {'name': ingredient_name, 'daily_norm': daily_norm}
     
     @property
     def is_valid(self):
         """Check if ingredients_summary has required structure"""
-        if not isinstance(self.ingredients_summary, list):
+        if not isinstance(self.ingredients_summary, dict):
             return False
         if len(self.ingredients_summary) < 10:
             return False
         return all(
-            isinstance(item, dict) and 
-            'name' in item and 
-            'daily_norm' in item
-            for item in self.ingredients_summary
+            isinstance(name, str) and
+            isinstance(daily_norm, (int, float)) and
+            not isinstance(daily_norm, bool)
+            for name, daily_norm in self.ingredients_summary.items()
         )
     
     def to_dict(self):
         """Convert to dictionary for API responses"""
         return {
             'id': str(self.id),
-            'user_id': str(self.user.id),
+            'user_id': str(self.user_id),
             'ingredients_summary': self.ingredients_summary,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
@@ -83,7 +83,7 @@ class DailyLimitsWithProgressSerializer(serializers.Serializer):
             ingredients_with_progress[name] = {
                 'daily_norm': daily_norm,
                 'consumed_today': consumed,
-                'remaining': remaining,
+                'remaining': round(remaining, 2),
                 'percentage': round(percentage, 2),
                 'status': self._get_status(percentage),
             }
@@ -115,14 +115,19 @@ class QuickAccessLimitsSerializer(serializers.Serializer):
     fat = serializers.SerializerMethodField()
     carbs = serializers.SerializerMethodField()
     
+    @staticmethod
+    def _summary(obj):
+        """Model instance or cached payload (cache.get_cached_limits)"""
+        return obj['ingredients_summary'] if isinstance(obj, dict) else obj.ingredients_summary
+    
     def get_calories(self, obj):
-        return obj.ingredients_summary.get('calories')
+        return self._summary(obj).get('calories')
     
     def get_protein(self, obj):
-        return obj.ingredients_summary.get('protein')
+        return self._summary(obj).get('protein')
     
     def get_fat(self, obj):
-        return obj.ingredients_summary.get('fat')
+        return self._summary(obj).get('fat')
     
     def get_carbs(self, obj):
-        return obj.ingredients_summary.get('carbs')
\ No newline at end of file
+        return self._summary(obj).get('carbs')
\ No newline at end of file
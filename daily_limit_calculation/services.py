@@ -1,25 +1,199 @@
 # daily_limit_calculation/services.py
 
+import hashlib
 import json
 import logging
 import re
-from typing import Dict, List, Any
+import time
+from typing import Dict, List, Any, Optional
 from datetime import date
 
 from django.conf import settings
-from openai import OpenAI
+from django.core.cache import cache
+
+from chatbot.services.budget_service import budget_service
+from chatbot.services.usage_rollup_service import usage_rollup_service
+from chatbot.services.llm_provider import get_llm_provider
+from chatbot.services.single_flight import single_flight
 
 logger = logging.getLogger(__name__)
 
 
+class NutritionRuleEngine:
+    """
+    Deterministic daily limits from a user profile.
+    
+    Pure arithmetic, no I/O: Mifflin-St Jeor BMR, activity multiplier (TDEE),
+    goal adjustment, macro split by preferred diet, and micronutrient
+    targets from the NIH Dietary Reference Intakes by age and gender.
+    Dietary restrictions adjust the affected targets.
+    
+    Input is the survey_data dict built by DailyLimitsCalculator.
+    """
+    
+    ACTIVITY_MULTIPLIERS = {
+        'sedentary': 1.2,
+        'light': 1.375,
+        'moderate': 1.55,
+        'active': 1.725,
+        'very_active': 1.9,
+    }
+    
+    # kcal added to TDEE per goal
+    GOAL_ADJUSTMENTS = {
+        'lose_weight': -500,  # ~0.5 kg/week deficit
+        'gain_muscle': 300,
+        'maintain': 0,
+    }
+    
+    # Never go below these, whatever the deficit
+    MIN_CALORIES = {'male': 1500, 'female': 1200}
+    
+    # Share of calories from (protein, fat, carbs)
+    MACRO_SPLITS = {
+        'balanced': (0.20, 0.30, 0.50),
+        'low_carbs': (0.30, 0.40, 0.30),
+        'keto': (0.20, 0.75, 0.05),
+        'high_protein': (0.35, 0.30, 0.35),
+        'low_fat': (0.25, 0.20, 0.55),
+    }
+    
+    # Protein floor in g per kg of body weight
+    PROTEIN_PER_KG = {
+        'lose_weight': 1.6,
+        'gain_muscle': 1.6,
+        'maintain': 0.8,
+    }
+    
+    FIBER_PER_1000_KCAL = 14
+    SATURATED_FAT_SHARE = 0.10  # of calories, upper limit
+    
+    # Age-banded targets: rows of (min_age, male, female), oldest band first
+    MICRONUTRIENTS = {
+        'calcium': [(71, 1200, 1200), (51, 1000, 1200), (19, 1000, 1000), (0, 1300, 1300)],
+        'iron': [(51, 8, 8), (19, 8, 18), (0, 11, 15)],
+        'magnesium': [(31, 420, 320), (19, 400, 310), (0, 410, 360)],
+        'potassium': [(19, 3400, 2600), (0, 3000, 2300)],
+        'zinc': [(19, 11, 8), (0, 11, 9)],
+        'sodium': [(0, 2300, 2300)],
+        'vitamin_a': [(0, 900, 700)],
+        'vitamin_b6': [(51, 1.7, 1.5), (19, 1.3, 1.3), (0, 1.3, 1.2)],
+        'vitamin_b9': [(0, 400, 400)],
+        'vitamin_b12': [(0, 2.4, 2.4)],
+        'vitamin_c': [(19, 90, 75), (0, 75, 65)],
+        'vitamin_d': [(71, 20, 20), (0, 15, 15)],
+        'vitamin_e': [(0, 15, 15)],
+        'vitamin_k': [(19, 120, 90), (0, 75, 75)],
+        'selenium': [(0, 55, 55)],
+        'omega_3': [(0, 1.6, 1.1)],
+        'omega_6': [(51, 14, 11), (0, 17, 12)],
+        'cholesterol': [(0, 300, 300)],
+    }
+    
+    # Restriction keyword -> multipliers applied to targets
+    RESTRICTION_MULTIPLIERS = {
+        'vegan': {'iron': 1.8, 'zinc': 1.5},
+        'vegetarian': {'iron': 1.8, 'zinc': 1.5},
+    }
+    
+    # Restriction keyword -> upper caps on targets
+    RESTRICTION_CAPS = {
+        'sodium': {'sodium': 1500},
+        'salt': {'sodium': 1500},
+        'hypertension': {'sodium': 1500},
+        'cholesterol': {'cholesterol': 200},
+    }
+    
+    def calculate(self, survey_data: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Compute all limits in DailyLimitsCalculator.RDI_DEFAULTS
+        
+        Args:
+            survey_data: Dict with age, gender, weight, height,
+                activity_level, goal, dietary_restrictions, preferred_diet
+        
+        Returns:
+            Dict of ingredient name -> daily norm
+        """
+        age = survey_data['age']
+        gender = survey_data['gender']
+        weight = float(survey_data['weight'])
+        height = float(survey_data['height'])
+        goal = survey_data['goal']
+        
+        limits = dict(DailyLimitsCalculator.RDI_DEFAULTS)
+        
+        # Energy: Mifflin-St Jeor, then activity and goal
+        bmr = 10 * weight + 6.25 * height - 5 * age + self._by_gender({'male': 5, 'female': -161}, gender)
+        tdee = bmr * self.ACTIVITY_MULTIPLIERS.get(survey_data['activity_level'], 1.55)
+        calories = max(
+            tdee + self.GOAL_ADJUSTMENTS.get(goal, 0),
+            self._by_gender(self.MIN_CALORIES, gender)
+        )
+        
+        # Macros: diet split, with a protein floor by body weight
+        protein_share, fat_share, _ = self.MACRO_SPLITS.get(
+            survey_data.get('preferred_diet'), self.MACRO_SPLITS['balanced']
+        )
+        protein = max(calories * protein_share / 4, weight * self.PROTEIN_PER_KG.get(goal, 0.8))
+        fat = calories * fat_share / 9
+        carbs = max(calories - protein * 4 - fat * 9, 0) / 4
+        saturated_fat = min(calories * self.SATURATED_FAT_SHARE / 9, fat)
+        
+        limits.update({
+            'calories': round(calories),
+            'protein': round(protein, 1),
+            'fat': round(fat, 1),
+            'carbs': round(carbs, 1),
+            'fiber': round(calories / 1000 * self.FIBER_PER_1000_KCAL, 1),
+            'saturated_fat': round(saturated_fat, 1),
+            'unsaturated_fat': round(fat - saturated_fat, 1),
+        })
+        
+        # Micronutrients by age band and gender
+        for name, bands in self.MICRONUTRIENTS.items():
+            _, male, female = next(band for band in bands if age >= band[0])
+            limits[name] = self._by_gender({'male': male, 'female': female}, gender)
+        
+        self._apply_restrictions(limits, survey_data.get('dietary_restrictions') or [])
+        
+        return {name: float(value) for name, value in limits.items()}
+    
+    def _apply_restrictions(self, limits: Dict[str, float], restrictions: List[str]):
+        """Adjust targets in place for free-text restrictions like 'Vegan', 'low salt'"""
+        text = ' '.join(restrictions).lower()
+        
+        multipliers = {}
+        for keyword, factors in self.RESTRICTION_MULTIPLIERS.items():
+            if keyword in text:
+                for name, factor in factors.items():
+                    # Vegan and vegetarian overlap; apply each nutrient once
+                    multipliers[name] = max(multipliers.get(name, 1), factor)
+        for name, factor in multipliers.items():
+            limits[name] = round(limits[name] * factor, 1)
+        
+        for keyword, caps in self.RESTRICTION_CAPS.items():
+            if keyword in text:
+                for name, cap in caps.items():
+                    limits[name] = min(limits[name], cap)
+    
+    @staticmethod
+    def _by_gender(values: Dict[str, float], gender: str) -> float:
+        """Value for the gender; the midpoint when it is not male/female"""
+        if gender in values:
+            return values[gender]
+        return (values['male'] + values['female']) / 2
+
+
 class DailyLimitsCalculator:
     """
     Calculates personalized daily ingredient limits based on user profile.
-    Uses OpenAI API to generate nutritionally sound recommendations.
+    Limits come from NutritionRuleEngine; the configured LLM provider can
+    optionally refine them (settings.DAILY_LIMITS_LLM_REFINEMENT).
     
     SOLID Principles:
     - Single Responsibility: Only calculates limits
-    - Dependency Inversion: Injected OpenAI client
+    - Dependency Inversion: Injected LLM provider
     """
     
     # RDI defaults (Recommended Dietary Intake)
@@ -51,12 +225,33 @@ class DailyLimitsCalculator:
         'selenium': 55,
     }
     
-    def __init__(self):
-        """Initialize with OpenAI client"""
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    # Bump whenever the refinement prompt or NutritionRuleEngine changes:
+    # it is part of every profile fingerprint, so older cached results
+    # are never read again and simply expire
+    PROMPT_VERSION = 1
+    
+    FINGERPRINT_FIELDS = (
+        'gender', 'age', 'weight', 'height', 'activity_level',
+        'goal', 'preferred_diet', 'dietary_restrictions',
+    )
+    NUMERIC_FINGERPRINT_FIELDS = ('age', 'weight', 'height')
+    
+    def __init__(self, provider=None, engine=None):
+        """Initialize with an LLM provider (defaults to settings.LLM_PROVIDER)"""
+        self._provider = provider
+        self.engine = engine or NutritionRuleEngine()
         self.model = getattr(settings, 'OPENAI_MODEL', 'gpt-4')
+        self.refinement_tolerance = settings.DAILY_LIMITS_REFINEMENT_TOLERANCE
+        self.cache_ttl = settings.DAILY_LIMITS_CACHE_TTL
+    
+    @property
+    def provider(self):
+        # Only needed for refinement, so built on first use
+        if self._provider is None:
+            self._provider = get_llm_provider()
+        return self._provider
     
-    def calculate_from_user(self, user) -> Dict[str, float]:
+    def calculate_from_user(self, user, refine: bool = None) -> Dict[str, float]:
         """
         Main entry point: Takes User object and generates personalized limits.
         Extracts survey data directly from User model fields.
@@ -71,13 +266,14 @@ class DailyLimitsCalculator:
                 - goal: str
                 - diet_restrictions: ArrayField (list)
                 - preferred_diet: str
+            refine: Ask the LLM to refine the computed limits
+                (defaults to settings.DAILY_LIMITS_LLM_REFINEMENT)
         
         Returns:
-            List of dicts: [{"name": "calories", "daily_norm": 2000}, ...]
+            Dict of ingredient name -> daily norm: {"calories": 2000.0, ...}
         
         Raises:
             ValueError: If user data is invalid
-            Exception: If OpenAI API fails
         """
         
         # Extract survey data from user fields
@@ -87,37 +283,149 @@ class DailyLimitsCalculator:
         if not self._validate_survey_data(survey_data):
             raise ValueError("Invalid user data provided")
         
-        # Build prompt for AI
-        prompt = self._build_calculation_prompt(survey_data)
+        ingredients_summary = self.engine.calculate(survey_data)
+        
+        if refine is None:
+            refine = settings.DAILY_LIMITS_LLM_REFINEMENT
+        if refine:
+            ingredients_summary = self._refine(user.id, survey_data, ingredients_summary)
+        
+        logger.info(f"Successfully calculated limits for user with age {survey_data.get('age')}")
+        return ingredients_summary
+    
+    def profile_fingerprint(self, survey_data: Dict[str, Any], buckets: Optional[Dict[str, float]] = None) -> str:
+        """
+        Stable key for the limits-relevant part of a profile
+        
+        Numeric fields are quantized into buckets (e.g. 5-year age bands,
+        2 kg weight bands), so nearly identical profiles share a fingerprint.
+        
+        Args:
+            survey_data: Output of _extract_user_data
+            buckets: Bucket width per numeric field; a missing or 0 width
+                keeps the exact value (defaults to
+                settings.DAILY_LIMITS_FINGERPRINT_BUCKETS)
+        
+        Returns:
+            'v{PROMPT_VERSION}:{sha1}'
+        """
+        if buckets is None:
+            buckets = settings.DAILY_LIMITS_FINGERPRINT_BUCKETS
+        
+        profile = {}
+        for field in self.FINGERPRINT_FIELDS:
+            value = survey_data.get(field)
+            if field == 'dietary_restrictions':
+                value = sorted({item.strip().lower() for item in value or []})
+            elif field in self.NUMERIC_FINGERPRINT_FIELDS and value is not None:
+                width = buckets.get(field)
+                value = int(float(value) // width) if width else float(value)
+            profile[field] = value
+        
+        digest = hashlib.sha1(json.dumps(profile, sort_keys=True).encode('utf-8')).hexdigest()
+        return f"v{self.PROMPT_VERSION}:{digest}"
+    
+    def user_fingerprint(self, user) -> str:
+        """Exact (unquantized) fingerprint of a user's profile, stored with their limits"""
+        return self.profile_fingerprint(self._extract_user_data(user), buckets={})
+    
+    def _refine(self, user_id, survey_data: Dict[str, Any], baseline: Dict[str, float]) -> Dict[str, float]:
+        """
+        Let the LLM adjust the computed limits
+        
+        The LLM's adjustments are kept as per-nutrient factors relative to
+        the computed limits, clamped to 1 +/- refinement_tolerance, and
+        shared across users with the same profile fingerprint. A cache hit
+        applies those factors to this user's own computed limits without a
+        model call. Any LLM failure keeps the baseline, so limits are
+        always available.
+        """
+        cache_key = f"daily_limits:refinement:{self.profile_fingerprint(survey_data)}"
+        
+        try:
+            factors = cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Refinement cache unavailable: {str(e)}")
+            factors = None
+        
+        if factors is None:
+            factors = self._request_refinement(user_id, survey_data, baseline)
+            if factors is None:
+                return baseline
+            
+            try:
+                cache.set(cache_key, factors, timeout=self.cache_ttl)
+            except Exception as e:
+                logger.warning(f"Could not cache refinement: {str(e)}")
+        else:
+            logger.debug(f"Refinement cache hit for user {user_id}")
+        
+        return {
+            name: round(value * factors.get(name, 1.0), 1)
+            for name, value in baseline.items()
+        }
+    
+    def _request_refinement(self, user_id, survey_data: Dict[str, Any],
+                            baseline: Dict[str, float]) -> Optional[Dict[str, float]]:
+        """Per-nutrient factors from one LLM call, or None if it failed"""
+        prompt = self._build_calculation_prompt(survey_data, baseline)
         
-        # Call OpenAI API
+        # Duplicate in-flight requests share one call
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a nutrition expert. Generate personalized daily dietary limits in JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,  # Low temp for consistent results
-                max_tokens=2000,
+            refined, _ = single_flight.run(
+                user_id,
+                'daily_limits',
+                prompt,
+                lambda: self._request_limits(user_id, prompt)
             )
-            
-            # Extract and parse response
-            ai_response = response.choices[0].message.content
-            ingredients_summary = self._parse_ai_response(ai_response)
-            
-            logger.info(f"Successfully calculated limits for user with age {survey_data.get('age')}")
-            return ingredients_summary
-            
         except Exception as e:
-            logger.error(f"OpenAI API error: {str(e)}")
-            raise
+            logger.warning(f"LLM refinement failed, using computed limits: {str(e)}")
+            return None
+        
+        tolerance = self.refinement_tolerance
+        return {
+            name: min(max(float(refined[name]) / value, 1 - tolerance), 1 + tolerance)
+            for name, value in baseline.items()
+            if value and name in refined
+        }
+    
+    def _request_limits(self, user_id, prompt: str) -> Dict[str, float]:
+        """Single model call for limits; usage is charged to user_id"""
+        start_time = time.time()
+        response = self.provider.complete(
+            [
+                {
+                    "role": "system",
+                    "content": "You are a nutrition expert. Generate personalized daily dietary limits in JSON format."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            model=self.model,
+            temperature=0.3,  # Low temp for consistent results
+            max_tokens=2000,
+        )
+        
+        budget_service.charge(
+            user_id,
+            'daily_limits',
+            response.input_tokens,
+            response.output_tokens,
+            self.model
+        )
+        usage_rollup_service.record(
+            user_id,
+            'daily_limits',
+            self.model,
+            response.input_tokens,
+            response.output_tokens,
+            int((time.time() - start_time) * 1000)
+        )
+        
+        # Extract and parse response
+        return self._parse_ai_response(response.content)
     
     def _extract_user_data(self, user) -> Dict[str, Any]:
         """
@@ -178,16 +486,20 @@ class DailyLimitsCalculator:
         if survey_data.get('weight', 0) <= 0 or survey_data.get('height', 0) <= 0:
             return False
         
+        if survey_data['age'] <= 0:
+            return False
+        
         return True
     
-    def _build_calculation_prompt(self, survey_data: Dict[str, Any]) -> str:
-        """Build the prompt to send to OpenAI for calculation"""
+    def _build_calculation_prompt(self, survey_data: Dict[str, Any], baseline: Dict[str, float]) -> str:
+        """Build the prompt asking the LLM to refine the computed limits"""
         
         restrictions = survey_data.get('dietary_restrictions', [])
         restriction_text = ", ".join(restrictions) if restrictions else "None"
+        baseline_text = "\n".join(f"- {name}: {value:g}" for name, value in baseline.items())
         
         prompt = f"""
-Based on the following user profile, calculate personalized daily dietary limits:
+The following daily dietary limits were computed for this user profile. Review them and adjust where the profile warrants it:
 
 USER PROFILE:
 - Age: {survey_data['age']} years
@@ -199,16 +511,14 @@ USER PROFILE:
 - Dietary Restrictions: {restriction_text}
 - Preferred Diet Type: {survey_data.get('preferred_diet', 'balanced')}
 
+COMPUTED LIMITS (Mifflin-St Jeor BMR, activity multiplier, goal adjustment, diet macro split, DRI micronutrients):
+{baseline_text}
+
 INSTRUCTIONS:
-1. Calculate BMR (Basal Metabolic Rate) using Mifflin-St Jeor equation
-2. Apply activity level multiplier to get TDEE (Total Daily Energy Expenditure)
-3. Adjust calories based on goal:
-   - lose_weight: -500 calories (0.5kg/week deficit)
-   - gain_muscle: +300 calories surplus
-   - maintain: no adjustment
-4. Calculate macro targets based on goal and diet type
-5. Apply dietary restrictions
-6. Return EXACT JSON format below - NO other text
+1. Keep values that are already appropriate
+2. Adjust for dietary restrictions and diet type where the computed limits miss them
+3. Keep every value within {self.refinement_tolerance:.0%} of the computed one
+4. Return EXACT JSON format below - NO other text
 
 REQUIRED JSON FORMAT (return ONLY valid JSON):
 {{
@@ -284,7 +594,7 @@ Return ONLY the JSON object, no additional text.
         logger.debug(f"Successfully parsed {len(ingredients_dict)} ingredients from AI response")
         return ingredients_dict
     
-    def get_fallback_limits(self, survey_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def get_fallback_limits(self, survey_data: Dict[str, Any]) -> Dict[str, float]:
         """
         Fallback limits if AI API fails.
         Based on standard RDI with basic adjustments.
@@ -292,7 +602,4 @@ Return ONLY the JSON object, no additional text.
         logger.warning("Using fallback limits - AI calculation failed")
         
         # Simple fallback: use RDI defaults
-        return [
-            {"name": key, "daily_norm": value}
-            for key, value in self.RDI_DEFAULTS.items()
-        ]
\ No newline at end of file
+        return {key: float(value) for key, value in self.RDI_DEFAULTS.items()}
\ No newline at end of file
@@ -0,0 +1,97 @@
+# daily_limit_calculation/signals.py
+
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from fitora.redis_pool import get_redis_client
+
+from .cache import invalidate_cached_limits
+from .models import DailyIngredientsLimit
+from .services import DailyLimitsCalculator
+
+logger = logging.getLogger(__name__)
+
+# User fields DailyLimitsCalculator._extract_user_data reads
+PROFILE_FIELDS = frozenset({
+    'date_of_birth', 'gender', 'current_weight', 'current_height',
+    'activeness_level', 'goal', 'diet_restrictions', 'preferred_diet',
+})
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='daily_limits_profile_changed')
+def schedule_limits_regeneration(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Recalculate limits after a profile change that affects them
+    
+    Saves that don't touch PROFILE_FIELDS cost nothing; otherwise the
+    profile's exact fingerprint is compared with the one stored with the
+    limits (one indexed lookup). A change schedules one recalculation per
+    user, DAILY_LIMITS_REGENERATE_DEBOUNCE seconds after the first edit:
+    further edits in that window are picked up by the same run.
+    """
+    if not settings.DAILY_LIMITS_REGENERATE_ON_PROFILE_CHANGE or kwargs.get('raw'):
+        return
+    if update_fields is not None and not PROFILE_FIELDS.intersection(update_fields):
+        return
+    if not instance.profile_completed:
+        return
+    
+    calculator = DailyLimitsCalculator()
+    survey_data = calculator._extract_user_data(instance)
+    if not calculator._validate_survey_data(survey_data):
+        return
+    
+    stored = (
+        DailyIngredientsLimit.objects
+        .filter(user_id=instance.pk)
+        .values_list('profile_fingerprint', flat=True)
+        .first()
+    )
+    if stored == calculator.profile_fingerprint(survey_data, buckets={}):
+        return
+    
+    user_id = str(instance.pk)
+    transaction.on_commit(lambda: _enqueue_debounced(user_id))
+
+
+@receiver(post_save, sender=DailyIngredientsLimit, dispatch_uid='daily_limits_saved')
+@receiver(post_delete, sender=DailyIngredientsLimit, dispatch_uid='daily_limits_deleted')
+def drop_cached_limits(sender, instance, **kwargs):
+    """Saved or deleted limits invalidate the cached payload after commit"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_cached_limits(user_id))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid='daily_limits_email_changed')
+def drop_cached_limits_on_email_change(sender, instance, created, update_fields=None, **kwargs):
+    """The cached payload carries user_email"""
+    if created or (update_fields is not None and 'email' not in update_fields):
+        return
+    
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_limits(user_id))
+
+
+def _enqueue_debounced(user_id: str):
+    """Queue calculate_daily_limits_async unless a run is already pending"""
+    from .tasks import calculate_daily_limits_async
+    
+    debounce = settings.DAILY_LIMITS_REGENERATE_DEBOUNCE
+    
+    try:
+        if not get_redis_client().set(f"daily_limits:regenerate:{user_id}", 1, nx=True, ex=debounce):
+            return
+    except Exception as e:
+        # Without the debounce key, a duplicate run is cheaper than stale limits
+        logger.warning(f"Regeneration debounce unavailable for user {user_id}: {str(e)}")
+    
+    try:
+        calculate_daily_limits_async.apply_async((user_id,), countdown=debounce)
+        logger.info(f"Scheduled daily limits regeneration for user {user_id} in {debounce}s")
+    except Exception as e:
+        # A profile save must never fail because the broker is down;
+        # the weekly recalculation picks the change up
+        logger.error(f"Failed to schedule limits regeneration for user {user_id}: {str(e)}")
@@ -1,16 +1,34 @@
 # daily_limit_calculation/tasks.py
 
 import logging
+from asgiref.sync import async_to_sync
 from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import F
 
+from .cache import invalidate_cached_limits
+from .consumers import DailyLimitsConsumer
 from .models import DailyIngredientsLimit
+from .serializers import DailyIngredientsLimitSerializer
 from .services import DailyLimitsCalculator
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
+def notify_user(user_id, event_type: str, **payload):
+    """Push an event to the user's DailyLimitsConsumer connections (best effort)"""
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            DailyLimitsConsumer.group_name_for(user_id),
+            {'type': event_type, **payload}
+        )
+    except Exception as e:
+        logger.warning(f"Could not notify user {user_id} of {event_type}: {str(e)}")
+
+
 @shared_task(bind=True, max_retries=3)
 def calculate_daily_limits_async(self, user_id):
     """
@@ -24,10 +42,13 @@ def calculate_daily_limits_async(self, user_id):
     Retries:
         - On failure, retries up to 3 times with exponential backoff
     
+    Completion is pushed over the channels layer to ws/daily-limits/
+    (daily_limits_completed / daily_limits_failed).
+    
     Example:
-        # In view:
-        calculate_daily_limits_async.delay(user.id)
-        return Response({'message': 'Generating daily limits...'}, status=202)
+        # In view (GenerateDailyLimitsView with ?async=true):
+        task = calculate_daily_limits_async.delay(str(user.id))
+        return Response({'task_id': task.id, ...}, status=202)
     """
     try:
         user = User.objects.get(id=user_id)
@@ -41,12 +62,22 @@ def calculate_daily_limits_async(self, user_id):
         # Save to database
         daily_limits, created = DailyIngredientsLimit.objects.update_or_create(
             user=user,
-            defaults={'ingredients_summary': ingredients_summary}
+            defaults={
+                'ingredients_summary': ingredients_summary,
+                'profile_fingerprint': calculator.user_fingerprint(user),
+            }
         )
         
         action = "created" if created else "updated"
         logger.info(f"Daily limits {action} for user {user.email}")
         
+        notify_user(
+            user_id,
+            'daily_limits.completed',
+            task_id=self.request.id,
+            data=dict(DailyIngredientsLimitSerializer(daily_limits).data)
+        )
+        
         return {
             'success': True,
             'user_id': str(user_id),
@@ -60,40 +91,146 @@ def calculate_daily_limits_async(self, user_id):
     
     except ValueError as e:
         logger.warning(f"Validation error for user {user_id}: {str(e)}")
+        notify_user(user_id, 'daily_limits.failed', task_id=self.request.id, message=f'Invalid user data: {str(e)}')
         return {'success': False, 'error': f'Validation error: {str(e)}'}
     
     except Exception as e:
         logger.error(f"Error calculating limits for user {user_id}: {str(e)}")
         
+        if self.request.retries >= self.max_retries:
+            notify_user(user_id, 'daily_limits.failed', task_id=self.request.id,
+                        message='Failed to generate daily limits. Please try again.')
+        
         # Retry with exponential backoff
         retry_in = 2 ** self.request.retries  # 2, 4, 8 seconds
         raise self.retry(exc=e, countdown=retry_in)
 
 
 @shared_task
-def recalculate_all_user_limits():
+def recalculate_all_user_limits(after_id=None):
     """
-    Periodic task to recalculate limits for all users.
+    Periodic task to recalculate limits for all users whose profile changed.
     
-    Schedule this with Celery Beat (e.g., weekly):
+    Streams completed profiles in ID order with iterator() (never the whole
+    table in memory) and skips users whose exact profile fingerprint still
+    matches the one stored with their limits. Changed users are sent to
+    recalculate_limits_batch in groups of DAILY_LIMITS_RECALC_BATCH_SIZE,
+    staggered to DAILY_LIMITS_RECALC_BATCHES_PER_MINUTE.
     
-    CELERY_BEAT_SCHEDULE = {
-        'recalculate-daily-limits': {
-            'task': 'daily_limit_calculation.tasks.recalculate_all_user_limits',
-            'schedule': crontab(hour=2, minute=0, day_of_week=0),  # Weekly, Sunday 2 AM
-        },
+    A run only schedules batches up to DAILY_LIMITS_RECALC_WINDOW seconds
+    ahead, so no countdown outlives the broker's visibility timeout (which
+    would redeliver it). If users are left, the run queues a follow-up
+    that starts after the last queued user once the window has passed.
+    
+    Args:
+        after_id: Resume after this user ID (set by the follow-up run)
+    
+    Scheduled weekly in settings.CELERY_BEAT_SCHEDULE.
+    """
+    calculator = DailyLimitsCalculator()
+    batch_size = settings.DAILY_LIMITS_RECALC_BATCH_SIZE
+    interval = 60.0 / settings.DAILY_LIMITS_RECALC_BATCHES_PER_MINUTE
+    window = settings.DAILY_LIMITS_RECALC_WINDOW
+    max_batches = max(1, int(window // interval))
+    
+    users = (
+        User.objects
+        .filter(profile_completed=True)
+        .annotate(stored_fingerprint=F('daily_limits__profile_fingerprint'))
+        .only(
+            'id', 'date_of_birth', 'gender', 'current_weight', 'current_height',
+            'activeness_level', 'goal', 'diet_restrictions', 'preferred_diet',
+        )
+        .order_by('id')
+    )
+    if after_id is not None:
+        users = users.filter(id__gt=after_id)
+    
+    scanned = skipped = queued = batches = 0
+    batch = []
+    resume_after = None
+    
+    for user in users.iterator(chunk_size=settings.DAILY_LIMITS_RECALC_CHUNK_SIZE):
+        scanned += 1
+        if user.stored_fingerprint == calculator.user_fingerprint(user):
+            skipped += 1
+            continue
+        
+        batch.append(str(user.id))
+        if len(batch) >= batch_size:
+            recalculate_limits_batch.apply_async((batch,), countdown=batches * interval)
+            queued += len(batch)
+            batches += 1
+            batch = []
+            if batches >= max_batches:
+                resume_after = user.id
+                break
+    
+    if batch:
+        recalculate_limits_batch.apply_async((batch,), countdown=batches * interval)
+        queued += len(batch)
+        batches += 1
+    
+    if resume_after is not None:
+        # Starts once every batch queued here is due
+        recalculate_all_user_limits.apply_async((resume_after,), countdown=batches * interval)
+    
+    logger.info(
+        f"Limit recalculation: scanned {scanned} users, {skipped} unchanged, "
+        f"queued {queued} in {batches} batches"
+        + (f", continuing after user {resume_after}" if resume_after is not None else "")
+    )
+    return {
+        'scanned': scanned,
+        'unchanged': skipped,
+        'queued': queued,
+        'batches': batches,
+        'resume_after': resume_after,
     }
+
+
+@shared_task(bind=True, max_retries=3)
+def recalculate_limits_batch(self, user_ids):
     """
-    users = User.objects.filter(profile_completed=True)
+    Recalculate and store limits for a batch of users in one task.
+    
+    Limits are computed locally (NutritionRuleEngine) with LLM refinement
+    turned off, so a batch is a single SELECT, in-process arithmetic and
+    one bulk upsert, and the weekly run makes no model calls.
     
-    for user in users:
+    Args:
+        user_ids: List of user IDs
+    """
+    calculator = DailyLimitsCalculator()
+    rows = []
+    failed = 0
+    
+    for user in User.objects.filter(id__in=user_ids):
         try:
-            calculate_daily_limits_async.delay(user.id)
-            logger.info(f"Queued limit recalculation for user {user.email}")
-        except Exception as e:
-            logger.error(f"Failed to queue recalculation for {user.email}: {str(e)}")
+            rows.append(DailyIngredientsLimit(
+                user=user,
+                ingredients_summary=calculator.calculate_from_user(user, refine=False),
+                profile_fingerprint=calculator.user_fingerprint(user),
+            ))
+        except ValueError as e:
+            failed += 1
+            logger.warning(f"Validation error for user {user.id}: {str(e)}")
+    
+    try:
+        DailyIngredientsLimit.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['ingredients_summary', 'profile_fingerprint', 'updated_at'],
+        )
+    except Exception as e:
+        logger.error(f"Error saving limits batch of {len(rows)} users: {str(e)}")
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    
+    # bulk_create sends no post_save
+    invalidate_cached_limits(*(row.user_id for row in rows))
     
-    return f"Queued recalculation for {users.count()} users"
+    return {'updated': len(rows), 'failed': failed}
 
 
 @shared_task
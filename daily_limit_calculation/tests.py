@@ -0,0 +1,465 @@
+import uuid
+from datetime import date
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from fitora.redis_pool import get_redis_client
+from meals.models import Meal
+from users.models import User
+from .cache import get_cached_limits, invalidate_cached_limits
+from .models import DailyIngredientsLimit
+from .serializers import DailyIngredientsLimitSerializer
+from .services import NutritionRuleEngine
+from .views import get_day_consumption, sum_meal_totals
+
+
+def meal_foods(**nutritions):
+    """foods_data of a single food with the given nutritions"""
+    return {'foods': [{'name': 'Food', 'nutritions': nutritions}]}
+
+
+class SumMealTotalsTests(SimpleTestCase):
+    """Adding up Meal.nutrient_totals"""
+
+    def test_sums_known_nutrients(self):
+        consumption = sum_meal_totals([
+            {'calories': 500.0, 'protein': 20.123},
+            {'calories': 250.5, 'protein': 10.0, 'unknown': 99.0},
+        ])
+
+        self.assertEqual(set(consumption), set(DailyIngredientsLimit.INGREDIENTS))
+        self.assertEqual(consumption['calories'], 750.5)
+        self.assertEqual(consumption['protein'], 30.12)
+        self.assertEqual(consumption['fat'], 0.0)
+        self.assertNotIn('unknown', consumption)
+
+    def test_no_meals(self):
+        consumption = sum_meal_totals([])
+
+        self.assertEqual(set(consumption.values()), {0.0})
+
+
+class NutritionRuleEngineTests(SimpleTestCase):
+    """Deterministic limits of NutritionRuleEngine.calculate"""
+
+    def calculate(self, **overrides):
+        survey_data = {
+            'age': 30,
+            'gender': 'male',
+            'weight': 80,
+            'height': 180,
+            'activity_level': 'sedentary',
+            'goal': 'maintain',
+            'dietary_restrictions': [],
+            'preferred_diet': 'balanced',
+        }
+        survey_data.update(overrides)
+        return NutritionRuleEngine().calculate(survey_data)
+
+    def test_male_energy(self):
+        # BMR 10*80 + 6.25*180 - 5*30 + 5 = 1780; TDEE 1780 * 1.2
+        limits = self.calculate()
+
+        self.assertEqual(limits['calories'], 2136.0)
+        self.assertEqual(limits['protein'], 106.8)
+        self.assertEqual(limits['fat'], 71.2)
+        self.assertEqual(limits['carbs'], 267.0)
+
+    def test_female_energy(self):
+        # BMR 10*60 + 6.25*165 - 5*30 - 161 = 1320.25; TDEE 1320.25 * 1.55
+        limits = self.calculate(gender='female', weight=60, height=165, activity_level='moderate')
+
+        self.assertEqual(limits['calories'], 2046.0)
+
+    def test_calories_never_below_the_floor(self):
+        # TDEE 876.5 * 1.2 - 500 would be ~552 kcal
+        for gender, floor in NutritionRuleEngine.MIN_CALORIES.items():
+            with self.subTest(gender=gender):
+                limits = self.calculate(gender=gender, age=70, weight=45, height=150, goal='lose_weight')
+                self.assertEqual(limits['calories'], floor)
+
+    def test_keto_protein_floor(self):
+        # 20% of 1876 kcal is 93.8 g, under 1.6 g/kg for 100 kg
+        limits = self.calculate(weight=100, goal='lose_weight', preferred_diet='keto')
+
+        self.assertEqual(limits['calories'], 1876.0)
+        self.assertEqual(limits['protein'], 160.0)
+        self.assertEqual(limits['carbs'], 0.0)
+
+    def test_micronutrients_of_a_teenage_female(self):
+        limits = self.calculate(gender='female', age=16, weight=55, height=162)
+
+        self.assertEqual(limits['calcium'], 1300.0)
+        self.assertEqual(limits['iron'], 15.0)
+        self.assertEqual(limits['magnesium'], 360.0)
+        self.assertEqual(limits['zinc'], 9.0)
+        self.assertEqual(limits['vitamin_c'], 65.0)
+
+    def test_micronutrients_of_an_older_male(self):
+        limits = self.calculate(age=60)
+
+        self.assertEqual(limits['calcium'], 1000.0)
+        self.assertEqual(limits['iron'], 8.0)
+        self.assertEqual(limits['magnesium'], 420.0)
+        self.assertEqual(limits['vitamin_b6'], 1.7)
+        self.assertEqual(limits['omega_6'], 14.0)
+        self.assertEqual(limits['vitamin_d'], 15.0)
+
+    def test_vegan_raises_iron_and_zinc(self):
+        limits = self.calculate(dietary_restrictions=['Vegan', 'vegetarian'])
+
+        self.assertEqual(limits['iron'], 14.4)
+        self.assertEqual(limits['zinc'], 16.5)
+        self.assertEqual(limits['sodium'], 2300.0)
+
+    def test_low_salt_caps_sodium(self):
+        limits = self.calculate(dietary_restrictions=['Low salt'])
+
+        self.assertEqual(limits['sodium'], 1500.0)
+        self.assertEqual(limits['iron'], 8.0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'the progress query aggregates with JSONBAgg')
+class DailyLimitsProgressTests(TestCase):
+    """GET daily_limits_progress: limits joined with one day's meals"""
+
+    day = date(2025, 1, 31)
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='progress@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('daily_limit_calculation:daily_limits_progress')
+
+    def add_meal(self, user, day, **nutritions):
+        return Meal.objects.create(
+            user=user, image_url='meals/test.jpg', meal_date=day, foods_data=meal_foods(**nutritions)
+        )
+
+    def add_limits(self):
+        return DailyIngredientsLimit.objects.create(
+            user=self.user,
+            ingredients_summary={'calories': 2000.0, 'protein': 100.0, 'fat': 50.0},
+        )
+
+    def test_progress_of_the_day(self):
+        self.add_limits()
+        self.add_meal(self.user, self.day, calories='900 kcal', protein='40 g')
+        self.add_meal(self.user, self.day, calories='800 kcal', protein='20 g', fat='60 g')
+        # Neither another day nor another user counts
+        self.add_meal(self.user, date(2025, 1, 30), calories='1000 kcal')
+        other = User.objects.create_user(email='other@example.com')
+        self.add_meal(other, self.day, calories='1000 kcal')
+
+        response = self.client.get(self.url, {'date': '2025-01-31'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['date'], '2025-01-31')
+        self.assertEqual(response.data['meals_count'], 2)
+        self.assertEqual(response.data['data']['user_email'], 'progress@example.com')
+
+        ingredients = response.data['data']['ingredients']
+        self.assertEqual(ingredients['calories'], {
+            'daily_norm': 2000.0,
+            'consumed_today': 1700.0,
+            'remaining': 300.0,
+            'percentage': 85.0,
+            'status': 'almost_reached',
+        })
+        self.assertEqual(ingredients['protein']['status'], 'on_track')
+        self.assertEqual(ingredients['fat']['remaining'], -10.0)
+        self.assertEqual(ingredients['fat']['status'], 'over')
+
+    def test_day_without_meals(self):
+        self.add_limits()
+
+        response = self.client.get(self.url, {'date': '2025-01-31'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['meals_count'], 0)
+        self.assertEqual(response.data['data']['ingredients']['calories']['consumed_today'], 0.0)
+        self.assertEqual(response.data['data']['ingredients']['calories']['status'], 'low')
+
+    def test_matches_get_day_consumption(self):
+        self.add_limits()
+        self.add_meal(self.user, self.day, calories='640 kcal', protein='0.5 g')
+
+        response = self.client.get(self.url, {'date': '2025-01-31'})
+        consumption = get_day_consumption(self.user, self.day)
+
+        ingredients = response.data['data']['ingredients']
+        for name in ('calories', 'protein', 'fat'):
+            self.assertEqual(ingredients[name]['consumed_today'], consumption[name])
+
+    def test_without_limits(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_date(self):
+        self.add_limits()
+
+        response = self.client.get(self.url, {'date': '31-01-2025'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LimitsCacheTests(TestCase):
+    """Read-through payload cache of get_cached_limits"""
+
+    def setUp(self):
+        try:
+            cache.get('daily_limits:ping')
+        except Exception:
+            self.skipTest('Cache is not reachable')
+
+        self.user = User.objects.create_user(email='cache@example.com')
+        # User ids can be reused between test runs; never read an old entry
+        invalidate_cached_limits(self.user.pk)
+        self.limits = DailyIngredientsLimit.objects.create(
+            user=self.user, ingredients_summary={'calories': 2000.0}
+        )
+
+    def set_calories(self, calories):
+        """Change the row without signals, like a concurrent writer"""
+        DailyIngredientsLimit.objects.filter(pk=self.limits.pk).update(
+            ingredients_summary={'calories': calories}
+        )
+
+    def calories(self):
+        return get_cached_limits(self.user)['ingredients_summary']['calories']
+
+    def test_hit_until_invalidated(self):
+        self.assertEqual(self.calories(), 2000.0)
+        self.set_calories(2100.0)
+
+        self.assertEqual(self.calories(), 2000.0)
+
+        invalidate_cached_limits(self.user.pk)
+        self.assertEqual(self.calories(), 2100.0)
+
+    def test_save_invalidates_after_commit(self):
+        self.calories()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.limits.ingredients_summary = {'calories': 1800.0}
+            self.limits.save()
+
+        self.assertEqual(self.calories(), 1800.0)
+
+    def test_stale_read_is_not_written_back(self):
+        def serialize_after_concurrent_save(instance):
+            # The reader already loaded the old row; the writer commits and
+            # invalidates before the reader stores its payload
+            self.set_calories(2200.0)
+            invalidate_cached_limits(self.user.pk)
+            return DailyIngredientsLimitSerializer(instance)
+
+        with mock.patch(
+            'daily_limit_calculation.cache.DailyIngredientsLimitSerializer',
+            side_effect=serialize_after_concurrent_save
+        ):
+            self.assertEqual(self.calories(), 2000.0)
+
+        self.assertEqual(self.calories(), 2200.0)
+
+    def test_missing_limits(self):
+        self.limits.delete()
+
+        with self.assertRaises(DailyIngredientsLimit.DoesNotExist):
+            get_cached_limits(self.user)
+
+
+@override_settings(LLM_THROTTLE_RATES={})
+class DailyLimitsTaskTests(TestCase):
+    """POST generate/?async=true and polling its status URL"""
+
+    def setUp(self):
+        try:
+            get_redis_client().ping()
+        except Exception:
+            self.skipTest('Redis is not reachable')
+
+        self.user = self.create_user('async@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        # A fresh id per test, so owner keys never leak between tests
+        self.task_id = uuid.uuid4().hex
+
+        delay = mock.patch(
+            'daily_limit_calculation.views.calculate_daily_limits_async.delay',
+            return_value=mock.Mock(id=self.task_id)
+        )
+        self.delay = delay.start()
+        self.addCleanup(delay.stop)
+
+        async_result = mock.patch('daily_limit_calculation.views.AsyncResult')
+        self.result = async_result.start().return_value
+        self.addCleanup(async_result.stop)
+
+    def create_user(self, email):
+        return User.objects.create_user(
+            email=email,
+            profile_completed=True,
+            date_of_birth=date(1990, 1, 1),
+            gender='female',
+            current_weight=60,
+            current_height=165,
+            activeness_level='sedentary',
+            goal='maintain_weight',
+        )
+
+    def generate(self):
+        url = reverse('daily_limit_calculation:generate_daily_limits')
+        return self.client.post(f'{url}?async=true')
+
+    def poll(self):
+        return self.client.get(
+            reverse('daily_limit_calculation:daily_limits_task_status', args=[self.task_id])
+        )
+
+    def test_async_generate_is_accepted(self):
+        response = self.generate()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.delay.assert_called_once_with(str(self.user.id))
+        self.assertEqual(response.data['task_id'], self.task_id)
+        self.assertEqual(response['Location'], response.data['status_url'])
+        self.assertTrue(response.data['status_url'].endswith(f'/generate/status/{self.task_id}/'))
+        self.assertFalse(DailyIngredientsLimit.objects.filter(user=self.user).exists())
+
+    def test_status_of_another_users_task(self):
+        self.generate()
+        self.client.force_authenticate(user=self.create_user('other@example.com'))
+
+        response = self.poll()
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.result.ready.assert_not_called()
+
+    def test_status_of_an_unknown_task(self):
+        response = self.poll()
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pending(self):
+        self.generate()
+        self.result.ready.return_value = False
+
+        response = self.poll()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'task_id': self.task_id, 'status': 'pending'})
+
+    def test_failed(self):
+        self.generate()
+        self.result.ready.return_value = True
+
+        cases = [
+            (True, {'success': False, 'error': 'Invalid user data'}, 'Invalid user data'),
+            # The task raised: result.result is the exception
+            (False, RuntimeError('boom'), 'Failed to generate daily limits. Please try again.'),
+        ]
+        for successful, outcome, error in cases:
+            with self.subTest(outcome=outcome):
+                self.result.successful.return_value = successful
+                self.result.result = outcome
+
+                response = self.poll()
+
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['status'], 'failed')
+                self.assertEqual(response.data['error'], error)
+
+    def test_completed(self):
+        self.generate()
+        DailyIngredientsLimit.objects.create(user=self.user, ingredients_summary={'calories': 1900.0})
+        self.result.ready.return_value = True
+        self.result.successful.return_value = True
+        self.result.result = {'success': True}
+
+        response = self.poll()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['data']['ingredients_summary']['calories'], 1900.0)
+
+    def test_polling_is_throttled(self):
+        self.generate()
+        self.result.ready.return_value = False
+
+        rates = {'daily_limits_status': {'minute': {'limit': 1, 'window': 60}}}
+        with override_settings(LLM_THROTTLE_RATES=rates):
+            self.poll()
+            response = self.poll()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class IngredientsSummaryMigrationTests(TransactionTestCase):
+    """0003: ingredients_summary list of {name, daily_norm} <-> {name: daily_norm}"""
+
+    app = 'daily_limit_calculation'
+    before = '0002_profile_fingerprint'
+    after = '0003_ingredients_summary_dict'
+
+    def migrate(self, name):
+        """Migrate the app to `name` and return the historical apps registry"""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([(self.app, name)])
+        return executor.loader.project_state([(self.app, name)]).apps
+
+    def tearDown(self):
+        # Leave the schema at the latest migration for the other tests
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def create_limits(self, apps, email, ingredients_summary):
+        User = apps.get_model('users', 'User')
+        DailyIngredientsLimit = apps.get_model(self.app, 'DailyIngredientsLimit')
+        user = User.objects.create(email=email, password='')
+        return DailyIngredientsLimit.objects.create(user=user, ingredients_summary=ingredients_summary)
+
+    def test_list_to_dict(self):
+        apps = self.migrate(self.before)
+        limits = self.create_limits(apps, 'list@example.com', [
+            {'name': 'calories', 'daily_norm': 2000},
+            {'name': 'protein', 'daily_norm': '120.5'},
+            {'name': 'missing_norm'},
+            'not an item',
+        ])
+
+        apps = self.migrate(self.after)
+        migrated = apps.get_model(self.app, 'DailyIngredientsLimit').objects.get(id=limits.id)
+
+        self.assertEqual(migrated.ingredients_summary, {'calories': 2000.0, 'protein': 120.5})
+
+    def test_already_a_dict_is_left_alone(self):
+        apps = self.migrate(self.before)
+        limits = self.create_limits(apps, 'dict@example.com', {'calories': 1800.0})
+
+        apps = self.migrate(self.after)
+        migrated = apps.get_model(self.app, 'DailyIngredientsLimit').objects.get(id=limits.id)
+
+        self.assertEqual(migrated.ingredients_summary, {'calories': 1800.0})
+
+    def test_reverse_restores_the_list(self):
+        apps = self.migrate(self.after)
+        limits = self.create_limits(apps, 'reverse@example.com', {'calories': 2000.0, 'fat': 70.0})
+
+        apps = self.migrate(self.before)
+        reverted = apps.get_model(self.app, 'DailyIngredientsLimit').objects.get(id=limits.id)
+
+        # jsonb does not keep key order, so neither does the list
+        self.assertCountEqual(reverted.ingredients_summary, [
+            {'name': 'calories', 'daily_norm': 2000.0},
+            {'name': 'fat', 'daily_norm': 70.0},
+        ])
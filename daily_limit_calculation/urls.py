@@ -3,9 +3,11 @@
 from django.urls import path
 from .views import (
     GenerateDailyLimitsView,
+    DailyLimitsTaskStatusView,
     RetrieveDailyLimitsView,
     DailyLimitsDetailView,
     GetSpecificIngredientView,
+    DailyLimitsProgressView,
     ValidateDailyLimitsView,
     QuickAccessView,
 )
@@ -20,6 +22,13 @@ urlpatterns = [
         name='generate_daily_limits'
     ),
     
+    # Status of a generation started with POST generate/?async=true
+    path(
+        'generate/status/<str:task_id>/',
+        DailyLimitsTaskStatusView.as_view(),
+        name='daily_limits_task_status'
+    ),
+    
     # Get current daily limits (all 24 ingredients)
     path(
         '',
@@ -42,6 +51,14 @@ urlpatterns = [
         name='get_ingredient'
     ),
     
+    # Consumed/remaining for every nutrient on a day
+    # Usage: GET /api/daily-limits/progress/?date=2025-01-31
+    path(
+        'progress/',
+        DailyLimitsProgressView.as_view(),
+        name='daily_limits_progress'
+    ),
+    
     # Validate current limits (debug endpoint)
     path(
         'validate/',
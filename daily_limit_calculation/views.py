@@ -1,21 +1,117 @@
 import logging
-from drf_spectacular.utils import extend_schema
+from datetime import datetime
+from celery.result import AsyncResult
+from django.conf import settings
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.db.models import F, JSONField, OuterRef, Subquery
+from django.urls import reverse
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
+from fitora.idempotency import idempotent
+from fitora.redis_pool import get_redis_client
+from fitora.throttling import DailyLimitsRateThrottle, DailyLimitsStatusRateThrottle, LLMBudgetThrottle
+from meals.models import Meal
 
+from .cache import get_cached_limits
 from .models import DailyIngredientsLimit
 from .services import DailyLimitsCalculator
-from .serializers import DailyIngredientsLimitSerializer, QuickAccessLimitsSerializer
+from .tasks import calculate_daily_limits_async
+from .serializers import (
+    DailyIngredientsLimitSerializer,
+    DailyLimitsWithProgressSerializer,
+    QuickAccessLimitsSerializer,
+)
 
 logger = logging.getLogger(__name__)
 
+def get_day_param(request):
+    """
+    Read ?date=YYYY-MM-DD (defaults to today)
+    
+    Raises:
+        ValueError: If date is not in YYYY-MM-DD format
+    """
+    date_str = request.query_params.get('date')
+    if not date_str:
+        return timezone.localdate()
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def get_limits_with_consumption(user, day):
+    """
+    The user's limits and what they consumed on `day`, in one query
+    
+    Meal nutrient totals of the day are aggregated into a JSON array by a
+    correlated subquery, and the user's email is joined in for the
+    serializer.
+    
+    Returns:
+        Tuple of (DailyIngredientsLimit, consumption dict of nutrient -> amount, meal count)
+    
+    Raises:
+        DailyIngredientsLimit.DoesNotExist: If the user has no limits yet
+    """
+    meal_totals = (
+        Meal.objects
+        .filter(user=OuterRef('user_id'), meal_date=day)
+        .order_by()
+        .values('user')
+        .annotate(totals=JSONBAgg('nutrient_totals'))
+        .values('totals')
+    )
+    
+    daily_limits = (
+        DailyIngredientsLimit.objects
+        .filter(user=user)
+        .annotate(
+            user_email=F('user__email'),
+            meal_totals=Subquery(meal_totals, output_field=JSONField()),
+        )
+        .get()
+    )
+    
+    meals = daily_limits.meal_totals or []
+    return daily_limits, sum_meal_totals(meals), len(meals)
+
+
+def get_day_consumption(user, day) -> dict:
+    """What the user consumed on `day` (nutrient -> amount), one indexed query"""
+    meals = Meal.objects.filter(user=user, meal_date=day).values_list('nutrient_totals', flat=True)
+    return sum_meal_totals(meals)
+
+
+def sum_meal_totals(meals) -> dict:
+    """Add up Meal.nutrient_totals of several meals"""
+    consumption = dict.fromkeys(DailyIngredientsLimit.INGREDIENTS, 0.0)
+    for totals in meals:
+        for name, amount in totals.items():
+            if name in consumption:
+                consumption[name] += amount
+    
+    return {name: round(amount, 2) for name, amount in consumption.items()}
+
+
+def task_owner_key(task_id) -> str:
+    """Redis key recording which user started a generation task"""
+    return f"daily_limits:task:{task_id}"
+
+
 @extend_schema(
     tags=['Daily Limit Calculation'],
     summary='Generate Daily Ingredient Limits',
     description='Generate personalized daily ingredient limits based on user profile',
+    parameters=[
+        OpenApiParameter(
+            name='async', type=bool, required=False,
+            description='Queue generation and return 202 with a status URL; '
+                        'completion is also pushed to ws/daily-limits/'
+        ),
+    ],
 )
 class GenerateDailyLimitsView(APIView):
     """
@@ -23,14 +119,22 @@ class GenerateDailyLimitsView(APIView):
     
     Generates personalized daily ingredient limits based on user profile.
     Creates or updates DailyIngredientsLimit record in database.
+    
+    POST /api/daily-limits/generate/?async=true
+    
+    Queues calculate_daily_limits_async and returns 202 with the task id
+    and a status URL instead of holding the request.
     """
     
     permission_classes = [IsAuthenticated]
+    throttle_classes = [DailyLimitsRateThrottle, LLMBudgetThrottle]
     
+    @idempotent('daily_limits')
     def post(self, request):
         """
         Generate daily limits for authenticated user.
         Pulls data from user profile fields (date_of_birth, weight, height, goal, etc).
+        Repeats sent with the same Idempotency-Key header replay the first response.
         """
         user = request.user
         
@@ -57,6 +161,11 @@ class GenerateDailyLimitsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if request.query_params.get('async', '').lower() in ('1', 'true', 'yes'):
+            response = self._enqueue(request, user)
+            if response is not None:
+                return response
+        
         try:
             # Initialize calculator
             calculator = DailyLimitsCalculator()
@@ -68,7 +177,8 @@ class GenerateDailyLimitsView(APIView):
             daily_limits, created = DailyIngredientsLimit.objects.update_or_create(
                 user=user,
                 defaults={
-                    'ingredients_summary': ingredients_summary
+                    'ingredients_summary': ingredients_summary,
+                    'profile_fingerprint': calculator.user_fingerprint(user),
                 }
             )
             
@@ -103,6 +213,103 @@ class GenerateDailyLimitsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _enqueue(self, request, user):
+        """Queue generation; None if the broker is unavailable (caller runs inline)"""
+        try:
+            task = calculate_daily_limits_async.delay(str(user.id))
+        except Exception as e:
+            logger.warning(f"Could not queue daily limits for user {user.id}, generating inline: {str(e)}")
+            return None
+        
+        try:
+            get_redis_client().set(
+                task_owner_key(task.id), str(user.id), ex=settings.DAILY_LIMITS_TASK_STATUS_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Could not record owner of task {task.id}: {str(e)}")
+        
+        status_url = request.build_absolute_uri(
+            reverse('daily_limit_calculation:daily_limits_task_status', args=[task.id])
+        )
+        
+        return Response(
+            {
+                'message': 'Daily limits generation started',
+                'task_id': task.id,
+                'status_url': status_url,
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url}
+        )
+
+@extend_schema(
+    tags=['Daily Limit Calculation'],
+    summary='Daily Limits Generation Status',
+    description='Status of a generation started with POST generate/?async=true',
+)
+class DailyLimitsTaskStatusView(APIView):
+    """
+    GET /api/daily-limits/generate/status/<task_id>/
+    
+    Returns pending, completed (with the limits) or failed.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [DailyLimitsStatusRateThrottle]
+    
+    def get(self, request, task_id):
+        """Get status of a generation task started by this user"""
+        user = request.user
+        
+        try:
+            owner = get_redis_client().get(task_owner_key(task_id))
+        except Exception as e:
+            logger.error(f"Error reading owner of task {task_id}: {str(e)}")
+            return Response(
+                {'error': 'Failed to retrieve task status'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        if owner is None or owner.decode() != str(user.id):
+            return Response(
+                {'error': 'Task not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        result = AsyncResult(task_id)
+        
+        if not result.ready():
+            return Response({'task_id': task_id, 'status': 'pending'}, status=status.HTTP_200_OK)
+        
+        outcome = result.result if result.successful() else None
+        if not isinstance(outcome, dict) or not outcome.get('success'):
+            error = outcome.get('error') if isinstance(outcome, dict) else None
+            return Response(
+                {
+                    'task_id': task_id,
+                    'status': 'failed',
+                    'error': error or 'Failed to generate daily limits. Please try again.',
+                },
+                status=status.HTTP_200_OK
+            )
+        
+        try:
+            daily_limits = DailyIngredientsLimit.objects.get(user=user)
+        except DailyIngredientsLimit.DoesNotExist:
+            return Response(
+                {'error': 'Daily limits not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(
+            {
+                'task_id': task_id,
+                'status': 'completed',
+                'data': DailyIngredientsLimitSerializer(daily_limits).data,
+            },
+            status=status.HTTP_200_OK
+        )
+
 @extend_schema(
     tags=['Daily Limit Calculation'],
     summary='Get Current Daily Limits',
@@ -113,7 +320,7 @@ class RetrieveDailyLimitsView(APIView):
     GET /api/daily-limits/
     
     Retrieves current daily ingredient limits for authenticated user.
-    Fast lookup from database (single OneToOne query).
+    Served from the per-user payload cache (get_cached_limits).
     """
     
     permission_classes = [IsAuthenticated]
@@ -123,12 +330,9 @@ class RetrieveDailyLimitsView(APIView):
         user = request.user
         
         try:
-            daily_limits = DailyIngredientsLimit.objects.get(user=user)
-            serializer = DailyIngredientsLimitSerializer(daily_limits)
-            
             return Response(
                 {
-                    'data': serializer.data,
+                    'data': get_cached_limits(user),
                     'status': 'success'
                 },
                 status=status.HTTP_200_OK
@@ -170,23 +374,20 @@ class DailyLimitsDetailView(APIView):
         user = request.user
         
         try:
-            daily_limits = DailyIngredientsLimit.objects.get(user=user)
+            limits = get_cached_limits(user)
+            summary = limits['ingredients_summary']
             
             # Build detailed response
             response_data = {
-                'id': str(daily_limits.id),
+                'id': limits['id'],
                 'user_id': str(user.id),
-                'created_at': daily_limits.created_at.isoformat(),
-                'updated_at': daily_limits.updated_at.isoformat(),
+                'created_at': limits['created_at'],
+                'updated_at': limits['updated_at'],
                 'quick_access': {
-                    'calories_target': daily_limits.calories_target,
-                    'protein_target': daily_limits.protein_target,
-                    'fat_target': daily_limits.fat_target,
-                    'carbs_target': daily_limits.carbs_target,
-                    'sodium_target': daily_limits.sodium_target,
-                    'fiber_target': daily_limits.fiber_target,
+                    f'{name}_target': summary.get(name)
+                    for name in ('calories', 'protein', 'fat', 'carbs', 'sodium', 'fiber')
                 },
-                'all_ingredients': daily_limits.ingredients_summary,
+                'all_ingredients': summary,
             }
             
             return Response(response_data, status=status.HTTP_200_OK)
@@ -224,20 +425,21 @@ class GetSpecificIngredientView(APIView):
             )
         
         try:
-            daily_limits = DailyIngredientsLimit.objects.get(user=user)
-            ingredient = daily_limits.get_ingredient(ingredient_name)
+            daily_norm = get_cached_limits(user)['ingredients_summary'].get(ingredient_name)
             
-            if not ingredient:
+            if daily_norm is None:
                 return Response(
                     {'error': f'Ingredient "{ingredient_name}" not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             
+            consumed = get_day_consumption(user, timezone.localdate()).get(ingredient_name, 0.0)
+            
             return Response(
                 {
-                    'ingredient': ingredient,
-                    'consumed_today': 0,
-                    'remaining': ingredient['daily_norm'],
+                    'ingredient': {'name': ingredient_name, 'daily_norm': daily_norm},
+                    'consumed_today': consumed,
+                    'remaining': round(daily_norm - consumed, 2),
                 },
                 status=status.HTTP_200_OK
             )
@@ -248,6 +450,62 @@ class GetSpecificIngredientView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+@extend_schema(
+    tags=['Daily Limit Calculation'],
+    summary='Progress Against Daily Limits',
+    description='Consumed, remaining, percentage and status for every nutrient on a given day',
+    parameters=[
+        OpenApiParameter(name='date', description='Date in YYYY-MM-DD format (defaults to today)', required=False, type=str)
+    ],
+)
+class DailyLimitsProgressView(APIView):
+    """
+    GET /api/daily-limits/progress/?date=2025-01-31
+    
+    Daily limits joined with the day's meal nutrients in a single query.
+    Everything the home screen needs in one call.
+    """
+    
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """Get progress against daily limits"""
+        user = request.user
+        
+        try:
+            day = get_day_param(request)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            daily_limits, consumption, meals_count = get_limits_with_consumption(user, day)
+        
+        except DailyIngredientsLimit.DoesNotExist:
+            return Response(
+                {
+                    'error': 'Daily limits not found. Please generate them first.',
+                    'action': 'POST /api/daily-limits/generate/'
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        serializer = DailyLimitsWithProgressSerializer(
+            daily_limits,
+            context={'today_consumption': consumption}
+        )
+        
+        return Response(
+            {
+                'date': day.isoformat(),
+                'meals_count': meals_count,
+                'data': serializer.data,
+            },
+            status=status.HTTP_200_OK
+        )
+
 @extend_schema(
     tags=['Daily Limit Calculation'],
     summary='Validate Daily Limits',
@@ -276,9 +534,7 @@ class ValidateDailyLimitsView(APIView):
                     'ingredients_count': len(daily_limits.ingredients_summary),
                     'has_calories': daily_limits.calories_target is not None,
                     'has_protein': daily_limits.protein_target is not None,
-                    'ingredients_list': [
-                        ing['name'] for ing in daily_limits.ingredients_summary
-                    ]
+                    'ingredients_list': list(daily_limits.ingredients_summary)
                 },
                 status=status.HTTP_200_OK
             )
@@ -305,8 +561,7 @@ class QuickAccessView(APIView):
         user = request.user
         
         try:
-            daily_limits = DailyIngredientsLimit.objects.get(user=user)
-            serializer = QuickAccessLimitsSerializer(daily_limits)
+            serializer = QuickAccessLimitsSerializer(get_cached_limits(user))
             
             return Response(
                 {
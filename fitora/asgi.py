@@ -8,6 +8,7 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
 from users.middleware import JWTAuthMiddleware
 import meals.routing
+import daily_limit_calculation.routing
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -15,6 +16,7 @@ application = ProtocolTypeRouter({
         JWTAuthMiddleware(
             URLRouter(
                 meals.routing.websocket_urlpatterns
+                + daily_limit_calculation.routing.websocket_urlpatterns
             )
         )
     ),
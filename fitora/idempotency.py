@@ -0,0 +1,210 @@
+# fitora/idempotency.py
+
+from functools import wraps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from chatbot.services.single_flight import SingleFlight
+from fitora.redis_pool import get_redis_client
+import hashlib
+import json
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Headers of the original response a replay carries again
+REPLAYED_HEADERS = ('Location', 'Content-Location', 'ETag')
+
+
+class IdempotencyStore(SingleFlight):
+    """
+    Stores and replays responses of POST requests sent with an Idempotency-Key
+
+    Keyed by (scope, user, key). The first request takes the lock and runs
+    the view; its response is kept for IDEMPOTENCY_TTL and replayed for any
+    repeat. A repeat that arrives while the first request is still running
+    waits for its response (same lock/result/pub-sub mechanics as
+    SingleFlight) instead of starting a second model call.
+
+    Only final answers are stored: after a server error, or any response
+    carrying Retry-After (a 503, or chat's degraded 200 reply), the
+    client's retry runs again. Replays restore REPLAYED_HEADERS (e.g.
+    Location of a 202). Reusing a key with a different body is rejected
+    with 422.
+
+    Key layout:
+        idempotency:{scope}:{user_id}:{digest}:lock    -> owner token
+        idempotency:{scope}:{user_id}:{digest}:result  -> stored response
+        idempotency:{scope}:{user_id}:{digest}:done    -> pub/sub channel
+
+    Fails open: without Redis the view simply runs.
+    """
+
+    def __init__(self, prefix: str = 'idempotency'):
+        self.prefix = prefix
+        self.enabled = True
+        self.lock_ttl = settings.IDEMPOTENCY_LOCK_TTL
+        self.wait_timeout = settings.IDEMPOTENCY_WAIT
+        self.result_ttl = settings.IDEMPOTENCY_TTL
+
+    @staticmethod
+    def request_fingerprint(request: Request) -> str:
+        """Hash of path and body; uploaded files count by name and size"""
+        body = json.dumps(
+            request.data, sort_keys=True, cls=DjangoJSONEncoder,
+            default=lambda f: [getattr(f, 'name', None), getattr(f, 'size', None)]
+        )
+        return hashlib.sha256(f"{request.path}\n{body}".encode('utf-8')).hexdigest()
+
+    def execute(self, scope: str, request: Request, handler):
+        """
+        Run handler() at most once per (scope, user, Idempotency-Key)
+
+        Args:
+            scope: Endpoint name, e.g. 'chatbot', 'meal_analysis'
+            request: The authenticated DRF request
+            handler: Callable producing the view's Response
+
+        Returns:
+            The view's Response, a replay of the stored one, or an error
+            Response (400 bad key, 409 still in progress, 422 key reuse)
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return handler()
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        base = f"{self.prefix}:{scope}:{request.user.id}:{self.fingerprint(key)}"
+        lock_key, result_key, channel = f"{base}:lock", f"{base}:result", f"{base}:done"
+        fingerprint = self.request_fingerprint(request)
+        token = uuid.uuid4().hex
+
+        try:
+            client = get_redis_client()
+            stored = client.get(result_key)
+            acquired = stored is None and self._acquire(client, lock_key, token, result_key)
+            if acquired is None:
+                # The first request finished between the two checks
+                stored = client.get(result_key)
+        except Exception as e:
+            logger.warning(f"Idempotency store unavailable, running request directly: {e}")
+            return handler()
+
+        if stored is None and not acquired:
+            stored = self._follow(client, lock_key, result_key, channel, self.wait_timeout)
+            if stored is None and not self._take_over(client, lock_key, token):
+                return Response(
+                    {'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Retry-After': '1'}
+                )
+
+        if stored is not None:
+            return self._replay(stored, fingerprint, key)
+
+        return self._run(client, lock_key, result_key, channel, token, fingerprint, handler)
+
+    def _acquire(self, client, lock_key, token, result_key):
+        """
+        Take the lock for this key
+
+        Returns True if taken, False if another request holds it, or None
+        if a response was stored in the meantime (the lock is given back).
+        """
+        if not client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+            return False
+        if client.exists(result_key):
+            client.eval(self.RELEASE_SCRIPT, 1, lock_key, token)
+            return None
+        return True
+
+    def _take_over(self, client, lock_key, token) -> bool:
+        """After the first request failed or died without storing a response"""
+        try:
+            return bool(client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)))
+        except Exception as e:
+            logger.warning(f"Idempotency lock retry failed: {e}")
+            return False
+
+    def _run(self, client, lock_key, result_key, channel, token, fingerprint, handler):
+        try:
+            response = handler()
+        except Exception:
+            self._release(client, lock_key, channel, token)
+            raise
+
+        if response.status_code >= 500 or response.has_header('Retry-After'):
+            # "Try again later" is not the answer to replay for a day
+            self._release(client, lock_key, channel, token)
+            return response
+
+        self._finish(client, lock_key, result_key, channel, token, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'data': response.data,
+            'headers': {
+                name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)
+            },
+        })
+        return response
+
+    def _release(self, client, lock_key, channel, token):
+        """Drop the lock without storing anything; waiting repeats take over"""
+        try:
+            client.eval(self.RELEASE_SCRIPT, 1, lock_key, token)
+            client.publish(channel, b'1')
+        except Exception as e:
+            logger.warning(f"Idempotency lock release failed: {e}")
+
+    def _replay(self, stored, fingerprint: str, key: str) -> Response:
+        if isinstance(stored, (bytes, str)):
+            stored = json.loads(stored)
+
+        if stored.get('fingerprint') != fingerprint:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        logger.info(f"Replaying stored response for {IDEMPOTENCY_HEADER} {key}")
+        return Response(
+            stored['data'],
+            status=stored['status'],
+            headers={**stored.get('headers', {}), REPLAY_HEADER: 'true'}
+        )
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(scope: str):
+    """
+    Make a POST view honour the Idempotency-Key header
+
+    Works on APIView methods and @api_view functions; place it directly on
+    the function so it runs after authentication and throttling:
+
+        @api_view(['POST'])
+        @throttle_classes([...])
+        @idempotent('meal_analysis')
+        def analyze_meal(request): ...
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            request = next(arg for arg in args if isinstance(arg, Request))
+            return idempotency_store.execute(scope, request, lambda: view_func(*args, **kwargs))
+        return wrapper
+    return decorator
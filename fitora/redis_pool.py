@@ -0,0 +1,131 @@
+# fitora/redis_pool.py
+
+import threading
+import redis
+from django.conf import settings
+from django_redis.pool import ConnectionFactory
+from typing import Dict
+
+
+_pool = None
+_pubsub_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> redis.BlockingConnectionPool:
+    """
+    Process-wide Redis connection pool shared by every sync Redis consumer
+
+    Built once from settings.REDIS_URL and settings.REDIS_POOL_OPTIONS
+    (max_connections, health_check_interval, socket timeouts). When all
+    connections are busy, callers wait up to REDIS_POOL_TIMEOUT seconds
+    for one to be released instead of opening more.
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = redis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    password=settings.REDIS_PASSWORD,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    **settings.REDIS_POOL_OPTIONS
+                )
+    return _pool
+
+
+def get_pubsub_connection_pool() -> redis.BlockingConnectionPool:
+    """
+    Separate pool for long-lived pub/sub subscriptions
+
+    Single-flight and idempotency followers hold a connection for their
+    whole wait; drawing those from the shared pool would let a burst of
+    duplicates starve ordinary cache reads. Sized by
+    REDIS_PUBSUB_MAX_CONNECTIONS; when it is exhausted a follower stops
+    waiting instead of blocking (see SingleFlight._follow).
+    """
+    global _pubsub_pool
+
+    if _pubsub_pool is None:
+        with _pool_lock:
+            if _pubsub_pool is None:
+                options = {**settings.REDIS_POOL_OPTIONS, 'max_connections': settings.REDIS_PUBSUB_MAX_CONNECTIONS}
+                _pubsub_pool = redis.BlockingConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    password=settings.REDIS_PASSWORD,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    **options
+                )
+    return _pubsub_pool
+
+
+def get_redis_client() -> redis.Redis:
+    """Redis client backed by the shared pool (responses are bytes)"""
+    return redis.Redis(connection_pool=get_connection_pool())
+
+
+def get_pubsub_client() -> redis.Redis:
+    """Redis client for subscriptions, backed by the pub/sub pool"""
+    return redis.Redis(connection_pool=get_pubsub_connection_pool())
+
+
+def pool_stats(pool: redis.ConnectionPool = None) -> Dict:
+    """
+    Usage of a pool (the shared one by default) in this process
+
+    Connection counts come from redis-py internals that differ between
+    versions; any that cannot be read are reported as None.
+
+    Returns:
+        Dict with max_connections, created, in_use, idle and utilization
+    """
+    pool = pool or get_connection_pool()
+    max_connections = getattr(pool, 'max_connections', None)
+
+    created = idle = None
+    try:
+        connections = getattr(pool, '_connections', None)
+        if connections is not None:
+            created = len(connections)
+
+        queue = getattr(getattr(pool, 'pool', None), 'queue', None)
+        if queue is not None:
+            # BlockingConnectionPool: unused slots are None, released connections are queued back
+            idle = sum(1 for connection in list(queue) if connection is not None)
+        else:
+            # ConnectionPool keeps explicit available/in-use collections
+            available = getattr(pool, '_available_connections', None)
+            in_use_connections = getattr(pool, '_in_use_connections', None)
+            if available is not None:
+                idle = len(available)
+            if created is None and available is not None and in_use_connections is not None:
+                created = len(available) + len(in_use_connections)
+    except Exception:
+        created = idle = None
+
+    in_use = created - idle if created is not None and idle is not None else None
+    utilization = None
+    if in_use is not None and max_connections:
+        utilization = round(in_use / max_connections, 3)
+
+    return {
+        'max_connections': max_connections,
+        'created': created,
+        'in_use': in_use,
+        'idle': idle,
+        'utilization': utilization,
+    }
+
+
+class SharedConnectionFactory(ConnectionFactory):
+    """
+    django-redis connection factory that hands out the shared pool
+
+    Makes the cache backend (and get_redis_connection users such as the
+    rate limiter and budget service) draw from the same pool as
+    CacheService instead of keeping one of their own.
+    """
+
+    def get_or_create_connection_pool(self, params):
+        return get_connection_pool()
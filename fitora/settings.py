@@ -1,6 +1,8 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+from urllib.parse import quote
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -40,7 +42,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'chatbot.middleware.rate_limit.RateLimitMiddleware'
+    'chatbot.middleware.rate_limit.RateLimitHeadersMiddleware'
 ]
 
 ROOT_URLCONF = 'fitora.urls'
@@ -175,12 +177,27 @@ REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
 REDIS_DB = int(os.getenv('REDIS_DB', 0))
 REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+
+# Shared connection pool (fitora.redis_pool) used by every Redis consumer
+REDIS_POOL_OPTIONS = {
+    'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+    'health_check_interval': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', 5)),
+    'socket_connect_timeout': float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 5)),
+    'retry_on_timeout': True,
+}
+# Seconds to wait for a free pooled connection before erroring
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 2))
+# Separate pool for pub/sub waits (single-flight and idempotency followers)
+REDIS_PUBSUB_MAX_CONNECTIONS = int(os.getenv('REDIS_PUBSUB_MAX_CONNECTIONS', 50))
+DJANGO_REDIS_CONNECTION_FACTORY = 'fitora.redis_pool.SharedConnectionFactory'
 
 # Django Cache (for rate limiting + chatbot caching)
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}',
+        'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             'PASSWORD': REDIS_PASSWORD,
@@ -194,7 +211,13 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [(REDIS_HOST, REDIS_PORT)],
+            # channels_redis is asyncio-based and keeps its own per-loop pools,
+            # built with the same limits and timeouts as the shared pool
+            "hosts": [{
+                'address': REDIS_URL,
+                'password': REDIS_PASSWORD,
+                **{k: v for k, v in REDIS_POOL_OPTIONS.items() if k != 'retry_on_timeout'},
+            }],
         },
     },
 }
@@ -202,10 +225,131 @@ CHANNEL_LAYERS = {
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4')
 
+# LLM backend used by chat, meal analysis and daily limits:
+# 'openai', or 'fake' for offline load tests and benchmarks
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+LLM_FAKE_OPTIONS = {
+    'latency_ms': float(os.getenv('LLM_FAKE_LATENCY_MS', 800)),  # median
+    'latency_sigma': float(os.getenv('LLM_FAKE_LATENCY_SIGMA', 0.4)),  # log-normal spread
+    'stream_chunk_ms': float(os.getenv('LLM_FAKE_STREAM_CHUNK_MS', 15)),
+    'output_tokens': int(os.getenv('LLM_FAKE_OUTPUT_TOKENS', 150)),
+    'error_rate': float(os.getenv('LLM_FAKE_ERROR_RATE', 0.0)),
+    'image_tokens': int(os.getenv('LLM_FAKE_IMAGE_TOKENS', 85)),
+    'seed': int(os.getenv('LLM_FAKE_SEED', 0)),
+}
+
+# Upstream resilience for every LLM call (chatbot.services.llm_provider)
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 30))  # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5))  # full-jitter backoff
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 4))
+LLM_RETRY_DEADLINE = float(os.getenv('LLM_RETRY_DEADLINE', 10))  # no retry past this many seconds
+# Total backoff one call may sleep; a longer wait (e.g. upstream Retry-After)
+# degrades right away instead of holding the worker
+LLM_RETRY_SLEEP_BUDGET = float(os.getenv('LLM_RETRY_SLEEP_BUDGET', 1.0))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))  # consecutive failures
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 5))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv('LLM_BREAKER_MAX_COOLDOWN', 120))
+
+# Coalesce identical concurrent LLM requests (same user, feature and content)
+LLM_SINGLE_FLIGHT_ENABLED = os.getenv('LLM_SINGLE_FLIGHT_ENABLED', 'True') == 'True'
+LLM_SINGLE_FLIGHT_LOCK_TTL = int(os.getenv('LLM_SINGLE_FLIGHT_LOCK_TTL', 120))  # seconds
+LLM_SINGLE_FLIGHT_WAIT = int(os.getenv('LLM_SINGLE_FLIGHT_WAIT', 60))  # seconds a duplicate waits
+
+# Daily limits are computed locally; the LLM only refines them when enabled,
+# and each refined value stays within this fraction of the computed one
+DAILY_LIMITS_LLM_REFINEMENT = os.getenv('DAILY_LIMITS_LLM_REFINEMENT', 'False') == 'True'
+DAILY_LIMITS_REFINEMENT_TOLERANCE = float(os.getenv('DAILY_LIMITS_REFINEMENT_TOLERANCE', 0.25))
+# Refinements are shared across profiles with the same quantized fingerprint
+DAILY_LIMITS_CACHE_TTL = int(os.getenv('DAILY_LIMITS_CACHE_TTL', 7 * 24 * 3600))  # seconds
+DAILY_LIMITS_FINGERPRINT_BUCKETS = {
+    'age': int(os.getenv('DAILY_LIMITS_AGE_BUCKET', 5)),  # years
+    'weight': float(os.getenv('DAILY_LIMITS_WEIGHT_BUCKET', 2)),  # kg
+    'height': float(os.getenv('DAILY_LIMITS_HEIGHT_BUCKET', 5)),  # cm
+}
+
+# Idempotency-Key replay for LLM-backed POST endpoints (fitora.idempotency)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))  # seconds a response is replayed
+IDEMPOTENCY_LOCK_TTL = int(os.getenv('IDEMPOTENCY_LOCK_TTL', 120))  # longest expected request
+IDEMPOTENCY_WAIT = int(os.getenv('IDEMPOTENCY_WAIT', 60))  # seconds a repeat waits for the first
+
 # Chatbot Settings
 CHATBOT_MAX_HISTORY_MESSAGES = int(os.getenv('CHATBOT_MAX_HISTORY_MESSAGES', 20))
 CHATBOT_MAX_TOKENS = int(os.getenv('CHATBOT_MAX_TOKENS', 8000))
 CHATBOT_CACHE_TTL = int(os.getenv('CHATBOT_CACHE_TTL', 3600))
+# Circuit breaker around the chat history cache: open after N connection
+# errors, probe again after a cool-down that doubles up to the max (seconds)
+CHATBOT_CACHE_BREAKER_THRESHOLD = int(os.getenv('CHATBOT_CACHE_BREAKER_THRESHOLD', 3))
+CHATBOT_CACHE_BREAKER_COOLDOWN = float(os.getenv('CHATBOT_CACHE_BREAKER_COOLDOWN', 1))
+CHATBOT_CACHE_BREAKER_MAX_COOLDOWN = float(os.getenv('CHATBOT_CACHE_BREAKER_MAX_COOLDOWN', 60))
+# Rolling summary: refresh every N turns, keep the last M messages verbatim
+CHATBOT_SUMMARY_EVERY_TURNS = int(os.getenv('CHATBOT_SUMMARY_EVERY_TURNS', 5))
+CHATBOT_RECENT_MESSAGES = int(os.getenv('CHATBOT_RECENT_MESSAGES', 6))
+# At most one queued refresh per session; the guard expires after this (seconds)
+CHATBOT_SUMMARY_PENDING_TTL = int(os.getenv('CHATBOT_SUMMARY_PENDING_TTL', 300))
+# Answer cache for context-free questions. Similarity 0 = exact match of the
+# normalized question only (default); above 0, near-duplicates with the same
+# numbers, units, gender/age, negation and time words are also served
+CHATBOT_ANSWER_CACHE_ENABLED = os.getenv('CHATBOT_ANSWER_CACHE_ENABLED', 'True') == 'True'
+CHATBOT_ANSWER_CACHE_SIZE = int(os.getenv('CHATBOT_ANSWER_CACHE_SIZE', 512))
+CHATBOT_ANSWER_CACHE_TTL = int(os.getenv('CHATBOT_ANSWER_CACHE_TTL', 86400))
+CHATBOT_ANSWER_CACHE_SIMILARITY = float(os.getenv('CHATBOT_ANSWER_CACHE_SIMILARITY', 0))
+
+# Celery (background tasks); unlike CACHES, the broker and result backend
+# take the password only inside the URL
+REDIS_BROKER_URL = (
+    f'redis://:{quote(REDIS_PASSWORD, safe="")}@{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+    if REDIS_PASSWORD else REDIS_URL
+)
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_BROKER_URL)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_POOL_OPTIONS['max_connections']
+CELERY_REDIS_SOCKET_TIMEOUT = REDIS_POOL_OPTIONS['socket_timeout']
+CELERY_REDIS_SOCKET_CONNECT_TIMEOUT = REDIS_POOL_OPTIONS['socket_connect_timeout']
+CELERY_REDIS_BACKEND_HEALTH_CHECK_INTERVAL = REDIS_POOL_OPTIONS['health_check_interval']
+# Unacked messages, including ones held for a countdown/ETA, are redelivered
+# after visibility_timeout seconds; never schedule further ahead than that
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 3600)),
+}
+CELERY_BEAT_SCHEDULE = {
+    'aggregate-usage-rollups': {
+        'task': 'chatbot.tasks.aggregate_usage_rollups',
+        'schedule': 300.0,  # Every 5 minutes
+    },
+    'recalculate-daily-limits': {
+        'task': 'daily_limit_calculation.tasks.recalculate_all_user_limits',
+        'schedule': crontab(hour=2, minute=0, day_of_week=0),  # Weekly, Sunday 2 AM
+    },
+}
+
+# Weekly limit recalculation: users streamed in chunks, changed ones
+# recalculated in batches sent at a bounded rate
+DAILY_LIMITS_RECALC_CHUNK_SIZE = int(os.getenv('DAILY_LIMITS_RECALC_CHUNK_SIZE', 2000))
+DAILY_LIMITS_RECALC_BATCH_SIZE = int(os.getenv('DAILY_LIMITS_RECALC_BATCH_SIZE', 200))
+DAILY_LIMITS_RECALC_BATCHES_PER_MINUTE = float(os.getenv('DAILY_LIMITS_RECALC_BATCHES_PER_MINUTE', 30))
+# Batches are scheduled at most this far ahead (kept below the visibility
+# timeout); the rest of the users are picked up by a follow-up run
+DAILY_LIMITS_RECALC_WINDOW = min(
+    int(os.getenv('DAILY_LIMITS_RECALC_WINDOW', 3000)),
+    CELERY_BROKER_TRANSPORT_OPTIONS['visibility_timeout'] - 300
+)
+
+# Recalculate limits after profile edits that affect them; edits within
+# the debounce window are coalesced into one run
+DAILY_LIMITS_REGENERATE_ON_PROFILE_CHANGE = os.getenv('DAILY_LIMITS_REGENERATE_ON_PROFILE_CHANGE', 'True') == 'True'
+DAILY_LIMITS_REGENERATE_DEBOUNCE = int(os.getenv('DAILY_LIMITS_REGENERATE_DEBOUNCE', 60))  # seconds
+
+# How long the status URL of an async generation stays valid (seconds)
+DAILY_LIMITS_TASK_STATUS_TTL = int(os.getenv('DAILY_LIMITS_TASK_STATUS_TTL', 3600))
+
+# Serialized limits served by the read endpoints; versioned per user and
+# invalidated on every save, the TTL only bounds staleness from writes that
+# bypass it (seconds)
+DAILY_LIMITS_PAYLOAD_CACHE_TTL = int(os.getenv('DAILY_LIMITS_PAYLOAD_CACHE_TTL', 24 * 3600))
 
 LOGGING = {
     'version': 1,
@@ -248,4 +392,34 @@ LOGGING = {
 
 # Rate Limiting
 RATELIMIT_ENABLE = True
-RATELIMIT_USE_CACHE = 'default'
\ No newline at end of file
+RATELIMIT_USE_CACHE = 'default'
+
+# Per-user daily LLM usage budgets across all features (0 = unlimited)
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv('LLM_DAILY_TOKEN_BUDGET', 200000))
+LLM_DAILY_COST_BUDGET = float(os.getenv('LLM_DAILY_COST_BUDGET', 1.0))
+
+# Per-user request rates for LLM-backed endpoints (fitora.throttling)
+LLM_THROTTLE_RATES = {
+    'chatbot': {
+        'minute': {'limit': int(os.getenv('CHATBOT_RATE_PER_MINUTE', 30)), 'window': 60},
+        'hour': {'limit': int(os.getenv('CHATBOT_RATE_PER_HOUR', 100)), 'window': 3600},
+    },
+    # Chat history reads (no model call) have their own, looser budget
+    'chatbot_read': {
+        'minute': {'limit': int(os.getenv('CHATBOT_READ_RATE_PER_MINUTE', 120)), 'window': 60},
+        'hour': {'limit': int(os.getenv('CHATBOT_READ_RATE_PER_HOUR', 2000)), 'window': 3600},
+    },
+    'meal_analysis': {
+        'minute': {'limit': int(os.getenv('MEAL_ANALYSIS_RATE_PER_MINUTE', 10)), 'window': 60},
+        'day': {'limit': int(os.getenv('MEAL_ANALYSIS_RATE_PER_DAY', 100)), 'window': 86400},
+    },
+    'daily_limits': {
+        'hour': {'limit': int(os.getenv('DAILY_LIMITS_RATE_PER_HOUR', 5)), 'window': 3600},
+        'day': {'limit': int(os.getenv('DAILY_LIMITS_RATE_PER_DAY', 20)), 'window': 86400},
+    },
+    # Polling the status of an async generation (no model call)
+    'daily_limits_status': {
+        'minute': {'limit': int(os.getenv('DAILY_LIMITS_STATUS_RATE_PER_MINUTE', 60)), 'window': 60},
+        'hour': {'limit': int(os.getenv('DAILY_LIMITS_STATUS_RATE_PER_HOUR', 600)), 'window': 3600},
+    },
+}
\ No newline at end of file
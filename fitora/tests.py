@@ -0,0 +1,119 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .idempotency import IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, REPLAY_HEADER, idempotent
+from .redis_pool import get_redis_client
+
+
+class IdempotencyTests(TestCase):
+    """Idempotency-Key replay and key reuse through the @idempotent decorator"""
+
+    def setUp(self):
+        try:
+            get_redis_client().ping()
+        except Exception:
+            self.skipTest('Redis is not reachable')
+
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(email='idempotency@example.com')
+        self.other_user = get_user_model().objects.create_user(email='other@example.com')
+        # A fresh key per test, so stored responses never leak between tests
+        self.key = uuid.uuid4().hex
+        self.calls = []
+        self.status_code = status.HTTP_201_CREATED
+        self.headers = {}
+
+        @api_view(['POST'])
+        @idempotent('tests')
+        def view(request):
+            self.calls.append(request.data)
+            return Response({'call': len(self.calls)}, status=self.status_code, headers=self.headers)
+
+        self.view = view
+
+    def post(self, data, key=None, user=None):
+        headers = {IDEMPOTENCY_HEADER: key if key is not None else self.key}
+        request = self.factory.post('/tests/', data, format='json', headers=headers)
+        force_authenticate(request, user=user or self.user)
+        return self.view(request)
+
+    def test_repeat_is_replayed(self):
+        first = self.post({'message': 'hi'})
+        second = self.post({'message': 'hi'})
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second.data, first.data)
+        self.assertNotIn(REPLAY_HEADER, first)
+        self.assertEqual(second[REPLAY_HEADER], 'true')
+
+    def test_key_reused_with_different_body(self):
+        self.post({'message': 'hi'})
+
+        response = self.post({'message': 'something else'})
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_server_error_is_not_stored(self):
+        self.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        self.post({'message': 'hi'})
+        self.status_code = status.HTTP_201_CREATED
+
+        response = self.post({'message': 'hi'})
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn(REPLAY_HEADER, response)
+
+    def test_retry_after_response_is_not_stored(self):
+        # e.g. chat's degraded 200 reply while the model is unavailable
+        self.status_code = status.HTTP_200_OK
+        self.headers = {'Retry-After': '5'}
+        self.post({'message': 'hi'})
+        self.headers = {}
+
+        response = self.post({'message': 'hi'})
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertNotIn(REPLAY_HEADER, response)
+
+    def test_replay_restores_location(self):
+        self.status_code = status.HTTP_202_ACCEPTED
+        self.headers = {'Location': '/tasks/abc/', 'X-Internal': 'not replayed'}
+        self.post({'message': 'hi'})
+
+        response = self.post({'message': 'hi'})
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], '/tasks/abc/')
+        self.assertNotIn('X-Internal', response)
+
+    def test_keys_are_per_user(self):
+        self.post({'message': 'hi'})
+
+        response = self.post({'message': 'hi'}, user=self.other_user)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertNotIn(REPLAY_HEADER, response)
+
+    def test_without_key_every_request_runs(self):
+        for _ in range(2):
+            request = self.factory.post('/tests/', {'message': 'hi'}, format='json')
+            force_authenticate(request, user=self.user)
+            self.view(request)
+
+        self.assertEqual(len(self.calls), 2)
+
+    def test_overlong_key(self):
+        response = self.post({'message': 'hi'}, key='k' * (MAX_KEY_LENGTH + 1))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.calls, [])
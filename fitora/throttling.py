@@ -0,0 +1,107 @@
+# fitora/throttling.py
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from chatbot.services.budget_service import budget_service
+from chatbot.services.rate_limiter import SlidingWindowRateLimiter
+
+
+class LLMRateThrottle(BaseThrottle):
+    """
+    Per-user, per-feature throttle for endpoints that call the LLM
+    
+    Runs inside DRF after authentication, so budgets are keyed by the user
+    id claim of the already-verified JWT (no extra DB lookup) instead of
+    the client IP. Anonymous requests fall back to the IP.
+    
+    Budgets come from settings.LLM_THROTTLE_RATES[scope], e.g.:
+        'chatbot': {
+            'minute': {'limit': 30, 'window': 60},
+            'hour': {'limit': 100, 'window': 3600},
+        }
+    
+    Subclasses set `scope`.
+    """
+    
+    scope = None
+    
+    def __init__(self):
+        self.result = None
+    
+    def get_identifier(self, request):
+        """Identity from the verified token claims, falling back to IP"""
+        token = getattr(request, 'auth', None)
+        
+        if token is not None and hasattr(token, 'get'):
+            user_id = token.get(jwt_settings.USER_ID_CLAIM)
+            if user_id is not None:
+                return f"user:{user_id}"
+            
+            dietologist_id = token.get('dietologist_id')
+            if dietologist_id is not None:
+                return f"dietologist:{dietologist_id}"
+        
+        return f"ip:{self.get_ident(request)}"
+    
+    def allow_request(self, request, view):
+        rates = settings.LLM_THROTTLE_RATES.get(self.scope)
+        if not rates:
+            return True
+        
+        limiter = SlidingWindowRateLimiter(rates, prefix=f"throttle:{self.scope}")
+        self.result = limiter.hit(self.get_identifier(request))
+        
+        # Picked up by RateLimitHeadersMiddleware
+        request._request.rate_limit = self.result
+        
+        return self.result.allowed
+    
+    def wait(self):
+        return self.result.retry_after if self.result else None
+
+
+class ChatbotRateThrottle(LLMRateThrottle):
+    scope = 'chatbot'
+
+
+class ChatbotReadRateThrottle(LLMRateThrottle):
+    """Session listing, history paging and deletion; never counts against 'chatbot'"""
+    scope = 'chatbot_read'
+
+
+class MealAnalysisRateThrottle(LLMRateThrottle):
+    scope = 'meal_analysis'
+
+
+class DailyLimitsRateThrottle(LLMRateThrottle):
+    scope = 'daily_limits'
+
+
+class DailyLimitsStatusRateThrottle(LLMRateThrottle):
+    """Generation status polling; never counts against 'daily_limits'"""
+    scope = 'daily_limits_status'
+
+
+class LLMBudgetThrottle(BaseThrottle):
+    """
+    Rejects requests from users who spent today's LLM token/cost budget
+    
+    Checked before the view runs, so an over-budget request never reaches
+    a model call. Usage is charged by the services after each call.
+    Retry-After points at the next UTC midnight.
+    """
+    
+    def allow_request(self, request, view):
+        token = getattr(request, 'auth', None)
+        if token is None or not hasattr(token, 'get'):
+            return True
+        
+        user_id = token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return True
+        
+        return budget_service.is_within_budget(user_id)
+    
+    def wait(self):
+        return budget_service.seconds_until_reset()
@@ -37,9 +37,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from .views import redis_pool_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/internal/redis-pool/', redis_pool_stats, name='redis-pool-stats'),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('', include('users.urls')),
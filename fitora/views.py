@@ -0,0 +1,36 @@
+# fitora/views.py
+
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema
+from .redis_pool import get_pubsub_connection_pool, get_redis_client, pool_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@extend_schema(tags=['Internal'])
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def redis_pool_stats(request):
+    """
+    Shared and pub/sub Redis pool usage for the serving process, plus the
+    server-wide client count, for sizing REDIS_MAX_CONNECTIONS,
+    REDIS_PUBSUB_MAX_CONNECTIONS and Redis maxclients.
+    """
+    data = {'pool': pool_stats(), 'pubsub_pool': pool_stats(get_pubsub_connection_pool())}
+    
+    try:
+        clients = get_redis_client().info('clients')
+        data['server'] = {
+            'connected_clients': clients.get('connected_clients'),
+            'blocked_clients': clients.get('blocked_clients'),
+            'maxclients': clients.get('maxclients'),
+        }
+    except Exception as e:
+        logger.warning(f"Could not read Redis client info: {e}")
+        return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    return Response(data)
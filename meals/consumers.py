@@ -80,6 +80,7 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from chatbot.services.budget_service import budget_service
 from .services import analyze_meal_image
 
 class MealAnalysisConsumer(AsyncWebsocketConsumer):
@@ -104,6 +105,13 @@ class MealAnalysisConsumer(AsyncWebsocketConsumer):
         try:
             # Handle binary image data
             if bytes_data:
+                if not await self.is_within_budget():
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'Daily AI usage limit reached. Please try again tomorrow.'
+                    }))
+                    return
+                
                 await self.send(text_data=json.dumps({
                     'type': 'analysis_started',
                     'message': 'Analyzing your meal...'
@@ -142,6 +150,10 @@ class MealAnalysisConsumer(AsyncWebsocketConsumer):
                 'message': f'Server error: {str(e)}'
             }))
     
+    @database_sync_to_async
+    def is_within_budget(self):
+        return budget_service.is_within_budget(self.user.id)
+    
     @database_sync_to_async
     def analyze_image(self, image_data):
-        return analyze_meal_image(image_data)
\ No newline at end of file
+        return analyze_meal_image(image_data, user_id=self.user.id)
\ No newline at end of file
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+from meals.nutrients import sum_foods
+
+
+def backfill_nutrient_totals(apps, schema_editor):
+    Meal = apps.get_model('meals', 'Meal')
+
+    batch = []
+    for meal in Meal.objects.only('id', 'foods_data').iterator(chunk_size=500):
+        meal.nutrient_totals = sum_foods(meal.foods_data)
+        batch.append(meal)
+        if len(batch) >= 500:
+            Meal.objects.bulk_update(batch, ['nutrient_totals'])
+            batch = []
+    if batch:
+        Meal.objects.bulk_update(batch, ['nutrient_totals'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0003_alter_meal_options_rename_image_meal_image_url_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='nutrient_totals',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', 'meal_date'], name='meals_user_id_94af0e_idx'),
+        ),
+        migrations.RunPython(backfill_nutrient_totals, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from users.models import User
 from django.utils import timezone
+from .nutrients import sum_foods
 
 class Meal(models.Model):
     MEAL_TIME_CHOICES = [
@@ -14,6 +15,9 @@ class Meal(models.Model):
     image_url = models.ImageField(upload_to='meals/%Y/%m/%d/')
     meal_date = models.DateField(default=timezone.now)
     foods_data = models.JSONField()
+    # Numeric totals of foods_data per nutrient (meals.nutrients), kept in
+    # sync on save so daily progress never re-parses the foods
+    nutrient_totals = models.JSONField(default=dict, editable=False)
     meal_time = models.CharField(max_length=20, choices=MEAL_TIME_CHOICES, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -21,6 +25,16 @@ class Meal(models.Model):
     class Meta:
         db_table = 'meals'
         ordering = ['-meal_date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'meal_date']),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+    
+    def save(self, *args, **kwargs):
+        self.nutrient_totals = sum_foods(self.foods_data)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'foods_data' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nutrient_totals'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,78 @@
+import re
+from typing import Dict
+
+# Where each nutrient lives in a food of foods_data (see schemas.Food)
+NUTRIENT_GROUPS = {
+    'nutritions': ('calories', 'carbs', 'fat', 'protein', 'fiber'),
+    'minerals': ('calcium', 'iron', 'magnesium', 'potassium', 'zinc', 'sodium', 'selenium'),
+    'vitamins': (
+        'vitamin_a', 'vitamin_b12', 'vitamin_b9', 'vitamin_c',
+        'vitamin_d', 'vitamin_e', 'vitamin_k', 'vitamin_b6',
+    ),
+    'fats': ('cholesterol', 'omega_3', 'saturated_fat', 'unsaturated_fat', 'omega_6'),
+}
+
+# Unit each total is kept in: the unit of the matching daily limit
+CANONICAL_UNITS = {
+    'calories': 'kcal',
+    'protein': 'g', 'fat': 'g', 'carbs': 'g', 'fiber': 'g',
+    'saturated_fat': 'g', 'unsaturated_fat': 'g', 'omega_3': 'g', 'omega_6': 'g',
+    'cholesterol': 'mg', 'calcium': 'mg', 'iron': 'mg', 'magnesium': 'mg',
+    'potassium': 'mg', 'zinc': 'mg', 'sodium': 'mg',
+    'vitamin_b6': 'mg', 'vitamin_c': 'mg', 'vitamin_e': 'mg',
+    'vitamin_a': 'mcg', 'vitamin_b9': 'mcg', 'vitamin_b12': 'mcg',
+    'vitamin_d': 'mcg', 'vitamin_k': 'mcg', 'selenium': 'mcg',
+}
+
+# Mass units in micrograms
+MASS_UNITS = {'g': 1_000_000, 'mg': 1_000, 'mcg': 1, 'ug': 1, 'µg': 1, 'μg': 1}
+
+# '1,200' is a thousands separator, '1,5' a decimal comma
+AMOUNT_PATTERN = re.compile(
+    r'(-?[1-9]\d{0,2}(?:,\d{3})+(?!\d)|-?\d+)([.,]\d+)?\s*([a-zA-Zµμ]*)'
+)
+
+
+def parse_amount(value, canonical_unit: str) -> float:
+    """
+    '780 kcal' -> 780.0, '0.2 g' in mg -> 200.0, '1,200 mcg' -> 1200.0
+
+    A missing or unknown unit is taken as the canonical one; anything
+    unparseable counts as 0.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+
+    match = AMOUNT_PATTERN.search(str(value or ''))
+    if not match:
+        return 0.0
+
+    whole, fraction, unit = match.groups()
+    amount = float(whole.replace(',', '') + (fraction or '').replace(',', '.'))
+    unit = unit.lower()
+
+    if unit in MASS_UNITS and canonical_unit in MASS_UNITS:
+        return amount * MASS_UNITS[unit] / MASS_UNITS[canonical_unit]
+    return amount
+
+
+def sum_foods(foods_data) -> Dict[str, float]:
+    """Numeric totals of all foods in a meal's foods_data, in canonical units"""
+    totals = dict.fromkeys(CANONICAL_UNITS, 0.0)
+
+    foods = foods_data.get('foods') if isinstance(foods_data, dict) else None
+    if not isinstance(foods, list):
+        return totals
+
+    for food in foods:
+        if not isinstance(food, dict):
+            continue
+        for group, names in NUTRIENT_GROUPS.items():
+            values = food.get(group)
+            if not isinstance(values, dict):
+                continue
+            for name in names:
+                if name in values:
+                    totals[name] += parse_amount(values[name], CANONICAL_UNITS[name])
+
+    return {name: round(total, 3) for name, total in totals.items()}
@@ -1,20 +1,49 @@
-import os
 import base64
-from openai import OpenAI
+import logging
+import time
+from chatbot.services.budget_service import budget_service
+from chatbot.services.llm_provider import LLMUnavailableError, get_llm_provider
+from chatbot.services.single_flight import SingleFlightError, single_flight
+from chatbot.services.usage_rollup_service import usage_rollup_service
 from .schemas import MealAnalysis
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
 
-def analyze_meal_image(image_data: bytes) -> dict:
+MEAL_ANALYSIS_MODEL = "gpt-4o-mini"
+
+def analyze_meal_image(image_data: bytes, user_id=None) -> dict:
     """
-    Analyze meal image using OpenAI and return structured nutritional data
+    Analyze meal image with the configured LLM provider and return structured nutritional data
+    
+    Token usage is charged to user_id's daily LLM budget when given.
+    Re-uploads of the same image by the same user while the first analysis
+    is still running wait for that analysis instead of starting another.
+    
+    Raises:
+        LLMUnavailableError: If the provider is unavailable, or the shared
+            analysis this request waited for failed
     """
+    try:
+        result, _ = single_flight.run(
+            user_id,
+            'meal_analysis',
+            image_data,
+            lambda: _analyze_meal_image(image_data, user_id)
+        )
+    except SingleFlightError as e:
+        # The waiting duplicate did not call upstream itself; degrade like it did
+        raise LLMUnavailableError(
+            f"Shared meal analysis failed: {e}", retry_after=e.retry_after
+        ) from e
+    return result
+
+def _analyze_meal_image(image_data: bytes, user_id=None) -> dict:
     try:
         base64_image = base64.b64encode(image_data).decode('utf-8')
         
-        response = client.responses.parse(
-            model="gpt-4o-mini",
-            input=[
+        start_time = time.time()
+        response = get_llm_provider().parse(
+            [
                 {
                     "role": "system",
                     "content": "You are a professional nutritionist and food analysis expert. Analyze meal images and provide detailed nutritional information for each food item detected. Be accurate and thorough in your analysis."
@@ -43,12 +72,29 @@ Be specific and accurate with measurements."""
                     ]
                 }
             ],
-            text_format=MealAnalysis,
+            model=MEAL_ANALYSIS_MODEL,
+            schema=MealAnalysis,
+        )
+        
+        budget_service.charge(
+            user_id,
+            'meal_analysis',
+            response.input_tokens,
+            response.output_tokens,
+            MEAL_ANALYSIS_MODEL
+        )
+        usage_rollup_service.record(
+            user_id,
+            'meal_analysis',
+            MEAL_ANALYSIS_MODEL,
+            response.input_tokens,
+            response.output_tokens,
+            int((time.time() - start_time) * 1000)
         )
         
-        parsed_data = response.output_parsed
+        parsed_data = response.parsed
         return parsed_data.model_dump()
         
     except Exception as e:
-        print(f"Error analyzing image with OpenAI: {str(e)}")
+        logger.error(f"Error analyzing image with LLM provider: {str(e)}")
         raise
\ No newline at end of file
@@ -1,3 +1,109 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from users.models import User
+from .models import Meal
+from .nutrients import CANONICAL_UNITS, parse_amount, sum_foods
+
+
+class ParseAmountTests(SimpleTestCase):
+    """meals.nutrients.parse_amount unit handling"""
+
+    def test_same_unit(self):
+        self.assertEqual(parse_amount('780 kcal', 'kcal'), 780.0)
+        self.assertEqual(parse_amount('12.5 g', 'g'), 12.5)
+        self.assertEqual(parse_amount('780kcal', 'kcal'), 780.0)
+
+    def test_mass_conversion(self):
+        self.assertAlmostEqual(parse_amount('0.2 g', 'mg'), 200.0)
+        self.assertAlmostEqual(parse_amount('2.5 mg', 'g'), 0.0025)
+        self.assertAlmostEqual(parse_amount('1.5 mg', 'mcg'), 1500.0)
+        self.assertAlmostEqual(parse_amount('500 mcg', 'mg'), 0.5)
+
+    def test_microgram_spellings(self):
+        for unit in ('mcg', 'ug', 'µg', 'μg', 'MCG'):
+            with self.subTest(unit=unit):
+                self.assertAlmostEqual(parse_amount(f'250 {unit}', 'mg'), 0.25)
+
+    def test_decimal_comma_and_thousands_separator(self):
+        self.assertEqual(parse_amount('1,5 g', 'g'), 1.5)
+        self.assertEqual(parse_amount('0,200 g', 'g'), 0.2)
+        self.assertEqual(parse_amount('1,200 mcg', 'mcg'), 1200.0)
+        self.assertEqual(parse_amount('1,200.5 mg', 'mg'), 1200.5)
+        self.assertAlmostEqual(parse_amount('12,000,000 mcg', 'g'), 12.0)
+
+    def test_missing_or_unknown_unit_is_canonical(self):
+        self.assertEqual(parse_amount('15', 'mg'), 15.0)
+        self.assertEqual(parse_amount('1 cup', 'g'), 1.0)
+        self.assertEqual(parse_amount('~12 g', 'g'), 12.0)
+
+    def test_numbers_pass_through(self):
+        self.assertEqual(parse_amount(42, 'g'), 42.0)
+        self.assertEqual(parse_amount(0.5, 'mg'), 0.5)
+
+    def test_unparseable_is_zero(self):
+        for value in (None, '', 'trace', True, [], {}):
+            with self.subTest(value=value):
+                self.assertEqual(parse_amount(value, 'g'), 0.0)
+
+
+class SumFoodsTests(SimpleTestCase):
+    """meals.nutrients.sum_foods over foods_data"""
+
+    foods_data = {
+        'foods': [
+            {
+                'name': 'Burger',
+                'nutritions': {'calories': '540 kcal', 'protein': '25 g', 'fat': '30g'},
+                'minerals': {'iron': '4 mg', 'sodium': '1,100 mg'},
+                'vitamins': {'vitamin_b12': '2.4 mcg'},
+                'fats': {'saturated_fat': '11 g', 'cholesterol': '0.08 g'},
+            },
+            {
+                'name': 'Salad',
+                'nutritions': {'calories': 120, 'protein': '3.5 g'},
+                'minerals': {'iron': '1500 mcg'},
+                'vitamins': {'vitamin_c': '30 mg', 'not_a_nutrient': '5 g'},
+            },
+            'not a food',
+        ]
+    }
+
+    def test_totals_in_canonical_units(self):
+        totals = sum_foods(self.foods_data)
+
+        self.assertEqual(set(totals), set(CANONICAL_UNITS))
+        self.assertEqual(totals['calories'], 660.0)
+        self.assertEqual(totals['protein'], 28.5)
+        self.assertEqual(totals['fat'], 30.0)
+        self.assertEqual(totals['iron'], 5.5)
+        self.assertEqual(totals['sodium'], 1100.0)
+        self.assertEqual(totals['cholesterol'], 80.0)
+        self.assertEqual(totals['vitamin_b12'], 2.4)
+        self.assertEqual(totals['vitamin_c'], 30.0)
+        self.assertEqual(totals['zinc'], 0.0)
+
+    def test_malformed_foods_data(self):
+        for foods_data in (None, [], {}, {'foods': 'none'}, {'foods': [{'nutritions': 'x'}]}):
+            with self.subTest(foods_data=foods_data):
+                self.assertEqual(set(sum_foods(foods_data).values()), {0.0})
+
+
+class MealNutrientTotalsTests(TestCase):
+    """Meal.save keeps nutrient_totals in sync with foods_data"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='meals@example.com')
+
+    def test_totals_follow_foods_data(self):
+        meal = Meal.objects.create(
+            user=self.user,
+            image_url='meals/test.jpg',
+            foods_data={'foods': [{'nutritions': {'calories': '300 kcal'}}]},
+        )
+        self.assertEqual(meal.nutrient_totals['calories'], 300.0)
+
+        meal.foods_data = {'foods': [{'nutritions': {'calories': '450 kcal'}}]}
+        meal.save(update_fields=['foods_data'])
+
+        meal.refresh_from_db()
+        self.assertEqual(meal.nutrient_totals['calories'], 450.0)
@@ -136,13 +136,16 @@
 
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiParameter
 from datetime import datetime
+from chatbot.services.llm_provider import LLMUnavailableError, retry_after_header
+from fitora.idempotency import idempotent
+from fitora.throttling import LLMBudgetThrottle, MealAnalysisRateThrottle
 from .models import Meal
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
@@ -332,6 +335,8 @@ def calculate_daily_totals(meals):
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([MealAnalysisRateThrottle, LLMBudgetThrottle])
+@idempotent('meal_analysis')
 def analyze_meal(request):
     serializer = MealAnalyzeSerializer(data=request.data)
     if not serializer.is_valid():
@@ -353,12 +358,19 @@ def analyze_meal(request):
     # Analyze with OpenAI
     try:
         from .services import analyze_meal_image
-        analysis_result = analyze_meal_image(image_data)
+        analysis_result = analyze_meal_image(image_data, user_id=request.user.id)
         
         return Response({
             'image_url': image_url,
             'foods': analysis_result['foods']
         })
+    except LLMUnavailableError as e:
+        default_storage.delete(path)
+        return Response(
+            {'message': 'Meal analysis is temporarily unavailable. Please try again shortly.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': retry_after_header(e.retry_after)}
+        )
     except Exception as e:
         # If analysis fails, delete the uploaded image
         default_storage.delete(path)